@@ -0,0 +1,207 @@
+"""asyncio front end for the anonymization engine
+
+    async with AsyncAnonymizer(max_concurrency=4) as anonymizer:
+        anonymous = await anonymizer.anonymize(text, config)
+        restored = await anonymizer.deanonymize(anonymous, config)
+        rows = await anonymizer.anonymize_many(values, config)
+
+Scans run in a thread or process executor, never on the event loop. Small
+texts submitted during the same event loop iteration (by any number of tasks)
+for the same config are sent to the executor as one batch. Texts larger than
+chunk_size are rewritten chunk by chunk, so cancelling the awaiting task stops
+them at the next chunk (with a process executor they are sent whole, and
+cancelling only discards the result). The rules are the same as
+engine.anonymize / engine.deanonymize, compiled once per config and shared by
+all tasks.
+
+A config dict is treated as a snapshot: after changing its rules, pass a new
+dict (as the GUI and the service do) rather than mutating the old one.
+"""
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import engine
+
+# Texts gathered into one executor call at most
+BATCH_SIZE = 256
+
+# Texts longer than this are not batched but rewritten in chunks of this size
+CHUNK_SIZE = 1024 * 1024
+
+
+class UnknownRuleSet(Exception):
+    """Raised by a process worker that has not seen a rule set yet, the call is retried with the config"""
+
+
+def _worker_ruleset(key, config, reverse):
+    ruleset = engine.ruleset_cache.cached(key)
+    if ruleset is None:
+        if config is None:
+            raise UnknownRuleSet(key)
+        ruleset = engine.CompiledRuleSet.from_config(config, reverse=reverse)
+        engine.ruleset_cache.put(key, ruleset)
+    return ruleset
+
+
+def _rewrite_batch(key, config, reverse, texts):
+    """Executor side of a batch: every text rewritten with the rule set of key"""
+    return list(_worker_ruleset(key, config, reverse).sub_many(texts))
+
+
+class AsyncAnonymizer:
+    """Anonymize and de-anonymize from coroutines without blocking the event loop
+
+    executor is "thread" (the default), "process" or an existing
+    concurrent.futures executor, which is then not shut down by close().
+    max_concurrency limits the executor calls in flight (a batch or a chunk
+    counts as one); by default it is the executor's worker count.
+    """
+
+    def __init__(self, executor="thread", max_workers=None, max_concurrency=None,
+                 batch_size=BATCH_SIZE, chunk_size=CHUNK_SIZE):
+        if executor == "thread":
+            self.executor = ThreadPoolExecutor(max_workers=max_workers)
+            self.owns_executor = True
+        elif executor == "process":
+            self.executor = ProcessPoolExecutor(max_workers=max_workers)
+            self.owns_executor = True
+        else:
+            self.executor = executor
+            self.owns_executor = False
+        self.in_processes = isinstance(self.executor, ProcessPoolExecutor)
+        workers = getattr(self.executor, '_max_workers', None) or 1
+        self.max_concurrency = max_concurrency or workers
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+
+        # Created on first use, so the anonymizer can be built outside the event loop
+        self._semaphore = None
+        # (key, reverse) -> Future of the rule set compiled for the thread executor
+        self._rulesets = {}
+        # (key, reverse) -> [(text, Future, config)] waiting for the next batch
+        self._pending = {}
+        self._tasks = set()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        """Wait for the running batches, then shut down an executor created by this anonymizer"""
+        while self._pending or self._tasks:
+            for batch in list(self._pending):
+                self._dispatch(batch)
+            if self._tasks:
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self.owns_executor:
+            self.executor.shutdown()
+
+    async def anonymize(self, text, config):
+        """Replace every original in text with its replacement"""
+        return await self._submit(text, config, self._key(config, False))
+
+    async def deanonymize(self, text, config):
+        """Replace every replacement in text with its original"""
+        return await self._submit(text, config, self._key(config, True))
+
+    async def anonymize_many(self, texts, config):
+        """Anonymize several texts, in order"""
+        batch = self._key(config, False)
+        return await asyncio.gather(*[self._submit(text, config, batch) for text in texts])
+
+    async def deanonymize_many(self, texts, config):
+        """De-anonymize several texts, in order"""
+        batch = self._key(config, True)
+        return await asyncio.gather(*[self._submit(text, config, batch) for text in texts])
+
+    def _key(self, config, reverse):
+        """(ruleset key, reverse) of config, hashed once per config dict by engine.ruleset_cache"""
+        return engine.ruleset_cache.key(config, reverse), reverse
+
+    def _submit(self, text, config, batch):
+        """Future of the rewritten text, queued for the next batch unless the text is large"""
+        if len(text) > self.chunk_size and not self.in_processes:
+            return asyncio.ensure_future(self._rewrite_chunked(text, config, batch))
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        entries = self._pending.get(batch)
+        if entries is None:
+            entries = self._pending[batch] = []
+            # Gather whatever else is submitted during this event loop iteration
+            loop.call_soon(self._dispatch, batch)
+        entries.append((text, future, config))
+        if len(entries) >= self.batch_size:
+            self._dispatch(batch)
+        return future
+
+    def _dispatch(self, batch):
+        entries = self._pending.pop(batch, None)
+        if not entries:
+            return
+        # Texts whose tasks were cancelled while waiting are dropped
+        entries = [entry for entry in entries if not entry[1].done()]
+        if entries:
+            task = asyncio.ensure_future(self._run_batch(batch, entries))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _limit(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def _run_batch(self, batch, entries):
+        key, reverse = batch
+        config = entries[0][2]
+        texts = [text for text, _, _ in entries]
+        loop = asyncio.get_running_loop()
+        try:
+            async with self._limit():
+                if self.in_processes:
+                    try:
+                        results = await loop.run_in_executor(self.executor, _rewrite_batch, key, None, reverse, texts)
+                    except UnknownRuleSet:
+                        results = await loop.run_in_executor(self.executor, _rewrite_batch, key, config, reverse, texts)
+                else:
+                    ruleset = await self._ruleset(batch, config)
+                    results = await loop.run_in_executor(self.executor, lambda: list(ruleset.sub_many(texts)))
+        except Exception as e:
+            for _, future, _ in entries:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future, _), result in zip(entries, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def _ruleset(self, batch, config):
+        """Compiled rule set for the thread executor, compiled once however many tasks ask"""
+        future = self._rulesets.get(batch)
+        if future is None:
+            key, reverse = batch
+            future = asyncio.get_running_loop().run_in_executor(self.executor, _worker_ruleset, key, config, reverse)
+            self._rulesets[batch] = future
+            if len(self._rulesets) > engine.ruleset_cache.maxsize:
+                del self._rulesets[next(iter(self._rulesets))]
+        try:
+            return await asyncio.shield(future)
+        except Exception:
+            # Let the next request try again
+            self._rulesets.pop(batch, None)
+            raise
+
+    async def _rewrite_chunked(self, text, config, batch):
+        ruleset = await self._ruleset(batch, config)
+        rewriter = engine.StreamRewriter(ruleset)
+        loop = asyncio.get_running_loop()
+        pieces = []
+        for start in range(0, len(text), self.chunk_size):
+            # Each chunk is a cancellation point and lets batches of other tasks in between
+            async with self._limit():
+                pieces.append(await loop.run_in_executor(self.executor, rewriter.feed,
+                                                         text[start:start + self.chunk_size]))
+        pieces.append(rewriter.flush())
+        return "".join(pieces)
@@ -0,0 +1,87 @@
+"""Time the asyncio API against one executor call per text
+
+Many small texts are anonymized concurrently from coroutines, first with a
+plain loop.run_in_executor per text, then through AsyncAnonymizer, which
+batches them into few executor calls. While each runs, a ticker task measures
+how late the event loop wakes it (the loop lag); outputs must match
+engine.anonymize.
+
+Usage: python benchmarks/bench_async.py [--rules 1000] [--texts 20000] [--executor thread|process]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import async_engine
+import engine
+from bench_suite import make_corpus, make_rules
+
+TICK = 0.001
+
+
+async def measure_lag(stop, lags):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(time.perf_counter() - start - TICK)
+
+
+async def timed(label, make_awaitable):
+    stop = asyncio.Event()
+    lags = []
+    ticker = asyncio.ensure_future(measure_lag(stop, lags))
+    start = time.perf_counter()
+    result = await make_awaitable()
+    seconds = time.perf_counter() - start
+    stop.set()
+    await ticker
+    lags.sort()
+    print(f"  {label:34} {seconds:7.3f}s  loop lag p50 {lags[len(lags) // 2] * 1000:5.2f} ms  "
+          f"max {lags[-1] * 1000:6.2f} ms")
+    return result
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    rules = make_rules(args.rules, rng)
+    config = {'replacements': rules, 'case_insensitive': True, 'whole_words_only': True}
+    texts = [make_corpus("logs", rng.randint(20, 200), rules, rng) for _ in range(args.texts)]
+    expected = [engine.anonymize(text, config) for text in texts]
+    print(f"{args.texts} texts, {args.rules} rules, {args.executor} executor")
+
+    loop = asyncio.get_running_loop()
+    ruleset = engine.compile_rules(config)
+    with ThreadPoolExecutor() as executor:
+        per_text = await timed("run_in_executor per text", lambda: asyncio.gather(
+            *(loop.run_in_executor(executor, ruleset.sub, text) for text in texts)))
+
+    async with async_engine.AsyncAnonymizer(args.executor) as anonymizer:
+        # Warm up, so compiling the rules is not timed
+        await anonymizer.anonymize("", config)
+        batched = await timed("AsyncAnonymizer.anonymize per text", lambda: asyncio.gather(
+            *(anonymizer.anonymize(text, config) for text in texts)))
+        many = await timed("AsyncAnonymizer.anonymize_many", lambda: anonymizer.anonymize_many(texts, config))
+
+    identical = per_text == expected and batched == expected and many == expected
+    print("identical" if identical else "OUTPUT DIFFERS")
+    return 0 if identical else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rules", type=int, default=1000)
+    parser.add_argument("--texts", type=int, default=20000)
+    parser.add_argument("--executor", choices=["thread", "process"], default="thread")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Check and time chunk-parallel anonymization of one large document
+
+Every case_insensitive x whole_words_only combination is run sequentially and
+through engine.parallel_sub; the outputs must be byte-identical.
+
+Usage: python benchmarks/bench_parallel.py [--rules 3000] [--size-mb 64] [--workers N]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import engine
+from bench_single_pass import make_rules, make_text
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rules", type=int, default=3000)
+    parser.add_argument("--size-mb", type=float, default=64.0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--segment-mb", type=float, default=engine.SEGMENT_SIZE / 1024 / 1024)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    rules = make_rules(args.rules, rng)
+    text = make_text(int(args.size_mb * 1024 * 1024), rules, rng)
+    segment_size = int(args.segment_mb * 1024 * 1024)
+
+    print(f"{args.rules} rules, {len(text) / 1e6:.1f} MB of text, {args.workers} workers")
+    failed = False
+    for case_insensitive in (False, True):
+        for whole_words_only in (True, False):
+            config = {'replacements': rules, 'case_insensitive': case_insensitive,
+                      'whole_words_only': whole_words_only}
+            for reverse in (False, True):
+                ruleset = engine.compile_rules(config, reverse=reverse)
+                start = time.perf_counter()
+                expected = ruleset.sub(text)
+                sequential_time = time.perf_counter() - start
+
+                start = time.perf_counter()
+                result = engine.parallel_sub(text, config, reverse=reverse, workers=args.workers,
+                                             segment_size=segment_size)
+                parallel_time = time.perf_counter() - start
+
+                identical = result == expected
+                failed = failed or not identical
+                print(f"case_insensitive={case_insensitive!s:5} whole_words_only={whole_words_only!s:5} "
+                      f"reverse={reverse!s:5}  sequential {sequential_time:6.2f}s  "
+                      f"parallel {parallel_time:6.2f}s  x{sequential_time / parallel_time:4.1f}  "
+                      f"{'identical' if identical else 'OUTPUT DIFFERS'}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
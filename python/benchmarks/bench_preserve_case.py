@@ -0,0 +1,73 @@
+"""Microbenchmark engine.preserve_case_pattern against the original per-character loop
+
+Every case shape is checked for identical output before timing.
+
+Usage: python benchmarks/bench_preserve_case.py [--calls 200000]
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine import preserve_case_pattern
+
+
+def legacy_preserve_case_pattern(original_match, replacement):
+    """The original TextAnonymizer.preserve_case_pattern"""
+    if len(original_match) == 0:
+        return replacement
+    result = ""
+    for i, char in enumerate(replacement):
+        if i < len(original_match):
+            if original_match[i].isupper():
+                result += char.upper()
+            else:
+                result += char.lower()
+        else:
+            result += char.lower()
+    return result
+
+
+SHAPES = {
+    "lower": ("david", "Lucas"),
+    "upper": ("DAVID", "Lucas"),
+    "title": ("David", "Lucas"),
+    "mixed": ("DaViD", "Lucas"),
+    "longer replacement": ("DAVID", "COMPANY_ANONYMOUS"),
+    "with digits": ("API_KEY_12345", "api_key_hidden"),
+    "non-ascii": ("STRAßE", "Größe"),
+}
+
+
+def check_equivalence(rng):
+    alphabet = "aAbBzZ_1 .ßÄäΣσς"
+    for _ in range(20000):
+        original = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 8)))
+        replacement = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 8)))
+        expected = legacy_preserve_case_pattern(original, replacement)
+        actual = preserve_case_pattern(original, replacement)
+        if actual != expected:
+            raise AssertionError(f"{original!r} / {replacement!r}: {actual!r} != {expected!r}")
+    for original, replacement in SHAPES.values():
+        assert preserve_case_pattern(original, replacement) == legacy_preserve_case_pattern(original, replacement)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200000)
+    args = parser.parse_args()
+
+    check_equivalence(random.Random(1))
+    print(f"{args.calls} calls per shape (outputs verified identical)")
+    for shape, (original, replacement) in SHAPES.items():
+        legacy = timeit.timeit(lambda: legacy_preserve_case_pattern(original, replacement), number=args.calls)
+        current = timeit.timeit(lambda: preserve_case_pattern(original, replacement), number=args.calls)
+        print(f"{shape:20} legacy {legacy * 1e9 / args.calls:6.0f} ns  "
+              f"current {current * 1e9 / args.calls:6.0f} ns  x{legacy / current:4.1f}")
+
+
+if __name__ == "__main__":
+    main()
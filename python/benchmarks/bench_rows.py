@@ -0,0 +1,99 @@
+"""Rows/s of anonymizing many short database values
+
+Cells are drawn from a pool of column-like values: whole originals (names,
+emails, hosts, ...), free text mentioning an original, and values no rule
+matches (ids, amounts, words). They are anonymized with engine.anonymize
+per value (a plain rules list is hashed on every call, so that is timed on a
+sample, and a RuleStore, whose hash is remembered), with CompiledRuleSet.sub
+per value, and with engine.anonymize_many, with and without whole_cells_only.
+Outputs are checked against sub() on the pool.
+
+Usage: python benchmarks/bench_rows.py [--rows 10000000] [--rules 10000] [--case-insensitive]
+"""
+import argparse
+import itertools
+import os
+import random
+import sys
+import time
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import engine
+from bench_suite import WORDS, make_rules
+from rule_store import RuleStore
+
+POOL_SIZE = 200000
+PER_CALL_SAMPLE = 2000
+
+
+def make_cells(rules, count, rng):
+    """count column values, about 40% exact originals and 15% free text mentioning one"""
+    cells = []
+    for _ in range(count):
+        roll = rng.random()
+        if roll < 0.4:
+            original = rng.choice(rules)['original']
+            cells.append(original.upper() if rng.random() < 0.1 else original)
+        elif roll < 0.55:
+            cells.append(f"{rng.choice(WORDS)} contacted {rng.choice(rules)['original']} about {rng.choice(WORDS)}")
+        elif roll < 0.75:
+            cells.append(str(rng.randint(0, 10 ** 9)))
+        elif roll < 0.8:
+            cells.append(None)
+        else:
+            cells.append(f"{rng.choice(WORDS)} {rng.choice(WORDS)}")
+    return cells
+
+
+def throughput(label, rows, function):
+    start = time.perf_counter()
+    function()
+    seconds = time.perf_counter() - start
+    print(f"  {label:42} {rows:>11,} rows {seconds:8.2f}s {rows / seconds:>12,.0f} rows/s", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10000000)
+    parser.add_argument("--rules", type=int, default=10000)
+    parser.add_argument("--case-insensitive", action="store_true")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    rules = make_rules(args.rules, rng)
+    config = {'replacements': rules, 'case_insensitive': args.case_insensitive, 'whole_words_only': True}
+    ruleset = engine.compile_rules(config)
+    pool = make_cells(rules, POOL_SIZE, rng)
+
+    expected = [cell if cell is None else ruleset.sub(cell) for cell in pool]
+    identical = list(engine.anonymize_many(pool, config)) == expected
+    whole_cells = list(engine.anonymize_many(pool, config, whole_cells_only=True))
+    identical = identical and all(result in (cell, wanted) for cell, result, wanted in zip(pool, whole_cells, expected))
+
+    def rows():
+        # The pool is cycled, so memory stays flat however many rows are processed
+        return itertools.islice(itertools.cycle(pool), args.rows)
+
+    print(f"{args.rows:,} rows, {args.rules} rules, case_insensitive={args.case_insensitive}")
+    sample = pool[:PER_CALL_SAMPLE]
+    throughput("engine.anonymize per value (sample)", len(sample),
+               lambda: [engine.anonymize(cell, config) for cell in sample if cell is not None])
+    stored = dict(config, replacements=RuleStore(rules))
+    throughput("engine.anonymize per value, RuleStore rules", args.rows // 10,
+               lambda: deque((engine.anonymize(cell, stored) for cell in itertools.islice(rows(), args.rows // 10)
+                              if cell is not None), maxlen=0))
+    throughput("CompiledRuleSet.sub per value", args.rows,
+               lambda: deque((ruleset.sub(cell) for cell in rows() if cell is not None), maxlen=0))
+    throughput("engine.anonymize_many", args.rows,
+               lambda: deque(engine.anonymize_many(rows(), config), maxlen=0))
+    throughput("engine.anonymize_many(whole_cells_only)", args.rows,
+               lambda: deque(engine.anonymize_many(rows(), config, whole_cells_only=True), maxlen=0))
+    print("identical" if identical else "OUTPUT DIFFERS")
+    sys.exit(0 if identical else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""Load-test the local anonymization service and report latency percentiles
+
+Keeps --concurrency keep-alive connections busy with anonymize (or batch)
+requests built from the config's own rules and reports requests/s and the
+p50/p90/p99/max latency. With --spawn the service is started (and stopped)
+by the benchmark itself.
+
+Usage: python benchmarks/bench_service.py [--config Sample] [--requests 5000]
+    [--concurrency 16] [--size 400] [--batch 0] [--port 8765 | --unix PATH] [--spawn]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+PYTHON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PYTHON_DIR)
+
+import config_store
+from service import DEFAULT_HOST, DEFAULT_PORT
+
+FILLER = ("please", "review", "the", "report", "before", "friday", "and", "send", "it", "to",
+          "the", "team", "with", "a", "short", "summary", "of", "open", "issues")
+
+
+def make_text(rules, size, rng):
+    """About size characters of prose mentioning a rule original every few words"""
+    words = []
+    length = 0
+    while length < size:
+        if rules and rng.random() < 0.15:
+            word = rng.choice(rules)['original']
+        else:
+            word = rng.choice(FILLER)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)
+
+
+async def open_connection(args):
+    if args.unix:
+        return await asyncio.open_unix_connection(args.unix)
+    return await asyncio.open_connection(args.host, args.port)
+
+
+async def request(reader, writer, method, path, payload=None):
+    """(status, response dict) of one request on a keep-alive connection"""
+    body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+    writer.write((f"{method} {path} HTTP/1.1\r\nHost: localhost\r\n"
+                  f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n").encode("latin-1")
+                 + body)
+    await writer.drain()
+    status = int((await reader.readuntil(b"\r\n")).split()[1])
+    length = 0
+    while True:
+        line = await reader.readuntil(b"\r\n")
+        if line == b"\r\n":
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def wait_until_ready(args, timeout=60.0):
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            reader, writer = await open_connection(args)
+            await request(reader, writer, "GET", "/health")
+            writer.close()
+            return
+        except OSError:
+            if time.perf_counter() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+
+
+async def client(args, payloads, counter, latencies, errors):
+    reader, writer = await open_connection(args)
+    path = "/batch" if args.batch else "/anonymize"
+    try:
+        while True:
+            index = counter[0]
+            if index >= len(payloads):
+                break
+            counter[0] += 1
+            start = time.perf_counter()
+            status, response = await request(reader, writer, "POST", path, payloads[index])
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors.append(response.get('error', status))
+    finally:
+        writer.close()
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))]
+
+
+async def run(args):
+    rules = config_store.load_config(args.config).get('replacements', [])
+    rng = random.Random(args.seed)
+    payloads = []
+    for _ in range(args.requests):
+        if args.batch:
+            payloads.append({'config': args.config, 'operation': "anonymize",
+                             'texts': [make_text(rules, args.size, rng) for _ in range(args.batch)]})
+        else:
+            payloads.append({'config': args.config, 'text': make_text(rules, args.size, rng)})
+
+    await wait_until_ready(args)
+    # Load and compile the config before timing
+    reader, writer = await open_connection(args)
+    status, response = await request(reader, writer, "POST", "/anonymize", {'config': args.config, 'text': ""})
+    writer.close()
+    if status != 200:
+        raise SystemExit(f"Service error: {response.get('error')}")
+
+    counter = [0]
+    latencies = []
+    errors = []
+    start = time.perf_counter()
+    await asyncio.gather(*(client(args, payloads, counter, latencies, errors) for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    texts = args.requests * (args.batch or 1)
+    print(f"{args.requests} requests ({texts} texts of ~{args.size} chars) over {args.concurrency} connections "
+          f"in {elapsed:.2f}s: {args.requests / elapsed:,.0f} requests/s, {texts / elapsed:,.0f} texts/s")
+    print("latency  " + "  ".join(f"{name} {percentile(latencies, fraction) * 1000:.2f} ms" for name, fraction in
+                                  (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("max", 1.0))))
+    if errors:
+        print(f"{len(errors)} errors, first: {errors[0]}")
+    return 1 if errors else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--config", default="Sample", help="config name in configs/")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=16, help="simultaneous keep-alive connections")
+    parser.add_argument("--size", type=int, default=400, help="characters per text")
+    parser.add_argument("--batch", type=int, default=0, help="texts per /batch request, 0 for /anonymize")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix", metavar="PATH", help="connect to a Unix socket instead of TCP")
+    parser.add_argument("--spawn", action="store_true", help="start the service for the run")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    service = None
+    if args.spawn:
+        command = [sys.executable, "service.py"]
+        command += ["--unix", args.unix] if args.unix else ["--host", args.host, "--port", str(args.port)]
+        service = subprocess.Popen(command, cwd=PYTHON_DIR)
+    try:
+        status = asyncio.run(run(args))
+    finally:
+        if service is not None:
+            service.terminate()
+            service.wait()
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Compare whole-text scanning with the structure-aware rewriters of structured.py
+
+Synthetic user tables are written as JSON lines, CSV and a mysqldump-style SQL
+dump (CREATE TABLE plus multi-row INSERTs), with the sensitive values in a
+few columns and the rest ids, amounts, statuses and long free-text comments.
+Each is rewritten in 1 MB chunks by StreamRewriter over the whole text, by the
+structured rewriter over every value, and by the structured rewriter over the
+selected columns only. Rewriting every value must give the whole-text output
+(the data has no rule originals in keys or quoting), and rewriting the
+selected columns must give the same values in those columns.
+
+Usage: python benchmarks/bench_structured.py [--size-mb 16] [--rules 10000] [--fields email,owner]
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import engine
+import structured
+from bench_suite import WORDS, _sensitive, make_rules
+
+CHUNK_SIZE = 1024 * 1024
+COLUMNS = ["id", "email", "owner", "status", "amount", "created", "comment"]
+
+
+def make_rows(rules, size, rng):
+    """Rows of about size characters in total"""
+    rows = []
+    length = 0
+    while length < size:
+        row = [str(rng.randint(1, 10 ** 9)), _sensitive(rules, rng), _sensitive(rules, rng),
+               rng.choice(["active", "closed", "pending"]), f"{rng.uniform(0, 10 ** 5):.2f}",
+               f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+               " ".join(rng.choice(WORDS) for _ in range(rng.randint(10, 60)))]
+        rows.append(row)
+        length += sum(len(cell) for cell in row) + 20
+    return rows
+
+
+def as_json_lines(rows):
+    return "".join(json.dumps(dict(zip(COLUMNS, row))) + "\n" for row in rows)
+
+
+def as_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(COLUMNS)
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+
+def as_sql(rows):
+    pieces = ["CREATE TABLE `users` (\n" + ",\n".join(f"  `{column}` text" for column in COLUMNS)
+              + ",\n  PRIMARY KEY (`id`)\n);\n"]
+    for start in range(0, len(rows), 500):
+        values = ",".join("(" + ",".join(f"'{cell}'" for cell in row) + ")" for row in rows[start:start + 500])
+        pieces.append(f"INSERT INTO `users` VALUES {values};\n")
+    return "".join(pieces)
+
+
+def rewrite(rewriter, text):
+    start = time.perf_counter()
+    pieces = [rewriter.feed(text[position:position + CHUNK_SIZE]) for position in range(0, len(text), CHUNK_SIZE)]
+    pieces.append(rewriter.flush())
+    return "".join(pieces), time.perf_counter() - start
+
+
+def column_values(file_format, text, fields):
+    """The values of the selected columns, to compare outputs by"""
+    if file_format == "json":
+        return [[record[field] for field in fields] for record in map(json.loads, text.splitlines())]
+    if file_format == "csv":
+        reader = csv.reader(io.StringIO(text))
+        header = next(reader)
+        indexes = [header.index(field) for field in fields]
+        return [[row[index] for index in indexes] for row in reader]
+    indexes = [COLUMNS.index(field) for field in fields]
+    rows = []
+    for line in text.splitlines():
+        if line.startswith("INSERT"):
+            for values in line[line.index("(") + 1:-2].split("),("):
+                # Every value is quoted and none contains a quote
+                cells = values[1:-1].split("','")
+                rows.append([cells[index] for index in indexes])
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=float, default=16)
+    parser.add_argument("--rules", type=int, default=10000)
+    parser.add_argument("--fields", default="email,owner", help="columns for the selected-columns run")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    rules = make_rules(args.rules, rng)
+    config = {'replacements': rules, 'case_insensitive': True, 'whole_words_only': True}
+    ruleset = engine.compile_rules(config)
+    rows = make_rows(rules, int(args.size_mb * 1024 * 1024), rng)
+    fields = structured.parse_fields(args.fields)
+
+    print(f"{len(rows):,} rows, {args.rules} rules, selected columns: {', '.join(fields)}")
+    identical = True
+    for file_format, text in (("json", as_json_lines(rows)), ("csv", as_csv(rows)), ("sql", as_sql(rows))):
+        megabytes = len(text.encode("utf-8")) / 1e6
+        whole, whole_seconds = rewrite(engine.StreamRewriter(ruleset), text)
+        every, every_seconds = rewrite(structured.open_rewriter(file_format, ruleset), text)
+        selected, selected_seconds = rewrite(structured.open_rewriter(file_format, ruleset, fields), text)
+        identical = identical and every == whole \
+            and column_values(file_format, selected, fields) == column_values(file_format, whole, fields)
+        print(f"  {file_format:4} {megabytes:6.1f} MB   whole text {megabytes / whole_seconds:6.1f} MB/s   "
+              f"every value {megabytes / every_seconds:6.1f} MB/s   "
+              f"selected columns {megabytes / selected_seconds:6.1f} MB/s", flush=True)
+    print("identical" if identical else "OUTPUT DIFFERS")
+    sys.exit(0 if identical else 1)
+
+
+if __name__ == "__main__":
+    main()
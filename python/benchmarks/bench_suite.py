@@ -0,0 +1,257 @@
+"""Reproducible throughput and peak-memory benchmark of the anonymize/deanonymize hot paths
+
+Synthetic corpora (code, SQL, emails, logs) are generated with identifiers drawn
+from synthetic rule sets of several sizes, then anonymized and de-anonymized for
+every case_insensitive x whole_words_only combination. Results are written as
+JSON and can be compared against a stored baseline; any throughput or memory
+regression beyond the tolerance makes the run exit with status 1.
+
+Usage:
+    python benchmarks/bench_suite.py [--rules 10,1000,10000,100000] [--size-mb 1]
+        [--corpora code,sql,emails,logs] [--output results.json]
+        [--baseline baseline.json] [--tolerance 0.15] [--update-baseline]
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import engine
+
+CORPORA = ("code", "sql", "emails", "logs")
+OPERATIONS = ("anonymize", "deanonymize")
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+FIRST_NAMES = ["james", "mary", "robert", "patricia", "john", "jennifer", "michael", "linda",
+               "david", "elizabeth", "william", "barbara", "richard", "susan", "joseph", "jessica"]
+LAST_NAMES = ["smith", "johnson", "williams", "brown", "jones", "garcia", "miller", "davis",
+              "rodriguez", "martinez", "hernandez", "lopez", "gonzalez", "wilson", "anderson"]
+WORDS = ["alpha", "bravo", "cedar", "delta", "ember", "falcon", "granite", "harbor", "iris",
+         "juniper", "kestrel", "lumen", "meadow", "nimbus", "onyx", "pioneer", "quartz", "raven"]
+
+
+def make_rules(count, rng):
+    """count distinct rules mixing people, emails, hosts, tables and keys, like real configs"""
+    rules = []
+    seen = set()
+    while len(rules) < count:
+        kind = len(rules) % 5
+        suffix = rng.randint(0, 10 ** 6)
+        if kind == 0:
+            original = f"{rng.choice(FIRST_NAMES).capitalize()} {rng.choice(LAST_NAMES).capitalize()}{suffix}"
+            replacement = f"Person_{len(rules)}"
+        elif kind == 1:
+            original = f"{rng.choice(FIRST_NAMES)}.{rng.choice(LAST_NAMES)}{suffix}@corp.example"
+            replacement = f"user{len(rules)}@example.com"
+        elif kind == 2:
+            original = f"{rng.choice(WORDS)}-{rng.choice(WORDS)}-{suffix}.internal"
+            replacement = f"host{len(rules)}.example"
+        elif kind == 3:
+            original = f"tbl_{rng.choice(WORDS)}_{rng.choice(WORDS)}_{suffix}"
+            replacement = f"table_{len(rules)}"
+        else:
+            original = f"sk_live_{suffix:07d}{rng.choice(WORDS)}"
+            replacement = f"API_KEY_{len(rules)}"
+        if original in seen:
+            continue
+        seen.add(original)
+        rules.append({'original': original, 'replacement': replacement})
+    return rules
+
+
+def _sensitive(rules, rng):
+    # Mostly exact, sometimes in another case shape so case-insensitive mode has work to do
+    original = rng.choice(rules)['original']
+    roll = rng.random()
+    if roll < 0.1:
+        return original.upper()
+    if roll < 0.2:
+        return original.lower()
+    return original
+
+
+def _code_line(rules, rng):
+    return (f"    {rng.choice(WORDS)}_{rng.randint(0, 99)} = connect(host=\"{_sensitive(rules, rng)}\", "
+            f"retries={rng.randint(1, 5)})  # owner: {_sensitive(rules, rng)}")
+
+
+def _sql_line(rules, rng):
+    return (f"INSERT INTO {rng.choice(WORDS)}_log (id, actor, target) VALUES ({rng.randint(1, 10 ** 6)}, "
+            f"'{_sensitive(rules, rng)}', '{_sensitive(rules, rng)}');")
+
+
+def _email_line(rules, rng):
+    return (f"Hi {_sensitive(rules, rng)}, the {rng.choice(WORDS)} report is attached. "
+            f"Please forward it to {_sensitive(rules, rng)} before {rng.randint(1, 28)} March. Thanks!")
+
+
+def _log_line(rules, rng):
+    return (f"2024-03-{rng.randint(1, 28):02d}T{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00Z "
+            f"{rng.choice(['INFO', 'WARN', 'ERROR'])} [{rng.choice(WORDS)}] request from "
+            f"{_sensitive(rules, rng)} to {_sensitive(rules, rng)} took {rng.randint(1, 999)}ms")
+
+
+LINE_MAKERS = {"code": _code_line, "sql": _sql_line, "emails": _email_line, "logs": _log_line}
+
+
+def make_corpus(kind, size, rules, rng):
+    """About size characters of synthetic kind text mentioning rule originals"""
+    lines = []
+    length = 0
+    make_line = LINE_MAKERS[kind]
+    while length < size:
+        line = make_line(rules, rng)
+        lines.append(line)
+        length += len(line) + 1
+    return "\n".join(lines)
+
+
+def measure(function, repeat):
+    """(best seconds, peak traced MB) of function(); memory is traced in a separate, untimed run"""
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak / 1024 / 1024
+
+
+def run_case(config, operation, source, repeat):
+    """Compile the rules cold and time one operation on source"""
+    reverse = (operation == "deanonymize")
+    engine.ruleset_cache.clear()
+    start = time.perf_counter()
+    ruleset = engine.compile_rules(config, reverse=reverse)
+    compile_seconds = time.perf_counter() - start
+    seconds, peak_mb = measure(lambda: ruleset.sub(source), repeat)
+    matches = sum(1 for _ in ruleset.pattern.finditer(source)) if ruleset.pattern else 0
+    return {
+        'operation': operation,
+        'case_insensitive': config['case_insensitive'],
+        'whole_words_only': config['whole_words_only'],
+        'text_mb': round(len(source) / 1e6, 3),
+        'matches': matches,
+        'compile_seconds': round(compile_seconds, 4),
+        'seconds': round(seconds, 4),
+        'mb_per_second': round(len(source) / 1e6 / seconds, 2),
+        'peak_mb': round(peak_mb, 2),
+        'output': ruleset.sub(source),
+    }
+
+
+def run_suite(rule_counts, corpora, size, repeat, seed):
+    results = []
+    for rule_count in rule_counts:
+        rules = make_rules(rule_count, random.Random(seed))
+        for kind in corpora:
+            text = make_corpus(kind, size, rules, random.Random(seed + 1))
+            for case_insensitive in (False, True):
+                for whole_words_only in (True, False):
+                    config = {'replacements': rules, 'case_insensitive': case_insensitive,
+                              'whole_words_only': whole_words_only}
+                    source = text
+                    for operation in OPERATIONS:
+                        result = run_case(config, operation, source, repeat)
+                        result.update(corpus=kind, rules=rule_count)
+                        results.append(result)
+                        print(f"{kind:6} rules={rule_count:<6} ci={case_insensitive!s:5} ww={whole_words_only!s:5} "
+                              f"{operation:11} compile {result['compile_seconds']:7.3f}s  "
+                              f"{result['mb_per_second']:8.2f} MB/s  peak {result['peak_mb']:7.1f} MB  "
+                              f"{result['matches']} matches", flush=True)
+                        # The anonymized corpus is what gets de-anonymized
+                        source = result.pop('output')
+    return results
+
+
+def result_key(result):
+    return (result['corpus'], result['rules'], result['operation'],
+            result['case_insensitive'], result['whole_words_only'])
+
+
+def find_regressions(results, baseline, tolerance):
+    """Human-readable descriptions of results that got worse than the baseline by more than tolerance"""
+    previous = {result_key(result): result for result in baseline['results']}
+    regressions = []
+    for result in results:
+        old = previous.get(result_key(result))
+        if old is None:
+            continue
+        name = "{} rules={} {} ci={} ww={}".format(*result_key(result))
+        if old['mb_per_second'] and result['mb_per_second'] < old['mb_per_second'] * (1 - tolerance):
+            regressions.append(f"{name}: {result['mb_per_second']} MB/s, baseline {old['mb_per_second']} MB/s")
+        if result['peak_mb'] > old['peak_mb'] * (1 + tolerance) + 1:
+            regressions.append(f"{name}: peak {result['peak_mb']} MB, baseline {old['peak_mb']} MB")
+        if old['compile_seconds'] > 0.05 and result['compile_seconds'] > old['compile_seconds'] * (1 + tolerance):
+            regressions.append(f"{name}: compile {result['compile_seconds']}s, baseline {old['compile_seconds']}s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rules", default="10,1000,10000,100000",
+                        help="comma-separated rule set sizes")
+    parser.add_argument("--corpora", default=",".join(CORPORA))
+    parser.add_argument("--size-mb", type=float, default=1.0, help="size of each corpus")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per measurement, the best counts")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative slowdown")
+    parser.add_argument("--update-baseline", action="store_true", help="store the results as the new baseline")
+    args = parser.parse_args()
+
+    rule_counts = [int(count) for count in args.rules.split(",")]
+    corpora = [kind.strip() for kind in args.corpora.split(",")]
+    for kind in corpora:
+        if kind not in LINE_MAKERS:
+            parser.error(f"unknown corpus {kind!r}, choose from {', '.join(CORPORA)}")
+
+    report = {
+        'meta': {
+            'date': datetime.now().isoformat(timespec="seconds"),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'size_mb': args.size_mb,
+            'repeat': args.repeat,
+            'seed': args.seed,
+        },
+        'results': run_suite(rule_counts, corpora, int(args.size_mb * 1024 * 1024), args.repeat, args.seed),
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        regressions = find_regressions(report['results'], baseline, args.tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        print(f"{len(regressions)} regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+        sys.exit(1 if regressions else 0)
+    print(f"No baseline at {args.baseline}, run with --update-baseline to create one")
+
+
+if __name__ == "__main__":
+    main()
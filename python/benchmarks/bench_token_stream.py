@@ -0,0 +1,84 @@
+"""Compare fixed and minimal holdback when de-anonymizing a token stream
+
+An anonymized email-like corpus is split into LLM-sized fragments (1-6
+characters) and fed through StreamRewriter (always holds back the longest
+rule + 1 characters) and TokenStreamRewriter (holds back only a suffix that
+could still become a match). Reports the characters waiting per fragment,
+the time until the first restored output and the cost per fragment; both
+outputs must equal a whole-text de-anonymization.
+
+Usage: python benchmarks/bench_token_stream.py [--rules 1000] [--size-kb 256]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import engine
+from bench_suite import make_corpus, make_rules
+
+
+def run(rewriter_class, ruleset, fragments):
+    """(output, mean characters held back, fragments before the first output, seconds per fragment)"""
+    rewriter = rewriter_class(ruleset)
+    pieces = []
+    held = 0
+    received = 0
+    first_output = None
+    start = time.perf_counter()
+    for index, fragment in enumerate(fragments):
+        output = rewriter.feed(fragment)
+        received += len(fragment)
+        if output:
+            pieces.append(output)
+            if first_output is None:
+                first_output = index + 1
+        held += len(rewriter.pending)
+    pieces.append(rewriter.flush())
+    seconds = time.perf_counter() - start
+    return "".join(pieces), held / len(fragments), first_output, seconds / len(fragments)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rules", type=int, default=1000)
+    parser.add_argument("--size-kb", type=float, default=256)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    rules = make_rules(args.rules, rng)
+    text = make_corpus("emails", int(args.size_kb * 1024), rules, rng)
+    failed = False
+    for case_insensitive in (False, True):
+        for whole_words_only in (True, False):
+            config = {'replacements': rules, 'case_insensitive': case_insensitive,
+                      'whole_words_only': whole_words_only}
+            anonymized = engine.anonymize(text, config)
+            ruleset = engine.compile_rules(config, reverse=True)
+            expected = ruleset.sub(anonymized)
+
+            fragments = []
+            position = 0
+            while position < len(anonymized):
+                size = rng.randint(1, 6)
+                fragments.append(anonymized[position:position + size])
+                position += size
+
+            print(f"case_insensitive={case_insensitive!s:5} whole_words_only={whole_words_only!s:5} "
+                  f"{len(fragments)} fragments, longest replacement {ruleset.max_length}")
+            for rewriter_class in (engine.StreamRewriter, engine.TokenStreamRewriter):
+                output, held, first_output, seconds = run(rewriter_class, ruleset, fragments)
+                identical = output == expected
+                failed = failed or not identical
+                print(f"  {rewriter_class.__name__:20} held back {held:5.1f} chars on average, "
+                      f"first output after {first_output} fragments, {seconds * 1e6:6.1f} us/fragment  "
+                      f"{'identical' if identical else 'OUTPUT DIFFERS'}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
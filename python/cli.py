@@ -0,0 +1,304 @@
+"""Command-line front end for the anonymization engine
+
+    python cli.py anonymize --config Sample dump.sql -o dump_anonymous.sql
+    cat response.txt | python cli.py deanonymize --config Sample
+    llm_client --stream | python cli.py deanonymize --config Sample --live
+    python cli.py anonymize --config Sample dump.sql --format sql --fields users.email,notes
+    python cli.py batch --config Sample "mails/**/*.eml" -o mails_anonymous
+    python cli.py import employees.csv cmdb.jsonl --config Employees
+
+Input is streamed through the rules in chunks, so files of any size are
+processed in constant memory.
+"""
+import argparse
+import codecs
+import glob
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import config_cache
+import engine
+import rule_import
+import structured
+from config_store import config_path, load_config, resolve_config_path, save_config, update_index
+from rule_store import RuleStore
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def open_text(path, mode, encoding):
+    """Open a file (or stdin/stdout for '-') without newline translation"""
+    if path == "-":
+        stream = sys.stdin.buffer if "r" in mode else sys.stdout.buffer
+        return io.TextIOWrapper(stream, encoding=encoding, errors="surrogateescape", newline="")
+    return open(path, mode, encoding=encoding, errors="surrogateescape", newline="")
+
+
+def stream_rules(source, destination, rewriter, chunk_size=CHUNK_SIZE):
+    """Copy source to destination through a Stream/ParallelRewriter, one chunk at a time"""
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            break
+        destination.write(rewriter.feed(chunk))
+    destination.write(rewriter.flush())
+
+
+def stream_live(source, destination, rewriter, encoding, chunk_size=CHUNK_SIZE):
+    """Like stream_rules, but pass on output as soon as it is final instead of waiting for full chunks"""
+    decoder = codecs.getincrementaldecoder(encoding)(errors="surrogateescape")
+    while True:
+        data = source.read1(chunk_size)
+        if not data:
+            break
+        destination.write(rewriter.feed(decoder.decode(data)))
+        destination.flush()
+    destination.write(rewriter.feed(decoder.decode(b"", final=True)))
+    destination.write(rewriter.flush())
+    destination.flush()
+
+
+def run_stream(args):
+    config = load_config(args.config)
+    reverse = (args.command == "deanonymize")
+    stats = engine.RuleStats() if args.stats else None
+    if (stats is not None or args.live) and args.workers > 1:
+        raise ValueError(f"{'--live' if args.live else '--stats'} needs a single worker (-j 1)")
+    if args.format != "text" and (stats is not None or args.workers > 1):
+        raise ValueError(f"--format {args.format} needs a single worker (-j 1) and no --stats")
+    if args.fields and args.format == "text":
+        raise ValueError(f"--fields needs --format {', '.join(structured.FORMATS)}")
+    if args.workers > 1:
+        rewriter = engine.ParallelRewriter(config, reverse=reverse, workers=args.workers)
+    elif args.format != "text":
+        rewriter = structured.open_rewriter(args.format, engine.compile_rules(config, reverse=reverse), args.fields)
+    elif args.live:
+        rewriter = engine.TokenStreamRewriter(engine.compile_rules(config, reverse=reverse), stats=stats)
+    else:
+        rewriter = engine.StreamRewriter(engine.compile_rules(config, reverse=reverse), stats=stats)
+        # Later runs with the same config file skip compiling
+        config_cache.store(resolve_config_path(args.config), config)
+
+    destination = open_text(args.output, "w", args.encoding)
+    try:
+        for path in args.inputs or ["-"]:
+            if args.live:
+                source = sys.stdin.buffer if path == "-" else open(path, "rb")
+            else:
+                source = open_text(path, "r", args.encoding)
+            try:
+                if args.live:
+                    stream_live(source, destination, rewriter, args.encoding, args.chunk_size)
+                else:
+                    stream_rules(source, destination, rewriter, args.chunk_size)
+            finally:
+                if path != "-":
+                    source.close()
+    finally:
+        destination.flush()
+        if args.output != "-":
+            destination.close()
+        if args.workers > 1:
+            rewriter.close()
+
+    if stats is not None:
+        report = stats.to_dict(config, reverse)
+        with open(args.stats, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"{report['total_matches']} matches, {report['rules_without_matches']} of "
+              f"{len(report['rules'])} rules never matched, {report['bytes_per_second'] / 1e6:.2f} MB/s; "
+              f"statistics written to {args.stats}", file=sys.stderr)
+
+
+def collect_files(inputs, exclude=None):
+    """Expand directories and glob patterns into (path, destination path relative to the output)
+
+    With several inputs each destination starts with the basename of its input
+    root, so that src/a.txt and lib/a.txt do not both become a.txt
+    """
+    files = []
+    for item in inputs:
+        if os.path.isdir(item):
+            root = item
+            paths = []
+            for dirpath, dirnames, filenames in os.walk(item):
+                if exclude:
+                    dirnames[:] = [d for d in dirnames
+                                   if os.path.abspath(os.path.join(dirpath, d)) != exclude]
+                paths.extend(os.path.join(dirpath, filename) for filename in sorted(filenames))
+        else:
+            # The root of a glob is the part of the pattern before the first wildcard
+            parts = item.replace("\\", "/").split("/")
+            fixed = []
+            for part in parts[:-1]:
+                if glob.has_magic(part):
+                    break
+                fixed.append(part)
+            root = "/".join(fixed) or "."
+            paths = [path for path in sorted(glob.glob(item, recursive=True)) if os.path.isfile(path)]
+        prefix = os.path.basename(os.path.abspath(root)) if len(inputs) > 1 else ""
+        files.extend((path, os.path.join(prefix, os.path.relpath(path, root))) for path in paths)
+
+    # Two inputs with the same basename, or a file matched by two patterns, would
+    # otherwise silently overwrite one output with another
+    seen = {}
+    for path, relpath in files:
+        key = os.path.normcase(os.path.normpath(relpath))
+        if key in seen:
+            raise ValueError(f"{seen[key]} and {path} would both be written to {relpath}")
+        seen[key] = path
+    return files
+
+
+# Compiled rule set of a batch worker process, built once by init_batch_worker
+_worker_ruleset = None
+
+
+def init_batch_worker(config, reverse):
+    global _worker_ruleset
+    _worker_ruleset = engine.compile_rules(config, reverse=reverse)
+
+
+def process_batch_file(source_path, destination_path, encoding, chunk_size):
+    """Stream one file through the worker's rule set, returning (bytes, seconds, error)"""
+    start = time.perf_counter()
+    try:
+        os.makedirs(os.path.dirname(destination_path) or ".", exist_ok=True)
+        with open_text(source_path, "r", encoding) as source, \
+                open_text(destination_path, "w", encoding) as destination:
+            stream_rules(source, destination, engine.StreamRewriter(_worker_ruleset), chunk_size)
+        return os.path.getsize(source_path), time.perf_counter() - start, None
+    except (OSError, ValueError) as e:
+        return 0, time.perf_counter() - start, str(e)
+
+
+def run_batch(args):
+    config = load_config(args.config)
+    output_dir = os.path.abspath(args.output)
+    files = collect_files(args.inputs, exclude=output_dir)
+    if not files:
+        raise ValueError("No input files found")
+
+    start = time.perf_counter()
+    total_bytes = 0
+    failures = 0
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_batch_worker,
+                             initargs=(config, args.deanonymize)) as pool:
+        futures = [
+            (relpath, pool.submit(process_batch_file, path, os.path.join(output_dir, relpath),
+                                  args.encoding, args.chunk_size))
+            for path, relpath in files
+        ]
+        for relpath, future in futures:
+            size, seconds, error = future.result()
+            total_bytes += size
+            if error:
+                failures += 1
+                print(f"FAILED {relpath}: {error}", file=sys.stderr)
+            elif not args.quiet:
+                print(f"{relpath}  {size / 1e6:.2f} MB  {seconds:.3f}s", file=sys.stderr)
+
+    elapsed = time.perf_counter() - start
+    print(f"{len(files) - failures} files, {total_bytes / 1e6:.1f} MB in {elapsed:.2f}s "
+          f"({total_bytes / 1e6 / elapsed:.1f} MB/s, {len(files) / elapsed:.1f} files/s)",
+          file=sys.stderr)
+    if failures:
+        raise ValueError(f"{failures} file(s) failed")
+
+
+def run_import(args):
+    # A bare name means configs/config_<name>.json, anything else is a path
+    if os.sep in args.config or "/" in args.config or args.config.endswith(".json"):
+        path = args.config
+        config_name = os.path.basename(path).replace("config_", "").replace(".json", "")
+    else:
+        path = config_path(args.config)
+        config_name = args.config
+
+    if os.path.exists(path) and not args.merge and not args.overwrite:
+        raise ValueError(f"{path} already exists, use --merge to add to it or --overwrite to replace it")
+    if os.path.exists(path) and args.merge:
+        config = load_config(path)
+    else:
+        config = engine.new_config(config_name)
+
+    store, report = rule_import.import_rules(args.inputs, RuleStore(config.get('replacements', [])),
+                                             args.format, args.encoding)
+    for message in report.conflict_samples:
+        print(f"CONFLICT {message}", file=sys.stderr)
+    if report.conflicts > len(report.conflict_samples):
+        print(f"... and {report.conflicts - len(report.conflict_samples)} more conflicts", file=sys.stderr)
+    for message in report.skipped_samples:
+        print(f"SKIPPED {message}", file=sys.stderr)
+
+    config['replacements'] = store
+    config['last_modified'] = datetime.now().strftime("%Y-%m-%d")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    save_config(path, config)
+    update_index(path, config)
+    print(f"{report.summary()}, {len(store)} rules written to {path}", file=sys.stderr)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Anonymize or de-anonymize text files without the GUI")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    for command in ("anonymize", "deanonymize"):
+        stream_parser = subparsers.add_parser(command, help=f"{command} files or stdin")
+        stream_parser.add_argument("inputs", nargs="*", help="input files, '-' or nothing for stdin")
+        stream_parser.add_argument("-c", "--config", required=True, help="config name in configs/ or path to a config JSON")
+        stream_parser.add_argument("-o", "--output", default="-", help="output file, stdout by default")
+        stream_parser.add_argument("-j", "--workers", type=int, default=1,
+                                   help="split large inputs into segments processed by this many processes")
+        stream_parser.add_argument("--encoding", default="utf-8")
+        stream_parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="characters read per chunk")
+        stream_parser.add_argument("--live", action="store_true",
+                                   help="pass output on as soon as it is final, e.g. for streamed LLM responses")
+        stream_parser.add_argument("--stats", metavar="FILE",
+                                   help="write per-rule match counts and timings as JSON to FILE")
+        stream_parser.add_argument("--format", choices=("text",) + structured.FORMATS, default="text",
+                                   help="rewrite only values (not keys, headers or SQL outside INSERT values)")
+        stream_parser.add_argument("--fields",
+                                   help="comma-separated JSON keys or paths, CSV columns or SQL [table.]columns to rewrite")
+        stream_parser.set_defaults(handler=run_stream)
+
+    batch_parser = subparsers.add_parser("batch", help="process many files in parallel, mirroring the input tree")
+    batch_parser.add_argument("inputs", nargs="+", help="input directories or glob patterns (quote them)")
+    batch_parser.add_argument("-c", "--config", required=True, help="config name in configs/ or path to a config JSON")
+    batch_parser.add_argument("-o", "--output", required=True, help="output directory")
+    batch_parser.add_argument("-d", "--deanonymize", action="store_true", help="restore originals instead")
+    batch_parser.add_argument("-j", "--workers", type=int, default=os.cpu_count(), help="worker processes")
+    batch_parser.add_argument("-q", "--quiet", action="store_true", help="only print the summary")
+    batch_parser.add_argument("--encoding", default="utf-8")
+    batch_parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="characters read per chunk")
+    batch_parser.set_defaults(handler=run_batch)
+
+    import_parser = subparsers.add_parser("import", help="bulk import rules from CSV, TSV or JSONL files")
+    import_parser.add_argument("inputs", nargs="+", help="CSV/TSV files with original,replacement columns or JSONL")
+    import_parser.add_argument("-c", "--config", required=True, help="config name in configs/ or path of the config to write")
+    import_parser.add_argument("--merge", action="store_true", help="add to the rules of an existing config")
+    import_parser.add_argument("--overwrite", action="store_true", help="replace an existing config")
+    import_parser.add_argument("--format", choices=["csv", "tsv", "jsonl"], help="input format, by extension if omitted")
+    import_parser.add_argument("--encoding", default="utf-8")
+    import_parser.set_defaults(handler=run_import)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        args.handler(args)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,185 @@
+"""Compiled sidecar cache for configs/config_*.json files
+
+The sidecar of a config holds the parsed config plus any of its rule sets that
+were compiled, tagged with the size, mtime and SHA-1 of the JSON (and of its
+change journal) it was built from. The JSON stays the source of truth: a
+sidecar that does not match it is ignored and rewritten later.
+
+Sidecars are pickles, so they live in the user's own cache directory (not
+next to configs that other users may be able to write), are only readable
+by the user, and carry an HMAC under a per-user key that is checked before
+anything is unpickled.
+"""
+import hashlib
+import hmac
+import io
+import json
+import os
+import pickle
+import sys
+
+import config_journal
+import engine
+
+# Bump when the sidecar layout changes so old sidecars are ignored
+CACHE_FORMAT = 3
+MAGIC = b"TXTANON-CACHE\n"
+KEY_FILE = "sidecar.key"
+
+
+def cache_dir():
+    """Per-user directory of the sidecars"""
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser(os.path.join("~", "AppData", "Local"))
+    elif sys.platform == "darwin":
+        base = os.path.expanduser(os.path.join("~", "Library", "Caches"))
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser(os.path.join("~", ".cache"))
+    return os.path.join(base, "text-anonymizer", "configs")
+
+
+def cache_path(path):
+    """Path of the sidecar cache for a config file"""
+    absolute = os.path.abspath(path)
+    name = os.path.splitext(os.path.basename(absolute))[0]
+    digest = hashlib.sha1(absolute.encode("utf-8", "surrogatepass")).hexdigest()[:16]
+    return os.path.join(cache_dir(), f"{name}-{digest}.cache")
+
+
+def _private(path):
+    """True if path belongs to the current user and nobody else can access it"""
+    if not hasattr(os, "getuid"):
+        # Windows: the local app data directory is already per-user
+        return True
+    stat = os.stat(path)
+    return stat.st_uid == os.getuid() and not stat.st_mode & 0o077
+
+
+def _open_private(path, flags):
+    return os.open(path, flags | getattr(os, "O_BINARY", 0) | getattr(os, "O_NOFOLLOW", 0), 0o600)
+
+
+def _sidecar_key(create=False):
+    """The per-user HMAC key of the sidecars, or None if there is none or it is not private"""
+    directory = cache_dir()
+    path = os.path.join(directory, KEY_FILE)
+    try:
+        if create:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+            try:
+                descriptor = _open_private(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL)
+            except FileExistsError:
+                pass
+            else:
+                with os.fdopen(descriptor, 'wb') as f:
+                    f.write(os.urandom(32))
+        if not _private(directory) or not _private(path):
+            return None
+        with os.fdopen(_open_private(path, os.O_RDONLY), 'rb') as f:
+            key = f.read()
+        return key if len(key) == 32 else None
+    except OSError:
+        return None
+
+
+def _fingerprint(path, data, journal):
+    stat = os.stat(path)
+    return (CACHE_FORMAT, len(data), stat.st_mtime_ns, hashlib.sha1(data).hexdigest(),
+            len(journal), hashlib.sha1(journal).hexdigest())
+
+
+def _read_sidecar(path, fingerprint, with_rulesets=True):
+    """(config, {key: ruleset}) from a fresh, authentic sidecar, or None"""
+    secret = _sidecar_key()
+    if secret is None:
+        return None
+    try:
+        with os.fdopen(_open_private(cache_path(path), os.O_RDONLY), 'rb') as f:
+            content = f.read()
+        digest_end = len(MAGIC) + hashlib.sha256().digest_size
+        if not content.startswith(MAGIC):
+            return None
+        signature, payload = content[len(MAGIC):digest_end], memoryview(content)[digest_end:]
+        if not hmac.compare_digest(signature, hmac.new(secret, payload, hashlib.sha256).digest()):
+            return None
+        # Authentic, so written by this user's own store() and safe to unpickle
+        f = io.BytesIO(payload)
+        header, keys = pickle.load(f)
+        if header != fingerprint:
+            return None
+        config = pickle.load(f)
+        return config, pickle.load(f) if with_rulesets else dict.fromkeys(keys)
+    except Exception:
+        # Missing, stale or unreadable sidecars are simply rebuilt
+        return None
+
+
+def load_config(path):
+    """Load a config file and its journal, taking the config and compiled rule sets from a fresh sidecar"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    journal = config_journal.read_journal(path)
+    cached = _read_sidecar(path, _fingerprint(path, data, journal))
+    if cached is None:
+        return config_journal.replay(json.loads(data), journal)
+    config, rulesets = cached
+    for key, ruleset in rulesets.items():
+        engine.ruleset_cache.put(key, ruleset)
+    return config
+
+
+def store(path, config):
+    """Write the sidecar of a config that matches the file at path and its journal
+
+    Nothing is compiled here: the rule sets of config that are already in
+    engine.ruleset_cache are stored along with those the sidecar already had.
+    Returns True if the sidecar was (re)written. Failures are ignored, the
+    cache is only an accelerator.
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+        fingerprint = _fingerprint(path, data, config_journal.read_journal(path))
+
+        rulesets = {}
+        for reverse in (False, True):
+            key = engine.ruleset_cache.key(config, reverse)
+            ruleset = engine.ruleset_cache.cached(key)
+            if ruleset is not None:
+                rulesets[key] = ruleset
+
+        cached = _read_sidecar(path, fingerprint, with_rulesets=False)
+        if cached is not None:
+            if set(rulesets) <= set(cached[1]):
+                return False
+            # Keep rule sets that only the old sidecar has
+            old = _read_sidecar(path, fingerprint)
+            if old is not None:
+                rulesets = dict(old[1], **rulesets)
+
+        secret = _sidecar_key(create=True)
+        if secret is None:
+            return False
+        payload = io.BytesIO()
+        pickle.dump((fingerprint, sorted(rulesets)), payload, pickle.HIGHEST_PROTOCOL)
+        pickle.dump(config, payload, pickle.HIGHEST_PROTOCOL)
+        pickle.dump(rulesets, payload, pickle.HIGHEST_PROTOCOL)
+        payload = payload.getbuffer()
+
+        temp_path = f"{cache_path(path)}.{os.getpid()}.tmp"
+        with os.fdopen(_open_private(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC), 'wb') as f:
+            f.write(MAGIC)
+            f.write(hmac.new(secret, payload, hashlib.sha256).digest())
+            f.write(payload)
+        os.replace(temp_path, cache_path(path))
+        return True
+    except (OSError, pickle.PicklingError):
+        return False
+
+
+def remove(path):
+    """Delete the sidecar of a config file, if any"""
+    try:
+        os.remove(cache_path(path))
+    except FileNotFoundError:
+        pass
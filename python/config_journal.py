@@ -0,0 +1,122 @@
+"""Append-only change journal for configs/config_*.json files
+
+config_<name>.journal holds one JSON object per line describing a rule
+change made after config_<name>.json was last written:
+
+    {"op": "add", "original": ..., "replacement": ...}
+    {"op": "update", "old": ..., "original": ..., "replacement": ...}
+    {"op": "remove", "original": ...}
+    {"op": "last_modified", "date": ...}
+
+Loading a config replays its journal; saving the whole config removes it.
+Replaying is idempotent, so a journal left behind by a save that was
+interrupted after the JSON was replaced does no harm.
+"""
+import json
+import os
+
+from rule_store import RuleStore
+
+# A journal is folded back into the JSON once it is this large, or a quarter of the JSON
+COMPACT_MIN_SIZE = 64 * 1024
+
+
+def journal_path(path):
+    """Path of the change journal for a config file"""
+    return os.path.splitext(path)[0] + ".journal"
+
+
+def read_journal(path):
+    """Raw journal of a config file, b"" if it has none"""
+    try:
+        with open(journal_path(path), 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        return b""
+
+
+def replay(config, journal):
+    """Apply the changes of a raw journal to a config dict in place"""
+    if not journal:
+        return config
+    rules = RuleStore(config.get('replacements', []))
+    for line in journal.splitlines():
+        try:
+            change = json.loads(line)
+        except ValueError:
+            # Torn last line of an interrupted append
+            continue
+        op = change.get('op')
+        if op == 'last_modified':
+            config['last_modified'] = change['date']
+        elif op == 'remove':
+            if change['original'] in rules:
+                rules.remove(change['original'])
+        elif op in ('add', 'update'):
+            old = change.get('old', change['original'])
+            original = change['original']
+            if old not in rules:
+                old = original
+            if original != old and original in rules:
+                rules.remove(original)
+            if old in rules:
+                rules.update(old, original, change['replacement'])
+            else:
+                rules.add(original, change['replacement'])
+    config['replacements'] = rules.to_list()
+    return config
+
+
+def coalesce_change(changes, change):
+    """Add a change to a pending batch, folding it into an earlier change of the same rule
+
+    add + update becomes one add, update + update one update, add + remove
+    cancels out and update + remove becomes a remove of the old original.
+    """
+    key = change.get('old', change['original'])
+    new_key = change['original']
+    for index in range(len(changes) - 1, -1, -1):
+        earlier = changes[index]
+        touched = (earlier['original'], earlier.get('old'))
+        if key not in touched:
+            if new_key in touched:
+                break
+            continue
+        if earlier['original'] == key and earlier['op'] != 'remove':
+            if change['op'] == 'remove':
+                if earlier['op'] == 'add':
+                    del changes[index]
+                else:
+                    changes[index] = {'op': 'remove', 'original': earlier['old']}
+                return
+            if change['op'] == 'update':
+                changes[index] = dict(earlier, original=change['original'],
+                                      replacement=change['replacement'])
+                return
+        break
+    changes.append(change)
+
+
+def append(path, changes, last_modified=None):
+    """Durably append changes to the journal of a config file, returning the journal size"""
+    lines = [json.dumps(change) + "\n" for change in changes]
+    if last_modified:
+        lines.append(json.dumps({'op': 'last_modified', 'date': last_modified}) + "\n")
+    with open(journal_path(path), 'a', encoding='utf-8') as f:
+        f.write("".join(lines))
+        f.flush()
+        os.fsync(f.fileno())
+        return f.tell()
+
+
+def needs_compaction(path, journal_size):
+    """True once the journal is large enough that rewriting the JSON is worth it"""
+    return journal_size > max(COMPACT_MIN_SIZE, os.path.getsize(path) // 4)
+
+
+def remove(path):
+    """Delete the journal of a config file, if any"""
+    try:
+        os.remove(journal_path(path))
+    except FileNotFoundError:
+        pass
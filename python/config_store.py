@@ -0,0 +1,185 @@
+"""Reading and writing configs/config_*.json files"""
+import json
+import os
+
+import config_cache
+import config_journal
+
+CONFIGS_DIR = os.path.join(os.getcwd(), "configs")
+# Metadata of every config file, so listing configs does not open them
+INDEX_PATH = os.path.join(CONFIGS_DIR, "index.json")
+# Bump when the index layout changes so old indexes are rebuilt
+INDEX_VERSION = 1
+
+
+def config_path(config_name):
+    """Path of the config file for a config name"""
+    return os.path.join(CONFIGS_DIR, f"config_{config_name}.json")
+
+
+def config_name_of(path):
+    """Config name of a configs/config_<name>.json path"""
+    return os.path.basename(path)[len("config_"):-len(".json")]
+
+
+def resolve_config_path(name_or_path):
+    """Accept either a path to a config file or the name of a config in CONFIGS_DIR"""
+    if os.path.isfile(name_or_path):
+        return name_or_path
+    return config_path(name_or_path)
+
+
+def load_config(name_or_path):
+    """Load a configuration in the configs/config_*.json format
+
+    A fresh compiled sidecar (see config_cache) is used instead of parsing the
+    JSON, and its compiled rule sets are added to engine.ruleset_cache.
+    """
+    return config_cache.load_config(resolve_config_path(name_or_path))
+
+
+def config_metadata(path, config=None):
+    """Index entry of a config file, reading it only if config is not given"""
+    stat = os.stat(path)
+    entry = {'name': config_name_of(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+             'journal_size': _journal_size(path),
+             'rule_count': None, 'created_date': None, 'last_modified': None}
+    try:
+        if config is None:
+            with open(path, 'r') as f:
+                config = config_journal.replay(json.load(f), config_journal.read_journal(path))
+        entry['rule_count'] = len(config.get('replacements', []))
+        entry['created_date'] = config.get('created_date')
+        entry['last_modified'] = config.get('last_modified')
+    except (OSError, ValueError, AttributeError):
+        # Unreadable configs are still listed, loading them reports the error
+        pass
+    return entry
+
+
+def _journal_size(path):
+    try:
+        return os.path.getsize(config_journal.journal_path(path))
+    except OSError:
+        return 0
+
+
+def _read_index():
+    try:
+        with open(INDEX_PATH, 'r') as f:
+            index = json.load(f)
+        if index.get('version') == INDEX_VERSION:
+            return index['configs']
+    except (OSError, ValueError, AttributeError, KeyError):
+        pass
+    return {}
+
+
+def _write_index(entries):
+    temp_path = INDEX_PATH + ".tmp"
+    try:
+        with open(temp_path, 'w') as f:
+            json.dump({'version': INDEX_VERSION, 'configs': entries}, f, indent=2)
+        os.replace(temp_path, INDEX_PATH)
+    except OSError:
+        # The index is only an accelerator, listing still works without it
+        pass
+
+
+def list_configs():
+    """Index entries of the configs in CONFIGS_DIR, sorted by name
+
+    Only files whose size or mtime differ from the index are opened, and the
+    index is rewritten only when something changed.
+    """
+    entries = _read_index()
+    files = {}
+    journal_sizes = {}
+    try:
+        with os.scandir(CONFIGS_DIR) as scan:
+            for dir_entry in scan:
+                if dir_entry.name.startswith("config_") and dir_entry.name.endswith(".json"):
+                    files[config_name_of(dir_entry.name)] = dir_entry
+                elif dir_entry.name.startswith("config_") and dir_entry.name.endswith(".journal"):
+                    journal_sizes[dir_entry.name[len("config_"):-len(".journal")]] = dir_entry.stat().st_size
+    except FileNotFoundError:
+        pass
+
+    listed = {}
+    for name, dir_entry in files.items():
+        stat = dir_entry.stat()
+        entry = entries.get(name)
+        if (entry is None or entry['size'] != stat.st_size or entry['mtime_ns'] != stat.st_mtime_ns
+                or entry.get('journal_size', 0) != journal_sizes.get(name, 0)):
+            try:
+                entry = config_metadata(dir_entry.path)
+            except OSError:
+                continue
+        listed[name] = entry
+    if listed != entries:
+        _write_index(listed)
+    return [listed[name] for name in sorted(listed, key=str.lower)]
+
+
+def update_index(path, config):
+    """Record a config that was just written to path, returning its index entry"""
+    entry = config_metadata(path, config)
+    if os.path.dirname(os.path.abspath(path)) == os.path.abspath(CONFIGS_DIR):
+        entries = _read_index()
+        entries[entry['name']] = entry
+        _write_index(entries)
+    return entry
+
+
+def remove_from_index(path):
+    """Forget a config file that was deleted"""
+    entries = _read_index()
+    if entries.pop(config_name_of(path), None) is not None:
+        _write_index(entries)
+
+
+def save_config(path, config):
+    """Atomically replace the config file at path, folding in and removing its journal
+
+    The config is written to a temporary file that is renamed over path, so
+    an interrupted save leaves the previous file intact.
+    """
+    temp_path = path + ".tmp"
+    try:
+        with open(temp_path, 'w') as f:
+            write_config(f, config)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    config_journal.remove(path)
+
+
+def write_config(f, config):
+    """Write config to an open file exactly like json.dump(config, f, indent=2)
+
+    The rules are written one at a time, so a large rule collection is never
+    turned into one big string in memory.
+    """
+    f.write("{")
+    for index, (key, value) in enumerate(config.items()):
+        f.write("," if index else "")
+        f.write("\n  " + json.dumps(key) + ": ")
+        if key == 'replacements':
+            _write_rules(f, value)
+        else:
+            f.write(json.dumps(value, indent=2).replace("\n", "\n  "))
+    f.write("\n}" if config else "}")
+
+
+def _write_rules(f, rules):
+    empty = True
+    for rule in rules:
+        f.write("[\n" if empty else ",\n")
+        empty = False
+        f.write("    {\n      \"original\": " + json.dumps(rule['original']) +
+                ",\n      \"replacement\": " + json.dumps(rule['replacement']) + "\n    }")
+    f.write("[]" if empty else "\n  ]")
@@ -0,0 +1,1023 @@
+"""Qt-free anonymization engine shared by the GUI and headless tools
+
+    from engine import anonymize, deanonymize
+    anonymous = anonymize(text, config)
+    restored = deanonymize(anonymous, config)
+
+config is a dict in the configs/config_*.json format.
+"""
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+import weakref
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import _sre
+
+try:
+    from re import _compiler as _sre_compiler, _parser as _sre_parser
+except ImportError:  # Python < 3.11
+    import sre_compile as _sre_compiler
+    import sre_parse as _sre_parser
+
+# Target size of the segments a document is split into for parallel processing
+SEGMENT_SIZE = 4 * 1024 * 1024
+# How far back to look for a safe cut before giving up on a split point
+SAFE_CUT_SEARCH = 64 * 1024
+# Most case-mapped replacements remembered per compiled rule set
+CASE_VARIANT_LIMIT = 65536
+# Nesting depth of the prefix-factored rule regex, deeper subtrees are flattened
+TRIE_MAX_DEPTH = 64
+# _compile_regex relies on the private compiler and _sre.compile signature of
+# these CPython versions; anywhere else regexes are always compiled with re.compile
+SRE_PROGRAMS = sys.implementation.name == "cpython" and (3, 8) <= sys.version_info[:2] <= (3, 13)
+# Compiled regex programs are only reused by exactly the interpreter that built them
+SRE_VERSION = (sys.implementation.name, tuple(sys.version_info[:3]), _sre.MAGIC, _sre.CODESIZE)
+
+
+def fold_case(text):
+    """Lower-case text one character at a time so lengths stay aligned with re.IGNORECASE"""
+    folded = text.lower()
+    if len(folded) == len(text):
+        return folded
+    # A few characters (e.g. 'İ') expand when lower-cased; keep those as they are
+    return "".join(c.lower() if len(c.lower()) == 1 else c for c in text)
+
+
+def preserve_case_pattern(original_match, replacement):
+    """Preserve the case pattern of the original match in the replacement"""
+    if len(original_match) == 0:
+        return replacement
+
+    # Matches without upper-case characters and uniformly upper- or title-cased
+    # ones map straight onto str methods, cheapest checks first. For an ASCII
+    # replacement these agree with the per-character rule (str.lower() treats a
+    # final sigma specially)
+    if replacement.isascii():
+        if original_match.islower():
+            return replacement.lower()
+        if original_match.isupper():
+            if original_match.isalpha() and original_match.isascii():
+                length = len(original_match)
+                return replacement[:length].upper() + replacement[length:].lower()
+        elif original_match[1:].islower():
+            if original_match[0].isupper():
+                return replacement[:1].upper() + replacement[1:].lower()
+        elif original_match.isascii() and original_match.lower() == original_match:
+            # No cased characters at all, e.g. digits
+            return replacement.lower()
+
+    # Mixed case: apply the pattern per character, extra chars become lowercase
+    result = ""
+    for char, case in zip(replacement, original_match):
+        result += char.upper() if case.isupper() else char.lower()
+    if len(replacement) <= len(original_match):
+        return result
+    rest = replacement[len(original_match):]
+    if rest.isascii():
+        return result + rest.lower()
+    return result + "".join([char.lower() for char in rest])
+
+
+def _prefix_fold(text):
+    """Fold text so that characters re.IGNORECASE treats as equal (e.g. 'ſ' and 's') compare equal"""
+    folded = text.upper().lower()
+    if len(folded) == len(text):
+        return folded
+    return "".join(c.upper().lower() if len(c.upper().lower()) == 1 else c for c in text)
+
+
+def _is_word(char):
+    """True for the characters \\w matches, so \\b lies between a word and a non-word character"""
+    return char.isalnum() or char == "_"
+
+
+def _build_trie(words):
+    """Build a character trie where the '' key marks the end of a word"""
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = True
+    return trie
+
+
+def _trie_words(node):
+    """Every word below a trie node, as suffixes of the node ('' if a word ends there)"""
+    words = []
+    stack = [(node, "")]
+    while stack:
+        node, prefix = stack.pop()
+        for char, child in node.items():
+            if char:
+                stack.append((child, prefix + char))
+            else:
+                words.append(prefix)
+    return words
+
+
+def _trie_to_regex(node, depth=0):
+    """Turn a trie into a prefix-factored alternation that prefers the longest match
+
+    Below TRIE_MAX_DEPTH nested levels (long chains of rules that are prefixes of
+    each other) the rest of the subtree becomes a flat alternation, longest first,
+    so the regex parser does not run out of recursion.
+    """
+    if depth >= TRIE_MAX_DEPTH:
+        words = _trie_words(node)
+        words.sort(key=lambda word: (-len(word), word))
+        body = "|".join(re.escape(word) for word in words if word)
+        if not body:
+            return ""
+        return "(?:" + body + ")" + ("?" if "" in words else "")
+
+    branches = []
+    for char in sorted(key for key in node if key):
+        child = node[char]
+        # Collapse single-child chains into one literal
+        chunk = [char]
+        while len(child) == 1 and "" not in child:
+            (char, child), = child.items()
+            chunk.append(char)
+        branches.append(re.escape("".join(chunk)) + _trie_to_regex(child, depth + 1))
+
+    if not branches:
+        return ""
+    body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    if "" in node:
+        # The word may end here, but the greedy '?' tries the longer words first
+        return "(?:" + body + ")?"
+    return body
+
+
+def _compile_regex(pattern, flags):
+    """re.compile that also returns the compiled regex program, or None if unavailable
+
+    The program lets a pickled rule set be restored without parsing the pattern
+    again, which is most of the compile time for large rule sets. It is only
+    produced on the CPython versions of SRE_PROGRAMS.
+    """
+    if not SRE_PROGRAMS:
+        return re.compile(pattern, flags), None
+    try:
+        parsed = _sre_parser.parse(pattern, flags)
+        code = _sre_compiler._code(parsed, flags)
+        groups = parsed.state.groups
+        compiled = _sre.compile(pattern, flags | parsed.state.flags, code, groups - 1,
+                                parsed.state.groupdict, (None,) * groups)
+        program = array('I', code)
+        if program.itemsize != _sre.CODESIZE:
+            program = None
+        return compiled, program
+    except Exception:
+        return re.compile(pattern, flags), None
+
+
+def _restore_regex(source, flags, groups, program, version):
+    """Rebuild a regex from _compile_regex output, recompiling if the program cannot be used"""
+    if program is not None and SRE_PROGRAMS and version == SRE_VERSION:
+        try:
+            return _sre.compile(source, flags, program.tolist(), groups, {}, (None,) * (groups + 1)), program
+        except Exception:
+            pass
+    return _compile_regex(source, flags)
+
+
+class CompiledRuleSet:
+    """All replacement rules compiled into a single regular expression.
+
+    The text is scanned once; at every position the longest matching rule wins and
+    ties (only possible in case-insensitive mode) go to the earlier rule.
+    """
+
+    def __init__(self, pairs, case_insensitive=False, whole_words_only=True):
+        self.case_insensitive = case_insensitive
+        self.whole_words_only = whole_words_only
+
+        # Map of match key -> (source, target), first rule wins on duplicates
+        self.targets = {}
+        for source, target in pairs:
+            if not source:
+                continue
+            key = fold_case(source) if case_insensitive else source
+            if key not in self.targets:
+                self.targets[key] = (source, target)
+        self.max_length = max((len(source) for source, _ in self.targets.values()), default=0)
+        # Case-insensitive mode: matched text -> case-mapped replacement, filled as shapes are seen
+        self.case_variants = {}
+        # Sorted match keys and their first characters, built on first use by pending_start
+        self.prefix_keys = None
+        # Whole-text match key -> target, built on first use by sub_many
+        self.exact_targets = None
+
+        self.pattern = None
+        self.program = None
+        if self.targets:
+            pattern = _trie_to_regex(_build_trie(self.targets))
+            if whole_words_only:
+                pattern = r"\b" + pattern + r"\b"
+            self.pattern, self.program = _compile_regex(pattern, re.IGNORECASE if case_insensitive else 0)
+
+    def __getstate__(self):
+        # Pickle the regex program rather than the pattern, which would be recompiled on load
+        state = dict(self.__dict__, case_variants={}, prefix_keys=None, exact_targets=None)
+        if self.pattern is not None:
+            state['pattern'] = (self.pattern.pattern, self.pattern.flags, self.pattern.groups,
+                                self.program, SRE_VERSION)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.pattern is not None:
+            self.pattern, self.program = _restore_regex(*self.pattern)
+
+    @classmethod
+    def from_config(cls, config, reverse=False):
+        """Compile the rules of a config dict, reverse=True maps replacements back to originals"""
+        rules = config.get('replacements', [])
+        if reverse:
+            pairs = [(rule['replacement'], rule['original']) for rule in reversed(rules)]
+        else:
+            pairs = [(rule['original'], rule['replacement']) for rule in rules]
+        return cls(pairs,
+                   case_insensitive=config.get('case_insensitive', False),
+                   whole_words_only=config.get('whole_words_only', True))
+
+    def lookup(self, matched_text):
+        """Return the (source, target) rule that produced a match"""
+        if not self.case_insensitive:
+            return self.targets[matched_text]
+        rule = self.targets.get(fold_case(matched_text))
+        if rule is None:
+            # Characters that IGNORECASE treats as equal but lower() does not (e.g. 'ſ')
+            for source, target in self.targets.values():
+                if re.fullmatch(re.escape(source), matched_text, re.IGNORECASE):
+                    return source, target
+        return rule
+
+    def replace_match(self, match):
+        """Replacement text for a match of self.pattern"""
+        matched_text = match.group(0)
+        if not self.case_insensitive:
+            return self.targets[matched_text][1]
+
+        # The same identifier usually shows up in only a few case shapes
+        replacement = self.case_variants.get(matched_text)
+        if replacement is None:
+            replacement = preserve_case_pattern(matched_text, self.lookup(matched_text)[1])
+            if len(self.case_variants) < CASE_VARIANT_LIMIT:
+                self.case_variants[matched_text] = replacement
+        return replacement
+
+    def counted_replace_match(self, match, stats):
+        """replace_match that records the match and its cost in a RuleStats"""
+        began = time.perf_counter()
+        replacement = self.replace_match(match)
+        stats.record(self.lookup(match.group(0))[0], time.perf_counter() - began)
+        return replacement
+
+    def sub(self, text, ledger=None, stats=None):
+        """Apply every rule to text in a single pass, optionally recording a Ledger and RuleStats"""
+        if self.pattern is None:
+            return text
+        if ledger is None and stats is None:
+            return self.pattern.sub(self.replace_match, text)
+        pieces, position = self.rewrite_range(text, 0, len(text), ledger, stats=stats)
+        pieces.append(text[position:])
+        return "".join(pieces)
+
+    def sub_many(self, texts, whole_cells_only=False):
+        """Apply every rule to each of many short texts (rows, cells, fields), yielding the results in order
+
+        A text that equals a rule's source as a whole is looked up in a dict
+        instead of being scanned. With whole_cells_only=True nothing else is
+        replaced, so only cells that are exactly an original change. Values
+        that are not strings (None, numbers) are passed through unchanged.
+        """
+        if self.pattern is None:
+            yield from texts
+            return
+        if getattr(self, 'exact_targets', None) is None:
+            # A source is only matched as a whole text if \b holds at both ends of it
+            exact = {key: target for key, (source, target) in self.targets.items()
+                     if not self.whole_words_only or (_is_word(source[0]) and _is_word(source[-1]))}
+            # IGNORECASE equates a few characters that lower() does not (e.g. 'ſ' and 's'), so
+            # case-insensitive lookups are only exact for ASCII texts and ASCII sources
+            self.exact_targets = (exact, not self.case_insensitive or all(key.isascii() for key in exact))
+        exact, ascii_keys = self.exact_targets
+        scan = None if whole_cells_only else self.pattern.sub
+        replace_match = self.replace_match
+
+        if not self.case_insensitive:
+            for text in texts:
+                target = exact.get(text) if isinstance(text, str) else None
+                if target is not None:
+                    yield target
+                elif scan is None or not isinstance(text, str):
+                    yield text
+                else:
+                    yield scan(replace_match, text)
+            return
+
+        fullmatch = self.pattern.fullmatch
+        case_variants = self.case_variants
+        for text in texts:
+            if not isinstance(text, str):
+                yield text
+            elif ascii_keys and text.isascii():
+                target = exact.get(text.lower())
+                if target is None:
+                    yield text if scan is None else scan(replace_match, text)
+                    continue
+                replacement = case_variants.get(text)
+                if replacement is None:
+                    replacement = preserve_case_pattern(text, target)
+                    if len(case_variants) < CASE_VARIANT_LIMIT:
+                        case_variants[text] = replacement
+                yield replacement
+            elif scan is not None:
+                yield scan(replace_match, text)
+            else:
+                match = fullmatch(text)
+                yield replace_match(match) if match else text
+
+    def rewrite_range(self, text, start, end, ledger=None, offset=0, stats=None):
+        """Replace the matches that start within text[start:end]
+
+        Returns the output pieces and the position after the last match, which may
+        lie past end. Ledger spans are recorded relative to offset, the output
+        position of text[start]. Matches are counted in stats if given.
+        """
+        pieces = []
+        position = start
+        written = offset
+        if self.pattern is not None:
+            for match in self.pattern.finditer(text, start):
+                if match.start() >= end:
+                    break
+                before = text[position:match.start()]
+                if stats is None:
+                    replacement = self.replace_match(match)
+                else:
+                    replacement = self.counted_replace_match(match, stats)
+                if ledger is not None:
+                    written += len(before)
+                    replacement = ledger.record(written, match.group(0), replacement)
+                    written += len(replacement)
+                pieces.append(before)
+                pieces.append(replacement)
+                position = match.end()
+        return pieces, position
+
+    def edits(self, text, start, end, ledger=None, shift=0, stats=None):
+        """Replacements for the matches that start within text[start:end], without building the output
+
+        Returns a list of (match_start, match_end, replacement), the position to
+        continue from (past end if a match crossed it) and the new shift, the output
+        offset minus the input offset. The scan never looks further than
+        max_length + 1 characters past end, so consecutive ranges find exactly the
+        matches of one full scan. Ledger spans are recorded at output offsets and
+        matches are counted in stats if given.
+        """
+        found = []
+        position = start
+        if self.pattern is not None:
+            for match in self.pattern.finditer(text, start, min(end + self.max_length + 1, len(text))):
+                if match.start() >= end:
+                    break
+                if stats is None:
+                    replacement = self.replace_match(match)
+                else:
+                    replacement = self.counted_replace_match(match, stats)
+                if ledger is not None:
+                    replacement = ledger.record(match.start() + shift, match.group(0), replacement)
+                shift += len(replacement) - (match.end() - match.start())
+                found.append((match.start(), match.end(), replacement))
+                position = match.end()
+        return found, max(position, end), shift
+
+    def sub_window(self, window, start, end):
+        """Rewrite window[start:end], the characters around it only serve as context
+
+        start and end must be safe cuts (see is_safe_cut) and the window must extend
+        at least max_length + 1 characters past end unless the text ends there.
+        """
+        pieces, position = self.rewrite_range(window, start, end)
+        pieces.append(window[position:end])
+        return "".join(pieces)
+
+    def pending_start(self, text, start=0):
+        """Start of the shortest suffix of text that more input could still turn into a match
+
+        Every match that starts before the returned position is already decided, so
+        the text up to there can be rewritten and emitted; len(text) means nothing
+        needs to wait. Only suffixes that are a prefix of some rule's source (and,
+        in whole-words mode, start at a word boundary) are held back. text[start - 1]
+        is used as the character before a match at start, if there is one.
+        """
+        if self.pattern is None:
+            return len(text)
+        if getattr(self, 'prefix_keys', None) is None:
+            keys = sorted({_prefix_fold(key) for key in self.targets} if self.case_insensitive else self.targets)
+            self.prefix_keys = (keys, {key[0] for key in keys})
+        keys, first_chars = self.prefix_keys
+
+        lower = max(start, len(text) - self.max_length)
+        tail = text[lower:]
+        if self.case_insensitive:
+            tail = _prefix_fold(tail)
+        before = text[lower - 1] if lower else ""
+        for offset, char in enumerate(tail):
+            if char in first_chars and (not self.whole_words_only or _is_word(before) != _is_word(char)):
+                suffix = tail[offset:]
+                index = bisect_left(keys, suffix)
+                if index < len(keys) and keys[index].startswith(suffix):
+                    return lower + offset
+            before = text[lower + offset]
+        return len(text)
+
+    def is_safe_cut(self, text, position):
+        """True if no match can span position, wherever the scan happens to resume
+
+        Text on either side of a safe cut can be rewritten independently and the
+        results concatenated.
+        """
+        if self.pattern is None:
+            return True
+        for start in range(max(position - self.max_length + 1, 0), position):
+            match = self.pattern.match(text, start)
+            if match and match.end() > position:
+                return False
+        return True
+
+    def find_safe_cut(self, text, position, lower):
+        """Closest safe cut at or before position and above lower, or None"""
+        for candidate in range(position, max(lower, position - SAFE_CUT_SEARCH), -1):
+            if self.is_safe_cut(text, candidate):
+                return candidate
+        return None
+
+
+class StreamRewriter:
+    """Apply a CompiledRuleSet to text that arrives in pieces
+
+    Output is identical to ruleset.sub() on the whole text. Only the last
+    max_length + 1 characters are held back, since a match starting before
+    that point (and the word boundary after it) is already fully decided.
+    With a RuleStats, matches and scan time are recorded as text passes.
+    """
+
+    def __init__(self, ruleset, ledger=None, stats=None):
+        self.ruleset = ruleset
+        self.ledger = ledger
+        self.stats = stats
+        self.holdback = ruleset.max_length + 1
+        # Last emitted character, kept so \b at the start of pending text sees its neighbour
+        self.context = ""
+        self.pending = ""
+        self.emitted = 0
+
+    def feed(self, text):
+        """Add text and return the part of the output that is now final"""
+        self.pending += text
+        return self._rewrite(final=False)
+
+    def flush(self):
+        """Return the rest of the output once the input has ended, ready for the next input"""
+        output = self._rewrite(final=True)
+        self.context = ""
+        self.emitted = 0
+        return output
+
+    def _rewrite(self, final):
+        buffer = self.context + self.pending
+        start = len(self.context)
+        cut = len(buffer) if final else self._cut(buffer, start)
+        if cut <= start:
+            return ""
+
+        began = time.perf_counter()
+        pieces, position = self.ruleset.rewrite_range(buffer, start, cut, self.ledger, self.emitted,
+                                                      self.stats)
+        end = max(cut, position)
+        if self.stats is not None:
+            self.stats.add_scan(buffer[start:end], time.perf_counter() - began)
+        pieces.append(buffer[position:end])
+        output = "".join(pieces)
+        self.emitted += len(output)
+
+        self.context = buffer[end - 1:end]
+        self.pending = buffer[end:]
+        return output
+
+    def _cut(self, buffer, start):
+        """Position up to which buffer can be rewritten before the input has ended"""
+        return len(buffer) - self.holdback
+
+
+class TokenStreamRewriter(StreamRewriter):
+    """StreamRewriter for many tiny pieces, e.g. the tokens of a streamed LLM response
+
+    Instead of always holding back max_length + 1 characters, only the suffix
+    that could still grow into a match (see CompiledRuleSet.pending_start) waits
+    for more input; everything before it is emitted at once. Output is still
+    identical to ruleset.sub() on the whole text.
+    """
+
+    def _cut(self, buffer, start):
+        return self.ruleset.pending_start(buffer, start)
+
+
+class RuleStats:
+    """Per-rule match counts and replacement time of instrumented runs
+
+    The rules share a single scan, so its time is only known in total; per rule
+    the time spent producing replacements (lookup and case mapping) is measured.
+    With isolated=True, profile_rules also times each rule's own scan of the text.
+    """
+
+    def __init__(self):
+        # Rule source (original, or replacement when de-anonymizing) -> count / seconds
+        self.matches = {}
+        self.seconds = {}
+        self.isolated_seconds = {}
+        self.scan_seconds = 0.0
+        self.characters = 0
+        self.bytes = 0
+
+    def record(self, source, seconds):
+        self.matches[source] = self.matches.get(source, 0) + 1
+        self.seconds[source] = self.seconds.get(source, 0.0) + seconds
+
+    def add_scan(self, text, seconds):
+        """Account for a scanned piece of text"""
+        self.scan_seconds += seconds
+        self.characters += len(text)
+        self.bytes += len(text.encode("utf-8", "surrogatepass"))
+
+    @property
+    def bytes_per_second(self):
+        return self.bytes / self.scan_seconds if self.scan_seconds else 0.0
+
+    def to_dict(self, config, reverse=False):
+        """JSON-ready report with one entry per rule of config, in rule order"""
+        rules = []
+        for rule in config.get('replacements', []):
+            source = rule['replacement'] if reverse else rule['original']
+            rules.append({
+                'original': rule['original'],
+                'replacement': rule['replacement'],
+                'matches': self.matches.get(source, 0),
+                'seconds': round(self.seconds.get(source, 0.0), 6),
+                'isolated_seconds': (round(self.isolated_seconds[source], 6)
+                                     if source in self.isolated_seconds else None),
+            })
+        return {
+            'direction': "deanonymize" if reverse else "anonymize",
+            'scan_seconds': round(self.scan_seconds, 6),
+            'characters': self.characters,
+            'bytes': self.bytes,
+            'bytes_per_second': round(self.bytes_per_second),
+            'total_matches': sum(self.matches.values()),
+            'rules_without_matches': sum(1 for rule in rules if not rule['matches']),
+            'rules': rules,
+        }
+
+
+class Ledger:
+    """Where each replacement landed in an anonymized text, for exact de-anonymization
+
+    Spans are stored as compact arrays of output offsets plus an index into the
+    list of distinct originals. As long as the anonymized text is unchanged it can
+    be restored by splicing the originals back in, a single linear pass. tokens maps
+    every emitted token to its original; with unique_tokens=True no two originals
+    share a token, so that mapping is unambiguous even after the text was edited.
+    With case_insensitive=True tokens that differ only in case count as the same,
+    as they do when the tokens are matched again.
+    """
+
+    def __init__(self, unique_tokens=False, reserved_tokens=(), case_insensitive=False):
+        self.unique_tokens = unique_tokens
+        self.case_insensitive = case_insensitive
+        self.starts = array('q')
+        self.ends = array('q')
+        self.original_ids = array('l')
+        self.originals = []
+        self._original_index = {}
+        self.tokens = {}
+        self._token_of = {}
+        # Tokens that already occur in the input and must not be handed out again,
+        # and the tokens handed out so far, both case-folded if case_insensitive
+        self.reserved_tokens = {self._fold(token) for token in reserved_tokens}
+        self._issued = set()
+        self.text_length = None
+        self.text_hash = None
+
+    def record(self, start, original, token):
+        """Record a replacement at output offset start and return the token to emit"""
+        if self.unique_tokens:
+            token = self._unique_token(original, token)
+        else:
+            self.tokens.setdefault(token, original)
+
+        original_id = self._original_index.get(original)
+        if original_id is None:
+            original_id = self._original_index[original] = len(self.originals)
+            self.originals.append(original)
+        self.starts.append(start)
+        self.ends.append(start + len(token))
+        self.original_ids.append(original_id)
+        return token
+
+    def _fold(self, token):
+        return fold_case(token) if self.case_insensitive else token
+
+    def _unique_token(self, original, token):
+        existing = self._token_of.get(original)
+        if existing is not None:
+            return existing
+        candidate = token
+        counter = 1
+        while self._fold(candidate) in self._issued or self._fold(candidate) in self.reserved_tokens:
+            counter += 1
+            candidate = f"{token}_{counter}"
+        self.tokens[candidate] = original
+        self._token_of[original] = candidate
+        self._issued.add(self._fold(candidate))
+        return candidate
+
+    def seal(self, anonymized_text):
+        """Remember which text the spans belong to"""
+        self.text_length = len(anonymized_text)
+        self.text_hash = hash(anonymized_text)
+
+    def matches(self, text):
+        """True if text is exactly the anonymized text the spans were recorded for"""
+        return len(text) == self.text_length and hash(text) == self.text_hash
+
+    def spans(self):
+        """(start, end, original) of every replacement, as edits that restore the anonymized text"""
+        for start, end, original_id in zip(self.starts, self.ends, self.original_ids):
+            yield start, end, self.originals[original_id]
+
+    def restore(self, text):
+        """Splice the originals back into the unchanged anonymized text"""
+        pieces = []
+        position = 0
+        for start, end, original_id in zip(self.starts, self.ends, self.original_ids):
+            pieces.append(text[position:start])
+            pieces.append(self.originals[original_id])
+            position = end
+        pieces.append(text[position:])
+        return "".join(pieces)
+
+
+def ruleset_key(config, reverse=False):
+    """Content hash of everything that affects how a config's rules are compiled"""
+    payload = json.dumps([
+        [[rule['original'], rule['replacement']] for rule in config.get('replacements', [])],
+        bool(config.get('case_insensitive', False)),
+        bool(config.get('whole_words_only', True)),
+        bool(reverse)
+    ], ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class RuleSetCache:
+    """LRU cache of compiled rule sets keyed on the config content hash
+
+    Plain rules lists are hashed on every lookup, so editing them in place is
+    always seen. For a RuleStore the hash is remembered per store version (and
+    options), which makes lookups of the GUI's rules free until they are edited
+    through the store. The memo holds the stores weakly. The cache is shared by
+    the GUI, worker and executor threads, so every access takes a lock; hashing
+    and compiling happen outside it.
+    """
+
+    def __init__(self, maxsize=16):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        # RuleStore -> (version, {(case_insensitive, whole_words_only, reverse): key})
+        self._keys = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def key(self, config, reverse=False):
+        """ruleset_key of config, remembered for versioned rules (RuleStore)"""
+        rules = config.get('replacements', [])
+        version = getattr(rules, 'version', None)
+        if version is None:
+            return ruleset_key(config, reverse)
+        options = (bool(config.get('case_insensitive', False)), bool(config.get('whole_words_only', True)),
+                   bool(reverse))
+        with self._lock:
+            memo = self._keys.get(rules)
+            if memo is None or memo[0] != version:
+                memo = self._keys[rules] = (version, {})
+            key = memo[1].get(options)
+        if key is None:
+            key = ruleset_key(config, reverse)
+            with self._lock:
+                memo[1][options] = key
+        return key
+
+    def cached(self, key):
+        """The rule set cached under key, or None"""
+        with self._lock:
+            ruleset = self.entries.get(key)
+            if ruleset is not None:
+                self.entries.move_to_end(key)
+            return ruleset
+
+    def get(self, config, reverse=False):
+        """Return the compiled rule set for config, compiling it on a miss"""
+        key = self.key(config, reverse)
+        ruleset = self.cached(key)
+        if ruleset is not None:
+            return ruleset
+
+        ruleset = CompiledRuleSet.from_config(config, reverse=reverse)
+        self.put(key, ruleset)
+        return ruleset
+
+    def peek(self, config, reverse=False):
+        """Return the compiled rule set for config if it is cached, without compiling"""
+        key = self.key(config, reverse)
+        with self._lock:
+            return self.entries.get(key)
+
+    def put(self, key, ruleset):
+        """Add a rule set compiled elsewhere, e.g. loaded from a config sidecar"""
+        with self._lock:
+            self.entries[key] = ruleset
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def discard(self, config):
+        """Drop the compiled rule sets (both directions) of config"""
+        keys = {ruleset_key(config, reverse) for reverse in (False, True)}
+        rules = config.get('replacements', [])
+        with self._lock:
+            if getattr(rules, 'version', None) is not None:
+                memo = self._keys.pop(rules, None)
+                if memo is not None:
+                    keys.update(memo[1].values())
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self._keys.clear()
+
+
+ruleset_cache = RuleSetCache()
+
+
+def compile_rules(config, reverse=False):
+    """Compiled rule set for config, shared through the module-level cache"""
+    return ruleset_cache.get(config, reverse=reverse)
+
+
+# Compiled rule set of a segment worker process, built once by _init_segment_worker
+_segment_ruleset = None
+
+
+def _init_segment_worker(config, reverse):
+    global _segment_ruleset
+    _segment_ruleset = compile_rules(config, reverse=reverse)
+
+
+def _sub_segment(window, start, end):
+    return _segment_ruleset.sub_window(window, start, end)
+
+
+class ParallelRewriter:
+    """Rewrite large inputs on several cores
+
+    Text is collected until every worker can get a segment, split at safe cuts
+    (positions no match can span) and the segments are rewritten in a process
+    pool. Results are joined in order, so the output is identical to ruleset.sub().
+    Like StreamRewriter, text can be fed in pieces to bound memory use.
+    """
+
+    def __init__(self, config, reverse=False, workers=None, segment_size=SEGMENT_SIZE):
+        self.ruleset = compile_rules(config, reverse=reverse)
+        self.workers = workers or os.cpu_count() or 1
+        self.segment_size = segment_size
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_segment_worker,
+                                        initargs=(config, reverse))
+        self.context = ""
+        self.pending = ""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.pool.shutdown()
+
+    def feed(self, text):
+        """Add text and return the part of the output that is now final"""
+        self.pending += text
+        if len(self.pending) < self.workers * self.segment_size:
+            return ""
+        return self._rewrite(final=False)
+
+    def flush(self):
+        """Return the rest of the output once the input has ended, ready for the next input"""
+        output = self._rewrite(final=True)
+        self.context = ""
+        return output
+
+    def sub(self, text):
+        """Rewrite a complete text"""
+        return self.feed(text) + self.flush()
+
+    def _rewrite(self, final):
+        buffer = self.context + self.pending
+        start = len(self.context)
+        holdback = self.ruleset.max_length + 1
+        if final:
+            end = len(buffer)
+        else:
+            end = self.ruleset.find_safe_cut(buffer, len(buffer) - holdback, start)
+            if end is None:
+                # No safe cut nearby, keep collecting text
+                return ""
+        if end <= start:
+            return ""
+
+        cuts = [start]
+        for target in range(start + self.segment_size, end - self.segment_size // 2, self.segment_size):
+            cut = self.ruleset.find_safe_cut(buffer, target, cuts[-1])
+            if cut is not None:
+                cuts.append(cut)
+        cuts.append(end)
+
+        windows, starts, ends = [], [], []
+        for segment_start, segment_end in zip(cuts, cuts[1:]):
+            window_start = max(segment_start - 1, 0)
+            windows.append(buffer[window_start:segment_end + holdback])
+            starts.append(segment_start - window_start)
+            ends.append(segment_end - window_start)
+
+        if len(windows) == 1:
+            output = self.ruleset.sub_window(windows[0], starts[0], ends[0])
+        else:
+            output = "".join(self.pool.map(_sub_segment, windows, starts, ends))
+
+        self.context = buffer[end - 1:end]
+        self.pending = buffer[end:]
+        return output
+
+
+def parallel_sub(text, config, reverse=False, workers=None, segment_size=SEGMENT_SIZE):
+    """Anonymize (or with reverse=True de-anonymize) one large text on several cores"""
+    with ParallelRewriter(config, reverse=reverse, workers=workers, segment_size=segment_size) as rewriter:
+        return rewriter.sub(text)
+
+
+def new_config(config_name="Default"):
+    """Create an empty configuration with the default options"""
+    today = datetime.now().strftime("%Y-%m-%d")
+    return {
+        "config_name": config_name,
+        "replacements": [],
+        "case_insensitive": False,
+        "whole_words_only": True,
+        "created_date": today,
+        "last_modified": today
+    }
+
+
+def anonymize(text, config):
+    """Replace every original in text with its replacement"""
+    return compile_rules(config).sub(text)
+
+
+def deanonymize(text, config):
+    """Replace every replacement in text with its original"""
+    return compile_rules(config, reverse=True).sub(text)
+
+
+def anonymize_many(texts, config, whole_cells_only=False):
+    """Anonymize many short texts (e.g. database values) with one compiled matcher, lazily and in order"""
+    return compile_rules(config).sub_many(texts, whole_cells_only)
+
+
+def deanonymize_many(texts, config, whole_cells_only=False):
+    """De-anonymize many short texts with one compiled matcher, lazily and in order"""
+    return compile_rules(config, reverse=True).sub_many(texts, whole_cells_only)
+
+
+def new_ledger(text, config):
+    """Create the Ledger for anonymizing text with config
+
+    With config['unique_tokens'] every distinct original gets its own token; tokens
+    that already occur in text are never handed out.
+    """
+    reserved = ()
+    unique_tokens = config.get('unique_tokens', False)
+    if unique_tokens:
+        reverse_rules = compile_rules(config, reverse=True)
+        if reverse_rules.pattern is not None:
+            reserved = {match.group(0) for match in reverse_rules.pattern.finditer(text)}
+    return Ledger(unique_tokens=unique_tokens, reserved_tokens=reserved,
+                  case_insensitive=config.get('case_insensitive', False))
+
+
+def anonymize_with_ledger(text, config):
+    """Anonymize text and return (anonymized_text, Ledger)"""
+    ledger = new_ledger(text, config)
+    anonymized_text = compile_rules(config).sub(text, ledger=ledger)
+    ledger.seal(anonymized_text)
+    return anonymized_text, ledger
+
+
+def deanonymize_with_ledger(text, ledger, config):
+    """De-anonymize text using the ledger of the run that produced it
+
+    Unchanged text is restored exactly from the recorded spans. Edited text (e.g. an
+    LLM response) is scanned once for the ledger's tokens, which map straight to the
+    originals. Without unique tokens the config's reverse rules are the fallback for
+    anything the ledger has not seen.
+    """
+    if ledger.matches(text):
+        return ledger.restore(text)
+    return ledger_ruleset(ledger, config).sub(text)
+
+
+def deanonymize_stream(fragments, config, ledger=None):
+    """De-anonymize text arriving in fragments, yielding restored text as soon as it is final
+
+    With the ledger of the anonymization run its tokens are restored as well
+    (see deanonymize_with_ledger).
+    """
+    if ledger is None:
+        ruleset = compile_rules(config, reverse=True)
+    else:
+        ruleset = ledger_ruleset(ledger, config)
+    rewriter = TokenStreamRewriter(ruleset)
+    for fragment in fragments:
+        output = rewriter.feed(fragment)
+        if output:
+            yield output
+    output = rewriter.flush()
+    if output:
+        yield output
+
+
+def ledger_ruleset(ledger, config):
+    """Rule set mapping the ledger's tokens (and without unique tokens the config's replacements) back"""
+    pairs = list(ledger.tokens.items())
+    if not ledger.unique_tokens:
+        pairs.extend((rule['replacement'], rule['original'])
+                     for rule in reversed(config.get('replacements', [])))
+    return CompiledRuleSet(pairs,
+                           case_insensitive=config.get('case_insensitive', False),
+                           whole_words_only=config.get('whole_words_only', True))
+
+
+def profile_rules(text, config, reverse=False, isolated=False):
+    """Rewrite text with instrumentation, returning (output, RuleStats)
+
+    isolated=True additionally scans the text once per rule with that rule alone,
+    which shows which rules are expensive to match but takes one pass per rule.
+    """
+    ruleset = compile_rules(config, reverse=reverse)
+    stats = RuleStats()
+    began = time.perf_counter()
+    output = ruleset.sub(text, stats=stats)
+    stats.add_scan(text, time.perf_counter() - began)
+    if isolated:
+        for source, target in ruleset.targets.values():
+            single = CompiledRuleSet([(source, target)], ruleset.case_insensitive, ruleset.whole_words_only)
+            began = time.perf_counter()
+            for _ in single.pattern.finditer(text):
+                pass
+            stats.isolated_seconds[source] = time.perf_counter() - began
+    return output, stats
+
+
+def apply_edits(text, edits):
+    """Text with sorted, non-overlapping (start, end, replacement) edits applied"""
+    pieces = []
+    position = 0
+    for start, end, replacement in edits:
+        pieces.append(text[position:start])
+        pieces.append(replacement)
+        position = end
+    pieces.append(text[position:])
+    return "".join(pieces)
@@ -1,23 +1,52 @@
 import sys
-import json
 import os
-import glob
+import json
 import re
+import time
+from bisect import bisect_left
 from datetime import datetime
 import pyperclip
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                             QHBoxLayout, QGridLayout, QLabel, QLineEdit, 
-                            QPushButton, QTextEdit, QTableWidget, QTableWidgetItem,
+                            QPushButton, QPlainTextEdit, QTableView, QAbstractItemView,
                             QComboBox, QMessageBox, QFileDialog, QSplitter,
                             QGroupBox, QHeaderView, QCheckBox, QFrame, QScrollArea, QSizePolicy,
-                            QStylePainter, QStyleOptionButton, QStyle, QProxyStyle)
-from PyQt6.QtCore import Qt, QPropertyAnimation, QEasingCurve, pyqtProperty
-from PyQt6.QtGui import QFont, QPalette, QColor, QPainter, QPen, QLinearGradient
+                            QStylePainter, QStyleOptionButton, QStyle, QProxyStyle,
+                            QProgressBar, QDialog)
+from PyQt6.QtCore import (Qt, QPropertyAnimation, QEasingCurve, pyqtProperty,
+                          QObject, QThread, pyqtSignal, QAbstractTableModel, QModelIndex,
+                          QTimer)
+from PyQt6.QtGui import QFont, QPalette, QColor, QPainter, QPen, QLinearGradient, QTextCursor
 from PyQt6.QtWidgets import QListView # Added for the specific fix
 
-CONFIGS_DIR = os.path.join(os.getcwd(), "configs")
+import config_cache
+import config_journal
+import config_store
+import engine
+import rule_import
+from config_store import CONFIGS_DIR
+from rule_store import RuleStore
+
 os.makedirs(CONFIGS_DIR, exist_ok=True)
 
+# Characters processed between progress updates and cancellation checks
+WORKER_CHUNK_SIZE = 256 * 1024
+
+# Quiet time after the last keystroke before the live preview is updated
+PREVIEW_DELAY_MS = 100
+
+# Anonymized lines remembered by the live preview before the cache starts over
+PREVIEW_CACHE_LIMIT = 100000
+
+# Replacements above which rebuilding the document is cheaper than editing it in place
+MAX_DOCUMENT_EDITS = 200000
+
+# Characters outside the Basic Multilingual Plane, which QTextDocument counts as two positions
+ASTRAL_CHARACTERS = re.compile("[\U00010000-\U0010ffff]")
+
+# Quiet time after the last rule edit before journaled edits are written
+JOURNAL_DELAY_MS = 500
+
 # Custom style to fix dropdown menu background on macOS
 class DarkProxyStyle(QProxyStyle):
     def __init__(self, style=None):
@@ -141,6 +170,267 @@ class ModernButton(QPushButton):
                 }
             """)
 
+class RulesTableModel(QAbstractTableModel):
+    """Table model over a RuleStore, cells are only read when the view paints them"""
+    HEADERS = ("Original", "Replacement")
+    KEYS = ('original', 'replacement')
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rules = RuleStore()
+        self.filter_text = ""
+        # Store rows matching the filter, None when no filter is active
+        self.visible_rows = None
+        # Lower-cased "original\0replacement" per rule, built on first search
+        self.search_keys = None
+        
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.rules) if self.visible_rows is None else len(self.visible_rows)
+        
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+        
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role not in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.ToolTipRole):
+            return None
+        return self.rule_at(index.row())[self.KEYS[index.column()]]
+        
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            return self.HEADERS[section]
+        return str(section + 1)
+        
+    def rule_at(self, row):
+        """Rule shown in a view row"""
+        if self.visible_rows is not None:
+            row = self.visible_rows[row]
+        return self.rules.rule_at(row)
+        
+    def set_rules(self, rules):
+        """Show another RuleStore"""
+        self.beginResetModel()
+        self.rules = rules
+        self.search_keys = None
+        self.apply_filter()
+        self.endResetModel()
+        
+    def set_filter(self, text):
+        """Only show rules whose original or replacement contains text"""
+        self.beginResetModel()
+        self.filter_text = text
+        self.apply_filter()
+        self.endResetModel()
+        
+    def apply_filter(self):
+        needle = self.filter_text.strip().lower()
+        if not needle:
+            self.visible_rows = None
+            return
+        if self.search_keys is None:
+            self.search_keys = [(rule['original'] + "\0" + rule['replacement']).lower() for rule in self.rules]
+        self.visible_rows = [row for row, key in enumerate(self.search_keys) if needle in key]
+        
+    def add_rule(self, original, replacement):
+        """Append a rule, notifying the view of the single new row"""
+        if self.visible_rows is not None:
+            self.rules.add(original, replacement)
+            self.search_keys = None
+            self.set_filter(self.filter_text)
+            return
+        row = len(self.rules)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.rules.add(original, replacement)
+        if self.search_keys is not None:
+            self.search_keys.append((original + "\0" + replacement).lower())
+        self.endInsertRows()
+        
+    def update_rule(self, old_original, new_original, new_replacement):
+        """Change a rule in place, repainting only its row"""
+        self.rules.update(old_original, new_original, new_replacement)
+        self.search_keys = None
+        if self.visible_rows is not None:
+            self.set_filter(self.filter_text)
+            return
+        row = self.rules.row_of(new_original)
+        self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.HEADERS) - 1))
+        
+    def remove_rule(self, original):
+        """Remove a rule, notifying the view of the single removed row"""
+        self.search_keys = None
+        if self.visible_rows is not None:
+            self.rules.remove(original)
+            self.set_filter(self.filter_text)
+            return
+        row = self.rules.row_of(original)
+        self.beginRemoveRows(QModelIndex(), row, row)
+        self.rules.remove(original)
+        self.endRemoveRows()
+
+class RuleStatsModel(QAbstractTableModel):
+    """Table model over the per-rule entries of a RuleStats report, slowest rules first"""
+    HEADERS = ("Original", "Replacement", "Matches", "Time (ms)")
+
+    def __init__(self, rules, parent=None):
+        super().__init__(parent)
+        self.rules = sorted(rules, key=lambda rule: (-rule['seconds'], -rule['matches']))
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rules)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        rule = self.rules[index.row()]
+        column = index.column()
+        if role == Qt.ItemDataRole.TextAlignmentRole and column >= 2:
+            return Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter
+        if role not in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.ToolTipRole):
+            return None
+        if column == 0:
+            return rule['original']
+        if column == 1:
+            return rule['replacement']
+        if column == 2:
+            return f"{rule['matches']:,}"
+        return f"{rule['seconds'] * 1000:.3f}"
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            return self.HEADERS[section]
+        return str(section + 1)
+
+class RuleStatsDialog(QDialog):
+    """Per-rule match counts and timings of an instrumented run, exportable as JSON"""
+    def __init__(self, report, parent=None):
+        super().__init__(parent)
+        self.report = report
+        self.setWindowTitle("Rule Statistics")
+        self.resize(800, 560)
+
+        layout = QVBoxLayout(self)
+        layout.setSpacing(12)
+
+        summary = QLabel(
+            f"{report['direction'].capitalize()}: {report['characters']:,} characters scanned in "
+            f"{report['scan_seconds']:.3f}s ({report['bytes_per_second'] / 1e6:.2f} MB/s), "
+            f"{report['total_matches']:,} matches, "
+            f"{report['rules_without_matches']:,} of {len(report['rules']):,} rules never matched")
+        summary.setWordWrap(True)
+        layout.addWidget(summary)
+
+        table = QTableView()
+        table.setModel(RuleStatsModel(report['rules'], table))
+        table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        table.setAlternatingRowColors(True)
+        layout.addWidget(table)
+
+        button_layout = QHBoxLayout()
+        button_layout.addStretch()
+        export_btn = ModernButton("💾 Export JSON", "secondary")
+        export_btn.clicked.connect(self.export_json)
+        button_layout.addWidget(export_btn)
+        close_btn = ModernButton("Close", "primary")
+        close_btn.clicked.connect(self.accept)
+        button_layout.addWidget(close_btn)
+        layout.addLayout(button_layout)
+
+    def export_json(self):
+        """Write the report to a JSON file chosen by the user"""
+        file_path, _ = QFileDialog.getSaveFileName(self, "Export Rule Statistics", "rule_stats.json",
+                                                   "JSON Files (*.json)")
+        if not file_path:
+            return
+        try:
+            with open(file_path, 'w', encoding='utf-8') as f:
+                json.dump(self.report, f, indent=2, ensure_ascii=False)
+        except OSError as e:
+            QMessageBox.critical(self, "Error", f"Failed to export statistics: {str(e)}")
+
+def document_edits(text, edits):
+    """Convert edit offsets from code points to QTextDocument positions (UTF-16 code units)"""
+    if text.isascii():
+        return edits
+    astral = [match.start() for match in ASTRAL_CHARACTERS.finditer(text)]
+    if not astral:
+        return edits
+    return [(start + bisect_left(astral, start), end + bisect_left(astral, end), replacement)
+            for start, end, replacement in edits]
+
+class RuleWorker(QObject):
+    """Runs anonymization or de-anonymization off the GUI thread"""
+    progress = pyqtSignal(int, int)  # characters processed, total characters
+    finished = pyqtSignal(object)  # [(start, end, replacement)] document edits, or the whole new text
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+    
+    def __init__(self, text, config, reverse=False, ledger=None, restore=False, stats=False):
+        super().__init__()
+        self.text = text
+        self.config = config
+        self.reverse = reverse
+        # Ledger recorded while anonymizing, or used for de-anonymizing
+        self.ledger = ledger
+        # True if text is exactly the anonymized text the ledger was recorded for
+        self.restore = restore
+        # Per-rule match counts and timings, when instrumentation was asked for
+        self.stats = engine.RuleStats() if stats and not restore else None
+        self._cancel_requested = False
+        
+    def cancel(self):
+        """Ask the worker to stop at the next chunk (safe to call from any thread)"""
+        self._cancel_requested = True
+        
+    def run(self):
+        try:
+            total = len(self.text)
+            if self.reverse and self.restore:
+                # Restoring from the ledger needs no scan at all
+                edits = list(self.ledger.spans())
+            else:
+                if self.reverse and self.ledger is not None:
+                    ruleset = engine.ledger_ruleset(self.ledger, self.config)
+                else:
+                    ruleset = engine.compile_rules(self.config, reverse=self.reverse)
+                if not self.reverse:
+                    self.ledger = engine.new_ledger(self.text, self.config)
+                ledger = None if self.reverse else self.ledger
+                
+                # Only the replaced regions are collected, the output is never built as one string
+                edits = []
+                position = 0
+                shift = 0
+                while position < total:
+                    if self._cancel_requested:
+                        self.cancelled.emit()
+                        return
+                    began = time.perf_counter()
+                    start = position
+                    found, position, shift = ruleset.edits(self.text, position,
+                                                           min(position + WORKER_CHUNK_SIZE, total),
+                                                           ledger, shift, self.stats)
+                    if self.stats is not None:
+                        self.stats.add_scan(self.text[start:position], time.perf_counter() - began)
+                    edits.extend(found)
+                    self.progress.emit(min(position, total), total)
+                    
+            self.progress.emit(total, total)
+            if len(edits) > MAX_DOCUMENT_EDITS:
+                self.finished.emit(engine.apply_edits(self.text, edits))
+            else:
+                self.finished.emit(document_edits(self.text, edits))
+        except Exception as e:
+            self.failed.emit(str(e))
+
 class TextAnonymizer(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -152,17 +442,40 @@ class TextAnonymizer(QMainWindow):
         self.apply_dark_theme()
         
         # Current configuration
-        self.current_config = {
-            "config_name": "Default",
-            "replacements": [],
-            "case_insensitive": False,
-            "whole_words_only": True,
-            "created_date": datetime.now().strftime("%Y-%m-%d"),
-            "last_modified": datetime.now().strftime("%Y-%m-%d")
-        }
-        
-        # Original text storage for de-anonymization
-        self.original_text = ""
+        self.current_config = self.with_rule_store(engine.new_config())
+        
+        # Replacements made by the last anonymization, for exact de-anonymization
+        self.ledger = None
+        
+        # File the current configuration was loaded from or saved to, and whether its rules changed since
+        self.config_file = None
+        self.config_modified = False
+        
+        # Rule edits waiting to be journaled, written together once edits pause
+        self.pending_changes = []
+        self.journal_rewrite = False
+        self.journal_timer = QTimer(self)
+        self.journal_timer.setSingleShot(True)
+        self.journal_timer.setInterval(JOURNAL_DELAY_MS)
+        self.journal_timer.timeout.connect(self.flush_journal)
+        
+        # Live preview: blocks from preview_dirty_first up to preview_dirty_tail blocks
+        # before the end need re-anonymizing; counting from the end stays valid while
+        # lines are inserted or removed above
+        self.preview_dirty_first = None
+        self.preview_dirty_tail = 0
+        # Anonymized text per line, valid for preview_ruleset only (None until compiled)
+        self.preview_cache = {}
+        self.preview_ruleset = None
+        self.preview_timer = QTimer(self)
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(PREVIEW_DELAY_MS)
+        self.preview_timer.timeout.connect(self.update_preview)
+        
+        # Background job state
+        self.worker = None
+        self.worker_thread = None
+        self.worker_reverse = False
         
         self.init_ui()
         self.load_config_list()
@@ -229,7 +542,7 @@ class TextAnonymizer(QMainWindow):
                     stop:0 #2d3140, stop:1 #252835);
             }
             
-            QTextEdit {
+            QPlainTextEdit {
                 background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
                     stop:0 #1e2126, stop:1 #181b20);
                 border: 1px solid #2a2d3a;
@@ -241,7 +554,7 @@ class TextAnonymizer(QMainWindow):
                 selection-background-color: #4a9eff;
                 selection-color: white;
             }
-            QTextEdit:focus {
+            QPlainTextEdit:focus {
                 border: 2px solid #4a9eff;
             }
             
@@ -291,7 +604,7 @@ class TextAnonymizer(QMainWindow):
                 selection-background-color: #4a9eff;
             }
             
-            QTableWidget {
+            QTableView {
                 background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
                     stop:0 #1e2126, stop:1 #181b20);
                 border: 1px solid #2a2d3a;
@@ -301,12 +614,12 @@ class TextAnonymizer(QMainWindow):
                 font-size: 13px;
                 selection-background-color: #4a9eff;
             }
-            QTableWidget::item {
+            QTableView::item {
                 padding: 8px;
                 border: none;
                 border-bottom: 1px solid #2a2d3a;
             }
-            QTableWidget::item:selected {
+            QTableView::item:selected {
                 background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
                     stop:0 #4a9eff, stop:1 #357abd);
                 color: white;
@@ -423,11 +736,23 @@ class TextAnonymizer(QMainWindow):
         left_card = ModernCard("Text Processing")
         
         # Text area with improved styling
-        self.text_area = QTextEdit()
+        # Plain-text editor: lays out only the visible blocks, so very large documents stay usable
+        self.text_area = QPlainTextEdit()
         self.text_area.setPlaceholderText("Enter your text here to anonymize or de-anonymize...")
         self.text_area.setMinimumHeight(500)
+        self.text_area.document().contentsChange.connect(self.on_text_changed)
         
-        left_card.layout.addWidget(self.text_area)
+        # Read-only live preview of the anonymized text, shown next to the editor
+        self.preview_area = QPlainTextEdit()
+        self.preview_area.setReadOnly(True)
+        self.preview_area.setUndoRedoEnabled(False)
+        self.preview_area.setPlaceholderText("Anonymized preview...")
+        self.preview_area.hide()
+        
+        text_splitter = QSplitter(Qt.Orientation.Horizontal)
+        text_splitter.addWidget(self.text_area)
+        text_splitter.addWidget(self.preview_area)
+        left_card.layout.addWidget(text_splitter)
         
         # Action buttons with modern styling
         button_layout = QHBoxLayout()
@@ -450,8 +775,36 @@ class TextAnonymizer(QMainWindow):
         button_layout.addWidget(self.copy_btn)
         
         button_layout.addStretch()
+        
+        self.preview_check = QCheckBox("Live preview")
+        self.preview_check.setToolTip("Show the anonymized text next to the editor while typing")
+        self.preview_check.toggled.connect(self.toggle_preview)
+        button_layout.addWidget(self.preview_check)
+
+        self.stats_check = QCheckBox("Rule statistics")
+        self.stats_check.setToolTip("Count matches and time every rule while processing, "
+                                    "then show the results (slightly slower)")
+        button_layout.addWidget(self.stats_check)
+
         left_card.layout.addLayout(button_layout)
         
+        # Progress of a running job, hidden while idle
+        progress_layout = QHBoxLayout()
+        progress_layout.setSpacing(12)
+        
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setFormat("%p%")
+        progress_layout.addWidget(self.progress_bar)
+        
+        self.cancel_btn = ModernButton("✖ Cancel", "danger")
+        self.cancel_btn.clicked.connect(self.cancel_job)
+        progress_layout.addWidget(self.cancel_btn)
+        
+        self.progress_bar.hide()
+        self.cancel_btn.hide()
+        left_card.layout.addLayout(progress_layout)
+        
         return left_card
         
     def create_right_panel(self):
@@ -499,6 +852,30 @@ class TextAnonymizer(QMainWindow):
         self.word_boundary_combo.setToolTip("Choose whether to replace only whole words or text anywhere including inside words")
         config_card.layout.addWidget(self.word_boundary_combo)
         
+        # Token mode combo (Use replacements as-is / Unique token per original)
+        token_mode_label = QLabel("Placeholder Tokens:")
+        token_mode_label.setStyleSheet("background: transparent; border: none;")
+        config_card.layout.addWidget(token_mode_label)
+        
+        self.token_mode_combo = QComboBox()
+        self.token_mode_combo.addItems(["Use replacements as-is", "Unique token per original"])
+        self.token_mode_combo.setToolTip("Give every distinct original its own token so de-anonymization is never ambiguous")
+        config_card.layout.addWidget(self.token_mode_combo)
+        
+        # The preview follows the matching options as they are changed
+        self.case_mode_combo.currentIndexChanged.connect(self.refresh_preview)
+        self.word_boundary_combo.currentIndexChanged.connect(self.refresh_preview)
+        
+        # Save mode combo (Rewrite file on save / Journal rule edits)
+        save_mode_label = QLabel("Saving:")
+        save_mode_label.setStyleSheet("background: transparent; border: none;")
+        config_card.layout.addWidget(save_mode_label)
+        
+        self.save_mode_combo = QComboBox()
+        self.save_mode_combo.addItems(["Rewrite file on save", "Journal rule edits (autosave)"])
+        self.save_mode_combo.setToolTip("Append each rule edit to a small change journal instead of rewriting large configuration files")
+        config_card.layout.addWidget(self.save_mode_combo)
+        
         right_layout.addWidget(config_card)
         
         # Replacement rules card
@@ -520,13 +897,25 @@ class TextAnonymizer(QMainWindow):
         table_layout.setContentsMargins(0, 0, 0, 0)
         table_layout.setSpacing(0)
         
-        # Rules table inside the frame
-        self.rules_table = QTableWidget()
-        self.rules_table.setColumnCount(2)
-        self.rules_table.setHorizontalHeaderLabels(["Original", "Replacement"])
+        # Search box filtering the rules table, applied shortly after typing stops
+        self.rule_filter_entry = QLineEdit()
+        self.rule_filter_entry.setPlaceholderText("🔍 Filter rules...")
+        self.rule_filter_timer = QTimer(self)
+        self.rule_filter_timer.setSingleShot(True)
+        self.rule_filter_timer.setInterval(150)
+        self.rule_filter_timer.timeout.connect(self.apply_rule_filter)
+        self.rule_filter_entry.textChanged.connect(self.rule_filter_timer.start)
+        rules_card.layout.addWidget(self.rule_filter_entry)
+        
+        # Rules table inside the frame, backed by a model so only visible rows are rendered
+        self.rules_model = RulesTableModel(self)
+        self.rules_table = QTableView()
+        self.rules_table.setModel(self.rules_model)
         self.rules_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
-        self.rules_table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
-        self.rules_table.itemSelectionChanged.connect(self.on_rule_selected)
+        self.rules_table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        self.rules_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.rules_table.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.rules_table.selectionModel().selectionChanged.connect(self.on_rule_selected)
         # Set a minimum height to show more rows
         self.rules_table.setMinimumHeight(150)
         # Allow table to expand/shrink vertically as needed within layout
@@ -537,7 +926,7 @@ class TextAnonymizer(QMainWindow):
         self.rules_table.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)
         
         self.rules_table.setStyleSheet("""
-            QTableWidget {
+            QTableView {
                 background-color: #1e2126;
                 border: none;
                 border-radius: 8px;
@@ -625,6 +1014,10 @@ class TextAnonymizer(QMainWindow):
         self.delete_config_btn.clicked.connect(self.delete_config)
         config_buttons_layout.addWidget(self.delete_config_btn, 1, 1)
         
+        self.import_rules_btn = ModernButton("📥 Import Rules", "secondary")
+        self.import_rules_btn.clicked.connect(self.import_rules)
+        config_buttons_layout.addWidget(self.import_rules_btn, 2, 0, 1, 2)
+        
         mgmt_card.layout.addLayout(config_buttons_layout)
         right_layout.addWidget(mgmt_card)
         
@@ -635,49 +1028,42 @@ class TextAnonymizer(QMainWindow):
         
     def preserve_case_pattern(self, original_match, replacement):
         """Preserve the case pattern of the original match in the replacement"""
-        if len(original_match) == 0:
-            return replacement
-            
-        # If replacement is shorter than original, just use replacement as-is
-        if len(replacement) < len(original_match):
-            # Apply case pattern to available characters
-            result = ""
-            for i, char in enumerate(replacement):
-                if i < len(original_match):
-                    if original_match[i].isupper():
-                        result += char.upper()
-                    else:
-                        result += char.lower()
-                else:
-                    result += char
-            return result
-        
-        # If replacement is longer or equal, apply pattern and keep extra chars as lowercase
-        result = ""
-        for i, char in enumerate(replacement):
-            if i < len(original_match):
-                if original_match[i].isupper():
-                    result += char.upper()
-                else:
-                    result += char.lower()
-            else:
-                result += char.lower()
-        return result
+        return engine.preserve_case_pattern(original_match, replacement)
         
     def load_config_list(self):
-        """Load all available configuration files"""
-        config_files = glob.glob(os.path.join(CONFIGS_DIR, "config_*.json"))
-        config_names = [os.path.basename(f).replace("config_", "").replace(".json", "") for f in config_files]
-        
+        """List the available configurations from the metadata index without opening them"""
+        self.config_combo.blockSignals(True)
         self.config_combo.clear()
-        self.config_combo.addItems(config_names)
-        
-        if config_names:
-            self.config_combo.setCurrentText(config_names[0])
-            self.on_config_selected(config_names[0])
+        for entry in config_store.list_configs():
+            self.set_config_item(entry)
+        self.config_combo.setCurrentIndex(0)
+        self.config_combo.blockSignals(False)
+        
+        if self.config_combo.count():
+            # Parse the first configuration once the window is up instead of during startup
+            QTimer.singleShot(0, lambda: self.on_config_selected(self.config_combo.currentText()))
+            
+    def set_config_item(self, entry, select=False):
+        """Add or refresh the configuration list entry for an index entry"""
+        index = self.config_combo.findText(entry['name'])
+        if index < 0:
+            self.config_combo.addItem(entry['name'])
+            index = self.config_combo.count() - 1
+        if entry['rule_count'] is None:
+            tooltip = "Unreadable configuration file"
+        else:
+            tooltip = (f"{entry['rule_count']:,} rules, {entry['size'] / 1024:,.0f} KB\n"
+                       f"Created {entry['created_date'] or 'unknown'}, modified {entry['last_modified'] or 'unknown'}")
+        self.config_combo.setItemData(index, tooltip, Qt.ItemDataRole.ToolTipRole)
+        if select:
+            # The configuration is already in memory, do not load it again
+            self.config_combo.blockSignals(True)
+            self.config_combo.setCurrentIndex(index)
+            self.config_combo.blockSignals(False)
             
     def on_config_selected(self, config_name):
         """Handle configuration selection"""
+        self.flush_journal()
         if config_name:
             self.load_config_by_name(config_name)
             
@@ -686,47 +1072,53 @@ class TextAnonymizer(QMainWindow):
         filename = os.path.join(CONFIGS_DIR, f"config_{config_name}.json")
         if os.path.exists(filename):
             try:
-                with open(filename, 'r') as f:
-                    self.current_config = json.load(f)
-                    self.config_name_entry.setText(self.current_config['config_name'])
-                    
-                    # Handle case insensitive option (backward compatibility)
-                    case_insensitive = self.current_config.get('case_insensitive', False)
-                    self.case_mode_combo.setCurrentIndex(1 if case_insensitive else 0)
-                    
-                    # Handle word boundary option (backward compatibility)
-                    whole_words_only = self.current_config.get('whole_words_only', True)
-                    self.word_boundary_combo.setCurrentIndex(0 if whole_words_only else 1)
-                    
-                    self.refresh_rules_table()
+                # Uses the compiled sidecar cache when the file has not changed
+                self.current_config = self.with_rule_store(config_cache.load_config(filename))
+                self.set_config_file(filename)
+                self.config_name_entry.setText(self.current_config['config_name'])
+                
+                # Handle case insensitive option (backward compatibility)
+                case_insensitive = self.current_config.get('case_insensitive', False)
+                self.case_mode_combo.setCurrentIndex(1 if case_insensitive else 0)
+                
+                # Handle word boundary option (backward compatibility)
+                whole_words_only = self.current_config.get('whole_words_only', True)
+                self.word_boundary_combo.setCurrentIndex(0 if whole_words_only else 1)
+                
+                # Handle unique token option (backward compatibility)
+                unique_tokens = self.current_config.get('unique_tokens', False)
+                self.token_mode_combo.setCurrentIndex(1 if unique_tokens else 0)
+                
+                # Handle journal option (backward compatibility)
+                journal_changes = self.current_config.get('journal_changes', False)
+                self.save_mode_combo.setCurrentIndex(1 if journal_changes else 0)
+                
+                self.refresh_rules_table()
             except Exception as e:
                 self.show_error(f"Failed to load configuration: {str(e)}")
                 
     def refresh_rules_table(self):
-        """Refresh the rules table"""
-        self.rules_table.setRowCount(0)
-        
-        replacements = self.current_config.get('replacements', [])
-        self.rules_table.setRowCount(len(replacements))
+        """Show the rules of the current configuration"""
+        self.rules_model.set_rules(self.current_config['replacements'])
+        self.rules_table.scrollToTop()
         
-        for idx, rule in enumerate(replacements):
-            self.rules_table.setItem(idx, 0, QTableWidgetItem(rule['original']))
-            self.rules_table.setItem(idx, 1, QTableWidgetItem(rule['replacement']))
+    def apply_rule_filter(self):
+        """Filter the rules table by the search box text"""
+        self.rules_model.set_filter(self.rule_filter_entry.text())
         
-        # Ensure table updates and scrollbars are visible if needed
-        self.rules_table.resizeRowsToContents()
-        self.rules_table.scrollToTop()
+    def selected_rule(self):
+        """Rule of the selected table row, or None"""
+        index = self.rules_table.currentIndex()
+        if not index.isValid():
+            return None
+        return self.rules_model.rule_at(index.row())
             
     def on_rule_selected(self):
         """Handle rule selection in table"""
-        current_row = self.rules_table.currentRow()
-        if current_row >= 0:
-            original_item = self.rules_table.item(current_row, 0)
-            replacement_item = self.rules_table.item(current_row, 1)
-            
-            if original_item and replacement_item:
-                self.original_entry.setText(original_item.text())
-                self.replacement_entry.setText(replacement_item.text())
+        rule = self.selected_rule()
+        if rule is not None:
+            self.original_entry.setText(rule['original'])
+            self.replacement_entry.setText(rule['replacement'])
                 
     def add_rule(self):
         """Add a new replacement rule"""
@@ -738,19 +1130,16 @@ class TextAnonymizer(QMainWindow):
             return
             
         # Check for duplicates
-        for rule in self.current_config['replacements']:
-            if rule['original'] == original:
-                self.show_warning("Rule with this original text already exists.")
-                return
+        if original in self.current_config['replacements']:
+            self.show_warning("Rule with this original text already exists.")
+            return
                 
         # Add the rule
-        self.current_config['replacements'].append({
-            'original': original,
-            'replacement': replacement
-        })
+        self.invalidate_compiled_rules()
+        self.rules_model.add_rule(original, replacement)
         
         self.current_config['last_modified'] = datetime.now().strftime("%Y-%m-%d")
-        self.refresh_rules_table()
+        self.record_change({'op': 'add', 'original': original, 'replacement': replacement})
         
         # Clear entry fields
         self.original_entry.clear()
@@ -758,23 +1147,19 @@ class TextAnonymizer(QMainWindow):
         
     def remove_rule(self):
         """Remove selected rule"""
-        current_row = self.rules_table.currentRow()
-        if current_row < 0:
+        rule = self.selected_rule()
+        if rule is None:
             self.show_warning("Please select a rule to remove.")
             return
             
-        original_item = self.rules_table.item(current_row, 0)
-        if original_item:
-            original_text = original_item.text()
-            
+        original_text = rule['original']
+        if original_text in self.current_config['replacements']:
             # Remove from config
-            self.current_config['replacements'] = [
-                rule for rule in self.current_config['replacements']
-                if rule['original'] != original_text
-            ]
+            self.invalidate_compiled_rules()
+            self.rules_model.remove_rule(original_text)
             
             self.current_config['last_modified'] = datetime.now().strftime("%Y-%m-%d")
-            self.refresh_rules_table()
+            self.record_change({'op': 'remove', 'original': original_text})
             
             # Clear entry fields
             self.original_entry.clear()
@@ -782,16 +1167,12 @@ class TextAnonymizer(QMainWindow):
             
     def update_rule(self):
         """Update selected rule"""
-        current_row = self.rules_table.currentRow()
-        if current_row < 0:
+        rule = self.selected_rule()
+        if rule is None:
             self.show_warning("Please select a rule to update.")
             return
             
-        original_item = self.rules_table.item(current_row, 0)
-        if not original_item:
-            return
-            
-        old_original = original_item.text()
+        old_original = rule['original']
         new_original = self.original_entry.text().strip()
         new_replacement = self.replacement_entry.text().strip()
         
@@ -800,34 +1181,30 @@ class TextAnonymizer(QMainWindow):
             return
             
         # Check for duplicates (excluding current rule)
-        for rule in self.current_config['replacements']:
-            if rule['original'] == new_original and rule['original'] != old_original:
-                self.show_warning("Rule with this original text already exists.")
-                return
+        rules = self.current_config['replacements']
+        if new_original != old_original and new_original in rules:
+            self.show_warning("Rule with this original text already exists.")
+            return
                 
         # Update the rule
-        for rule in self.current_config['replacements']:
-            if rule['original'] == old_original:
-                rule['original'] = new_original
-                rule['replacement'] = new_replacement
-                break
+        self.invalidate_compiled_rules()
+        if old_original in rules:
+            self.rules_model.update_rule(old_original, new_original, new_replacement)
+            self.record_change({'op': 'update', 'old': old_original, 'original': new_original,
+                                'replacement': new_replacement})
                 
         self.current_config['last_modified'] = datetime.now().strftime("%Y-%m-%d")
-        self.refresh_rules_table()
         
     def new_config(self):
         """Create a new configuration"""
-        self.current_config = {
-            "config_name": "New_Config",
-            "replacements": [],
-            "case_insensitive": False,
-            "whole_words_only": True,
-            "created_date": datetime.now().strftime("%Y-%m-%d"),
-            "last_modified": datetime.now().strftime("%Y-%m-%d")
-        }
+        self.flush_journal()
+        self.current_config = self.with_rule_store(engine.new_config("New_Config"))
+        self.set_config_file(None)
         self.config_name_entry.setText("New_Config")
         self.case_mode_combo.setCurrentIndex(0) # Default to case sensitive
         self.word_boundary_combo.setCurrentIndex(0) # Default to whole words only
+        self.token_mode_combo.setCurrentIndex(0) # Default to replacements as-is
+        self.save_mode_combo.setCurrentIndex(0) # Default to rewriting on save
         self.refresh_rules_table()
         
     def load_config(self):
@@ -843,19 +1220,55 @@ class TextAnonymizer(QMainWindow):
             "JSON files (*.json)"
         )
         if filename:
+            self.flush_journal()
             try:
-                with open(filename, 'r') as f:
-                    self.current_config = json.load(f)
-                    self.config_name_entry.setText(self.current_config['config_name'])
+                self.current_config = self.with_rule_store(config_cache.load_config(filename))
+                self.set_config_file(filename)
+                self.config_name_entry.setText(self.current_config['config_name'])
 
-                    case_insensitive = self.current_config.get('case_insensitive', False)
-                    self.case_mode_combo.setCurrentIndex(1 if case_insensitive else 0)
+                case_insensitive = self.current_config.get('case_insensitive', False)
+                self.case_mode_combo.setCurrentIndex(1 if case_insensitive else 0)
 
-                    self.refresh_rules_table()
-                    self.load_config_list()
+                self.refresh_rules_table()
+                if os.path.dirname(os.path.abspath(filename)) == os.path.abspath(CONFIGS_DIR):
+                    self.set_config_item(config_store.config_metadata(filename, self.config_for_saving()),
+                                         select=True)
             except Exception as e:
                 self.show_error(f"Failed to load configuration: {str(e)}")
                     
+    def import_rules(self):
+        """Bulk import rules from CSV/TSV/JSONL files into the current configuration"""
+        filenames, _ = QFileDialog.getOpenFileNames(
+            self,
+            "Import Rules",
+            os.getcwd(),
+            "Rule files (*.csv *.tsv *.jsonl);;All files (*)"
+        )
+        if not filenames:
+            return
+            
+        try:
+            # Import into a copy, so a file that cannot be read leaves the rules as they were
+            rules, report = rule_import.import_rules(filenames, RuleStore(self.current_config['replacements']))
+        except Exception as e:
+            self.show_error(f"Failed to import rules: {str(e)}")
+            return
+            
+        self.invalidate_compiled_rules()
+        self.current_config['replacements'] = rules
+        self.refresh_rules_table()
+        self.current_config['last_modified'] = datetime.now().strftime("%Y-%m-%d")
+        if self.journaling():
+            # A bulk import is cheaper to write as a whole file than as a journal
+            self.journal_rewrite = True
+            self.journal_timer.start()
+        message = f"Import finished: {report.summary()}."
+        if report.conflict_samples:
+            message += "\n\nConflicts:\n" + "\n".join(report.conflict_samples[:10])
+        if report.skipped_samples:
+            message += "\n\nSkipped:\n" + "\n".join(report.skipped_samples[:10])
+        self.show_success(message)
+        
     def save_config(self):
         """Save current configuration to file"""
         config_name = self.config_name_entry.text().strip()
@@ -866,14 +1279,20 @@ class TextAnonymizer(QMainWindow):
         self.current_config['config_name'] = config_name
         self.current_config['case_insensitive'] = (self.case_mode_combo.currentIndex() == 1)
         self.current_config['whole_words_only'] = (self.word_boundary_combo.currentIndex() == 0)
+        self.current_config['unique_tokens'] = (self.token_mode_combo.currentIndex() == 1)
+        self.current_config['journal_changes'] = (self.save_mode_combo.currentIndex() == 1)
         self.current_config['last_modified'] = datetime.now().strftime("%Y-%m-%d")
         
         filename = os.path.join(CONFIGS_DIR, f"config_{config_name}.json")
         try:
-            with open(filename, 'w') as f:
-                json.dump(self.current_config, f, indent=2)
+            saved_config = self.config_for_saving()
+            # Written to a temporary file and renamed, so a crash never leaves a truncated config
+            config_store.save_config(filename, saved_config)
+            self.discard_pending_changes()
+            self.set_config_file(filename)
+            config_cache.store(filename, saved_config)
+            self.set_config_item(config_store.update_index(filename, saved_config), select=True)
             self.show_success(f"Configuration saved successfully!")
-            self.load_config_list()
         except Exception as e:
             self.show_error(f"Failed to save configuration: {str(e)}")
             
@@ -894,9 +1313,15 @@ class TextAnonymizer(QMainWindow):
         if reply == QMessageBox.StandardButton.Yes:
             filename = os.path.join(CONFIGS_DIR, f"config_{selected_config}.json")
             try:
+                if filename == self.config_file:
+                    self.discard_pending_changes()
                 os.remove(filename)
+                config_journal.remove(filename)
+                config_cache.remove(filename)
+                config_store.remove_from_index(filename)
                 self.show_success(f"Configuration '{selected_config}' deleted successfully!")
-                self.load_config_list()
+                # Selects and loads the next configuration
+                self.config_combo.removeItem(self.config_combo.findText(selected_config))
             except Exception as e:
                 self.show_error(f"Failed to delete configuration: {str(e)}")
                 
@@ -907,47 +1332,8 @@ class TextAnonymizer(QMainWindow):
             self.show_warning("Please enter text to anonymize.")
             return
             
-        # Store original text for de-anonymization
-        self.original_text = text
-        
-        # Apply replacements
-        anonymized_text = text
-        case_insensitive = (self.case_mode_combo.currentIndex() == 1)
-        whole_words_only = (self.word_boundary_combo.currentIndex() == 0)
-        
-        for rule in self.current_config['replacements']:
-            original = rule['original']
-            replacement = rule['replacement']
-            
-            if case_insensitive:
-                # Use regex for case-insensitive replacement with case preservation
-                def replace_func(match):
-                    matched_text = match.group(0)
-                    return self.preserve_case_pattern(matched_text, replacement)
-                
-                # Create regex pattern based on word boundary setting
-                if whole_words_only:
-                    pattern = r'\b' + re.escape(original) + r'\b'
-                else:
-                    pattern = re.escape(original)
-                    
-                anonymized_text = re.sub(pattern, replace_func, anonymized_text, flags=re.IGNORECASE)
-            else:
-                # For case-sensitive replacement, we need to handle word boundaries manually
-                if whole_words_only:
-                    # Use regex to match whole words only
-                    def replace_case_sensitive(match):
-                        return replacement
-                    
-                    pattern = r'\b' + re.escape(original) + r'\b'
-                    anonymized_text = re.sub(pattern, replace_case_sensitive, anonymized_text)
-                else:
-                    # Standard case-sensitive replacement anywhere
-                    anonymized_text = anonymized_text.replace(original, replacement)
-            
-        # Update text area
-        self.text_area.setPlainText(anonymized_text)
-        self.show_success("Text anonymized successfully! 🔒")
+        # Apply all replacements in a background thread
+        self.start_job(text, reverse=False)
         
     def deanonymize_text(self):
         """De-anonymize text using current configuration"""
@@ -956,44 +1342,263 @@ class TextAnonymizer(QMainWindow):
             self.show_warning("Please enter text to de-anonymize.")
             return
             
-        # Apply reverse replacements
-        deanonymized_text = text
-        case_insensitive = (self.case_mode_combo.currentIndex() == 1)
-        whole_words_only = (self.word_boundary_combo.currentIndex() == 0)
-        
-        for rule in reversed(self.current_config['replacements']):
-            original = rule['original']
-            replacement = rule['replacement']
+        # Apply reverse replacements in a background thread
+        self.start_job(text, reverse=True)
+        
+    def start_job(self, text, reverse):
+        """Process text in a worker thread, the result arrives in on_job_finished"""
+        if self.worker_thread is not None:
+            return
             
-            if case_insensitive:
-                # Use regex for case-insensitive replacement with case preservation
-                def replace_func(match):
-                    matched_text = match.group(0)
-                    return self.preserve_case_pattern(matched_text, original)
-                
-                # Create regex pattern based on word boundary setting
-                if whole_words_only:
-                    pattern = r'\b' + re.escape(replacement) + r'\b'
-                else:
-                    pattern = re.escape(replacement)
-                    
-                deanonymized_text = re.sub(pattern, replace_func, deanonymized_text, flags=re.IGNORECASE)
-            else:
-                # For case-sensitive replacement, we need to handle word boundaries manually
-                if whole_words_only:
-                    # Use regex to match whole words only
-                    def replace_case_sensitive(match):
-                        return original
-                    
-                    pattern = r'\b' + re.escape(replacement) + r'\b'
-                    deanonymized_text = re.sub(pattern, replace_case_sensitive, deanonymized_text)
-                else:
-                    # Standard case-sensitive replacement anywhere
-                    deanonymized_text = deanonymized_text.replace(replacement, original)
+        # Snapshot the rules so edits during the job do not affect it
+        config = self.current_rule_options()
+        config['replacements'] = [dict(rule) for rule in config['replacements']]
+        
+        # The ledger's spans apply as long as the anonymized text was not edited since
+        restore = reverse and self.ledger is not None and not self.text_area.document().isModified()
+        
+        self.worker_reverse = reverse
+        self.worker = RuleWorker(text, config, reverse, self.ledger if reverse else None, restore,
+                                 stats=self.stats_check.isChecked())
+        self.worker_thread = QThread(self)
+        self.worker.moveToThread(self.worker_thread)
+        
+        self.worker_thread.started.connect(self.worker.run)
+        self.worker.progress.connect(self.on_job_progress)
+        self.worker.finished.connect(self.on_job_finished)
+        self.worker.failed.connect(self.on_job_failed)
+        self.worker.cancelled.connect(self.on_job_cancelled)
+        for signal in (self.worker.finished, self.worker.failed, self.worker.cancelled):
+            signal.connect(self.worker_thread.quit)
+        self.worker_thread.finished.connect(self.cleanup_job)
+        
+        self.set_busy(True)
+        self.worker_thread.start()
+        
+    def cancel_job(self):
+        """Cancel the running job"""
+        if self.worker is not None:
+            self.worker.cancel()
+            self.cancel_btn.setEnabled(False)
+            
+    def on_job_progress(self, processed, total):
+        """Update the progress bar"""
+        self.progress_bar.setValue(int(processed * 100 / total) if total else 100)
+        self.progress_bar.setFormat(f"%p%  ({processed / 1e6:.1f} / {total / 1e6:.1f} MB)")
+        
+    def on_job_finished(self, result):
+        """Show the result of a finished job"""
+        self.set_busy(False)
+        if not self.worker_reverse:
+            self.ledger = self.worker.ledger
+        if isinstance(result, str):
+            self.text_area.setPlainText(result)
+        else:
+            self.apply_document_edits(result)
+        # Unmodified from here on means the text is still exactly what the ledger describes
+        self.text_area.document().setModified(self.worker_reverse)
+        self.cache_compiled_rules()
+        if self.worker.stats is not None:
+            report = self.worker.stats.to_dict(self.worker.config, self.worker_reverse)
+            RuleStatsDialog(report, self).exec()
+        elif self.worker_reverse:
+            self.show_success("Text de-anonymized successfully! 🔓")
+        else:
+            self.show_success("Text anonymized successfully! 🔒")
+            
+    def apply_document_edits(self, edits):
+        """Splice replacements into the document, leaving the text between them untouched"""
+        cursor = QTextCursor(self.text_area.document())
+        # One undo step, and the layout is updated once at the end
+        cursor.beginEditBlock()
+        for start, end, replacement in reversed(edits):
+            cursor.setPosition(start)
+            cursor.setPosition(end, QTextCursor.MoveMode.KeepAnchor)
+            cursor.insertText(replacement)
+        cursor.endEditBlock()
+        
+    def on_job_failed(self, message):
+        """Report a job that raised an error"""
+        self.set_busy(False)
+        self.show_error(f"Processing failed: {message}")
+        
+    def on_job_cancelled(self):
+        """Leave the text untouched after a cancelled job"""
+        self.set_busy(False)
+        
+    def cleanup_job(self):
+        """Release the worker once its thread has stopped"""
+        self.worker.deleteLater()
+        self.worker_thread.deleteLater()
+        self.worker = None
+        self.worker_thread = None
+        
+    def set_busy(self, busy):
+        """Toggle the controls while a job is running"""
+        for button in (self.anonymize_btn, self.deanonymize_btn, self.clear_btn):
+            button.setEnabled(not busy)
+        self.text_area.setReadOnly(busy)
+        self.progress_bar.setValue(0)
+        self.progress_bar.setFormat("%p%")
+        self.progress_bar.setVisible(busy)
+        self.cancel_btn.setEnabled(True)
+        self.cancel_btn.setVisible(busy)
+        
+    def closeEvent(self, event):
+        """Stop a running job and write pending journaled edits before the window closes"""
+        self.flush_journal()
+        if self.worker_thread is not None:
+            self.worker.cancel()
+            self.worker_thread.quit()
+            self.worker_thread.wait()
+        super().closeEvent(event)
+        
+    def with_rule_store(self, config):
+        """Hold the rules of a loaded config in an indexed RuleStore"""
+        config['replacements'] = RuleStore(config.get('replacements', []))
+        return config
+        
+    def config_for_saving(self):
+        """Current configuration in the JSON file format"""
+        config = dict(self.current_config)
+        config['replacements'] = self.current_config['replacements'].to_list()
+        return config
+        
+    def invalidate_compiled_rules(self):
+        """Drop the cached compiled rules before the current rules change"""
+        engine.ruleset_cache.discard(self.current_rule_options())
+        self.config_modified = True
+        self.refresh_preview()
+        
+    def set_config_file(self, filename):
+        """Remember the file that now holds exactly the current configuration"""
+        self.config_file = filename
+        self.config_modified = False
+        
+    def journaling(self):
+        """True if rule edits are written to the change journal of the config file as they happen"""
+        return bool(self.config_file) and self.save_mode_combo.currentIndex() == 1
+        
+    def record_change(self, change):
+        """Queue a rule change for the journal, the write waits until edits pause"""
+        if self.journaling():
+            config_journal.coalesce_change(self.pending_changes, change)
+            self.journal_timer.start()
+            
+    def discard_pending_changes(self):
+        """Forget queued journal writes, e.g. after a full save"""
+        self.journal_timer.stop()
+        self.pending_changes = []
+        self.journal_rewrite = False
+        
+    def flush_journal(self):
+        """Write queued rule changes to the journal, rewriting the file when the journal grows large"""
+        self.journal_timer.stop()
+        if not self.config_file or not (self.pending_changes or self.journal_rewrite):
+            return
+        try:
+            rewrite = self.journal_rewrite
+            if not rewrite:
+                journal_size = config_journal.append(self.config_file, self.pending_changes,
+                                                     self.current_config.get('last_modified'))
+                rewrite = config_journal.needs_compaction(self.config_file, journal_size)
+            if rewrite:
+                config_store.save_config(self.config_file, self.config_for_saving())
+            self.discard_pending_changes()
+            self.set_config_file(self.config_file)
+            entry = config_store.update_index(self.config_file, self.current_config)
+            if self.config_combo.findText(entry['name']) >= 0:
+                self.set_config_item(entry)
+        except Exception as e:
+            self.show_error(f"Failed to save rule changes: {str(e)}")
+            
+    def cache_compiled_rules(self):
+        """Save newly compiled rules to the sidecar cache of an unmodified config file"""
+        if self.config_file and not self.config_modified:
+            config_cache.store(self.config_file, self.config_for_saving())
+        
+    def current_rule_options(self):
+        """Current rules combined with the matching options selected in the UI"""
+        return {
+            'replacements': self.current_config['replacements'],
+            'case_insensitive': (self.case_mode_combo.currentIndex() == 1),
+            'whole_words_only': (self.word_boundary_combo.currentIndex() == 0),
+            'unique_tokens': (self.token_mode_combo.currentIndex() == 1)
+        }
+        
+    def toggle_preview(self, checked):
+        """Show or hide the live preview"""
+        self.preview_area.setVisible(checked)
+        if checked:
+            self.refresh_preview()
+        else:
+            self.preview_timer.stop()
+            self.preview_area.clear()
+            self.preview_cache = {}
+            self.preview_ruleset = None
+            
+    def refresh_preview(self):
+        """Re-anonymize the whole preview, e.g. after the rules changed"""
+        self.preview_ruleset = None
+        self.preview_dirty_first = 0
+        self.preview_dirty_tail = 0
+        if self.preview_check.isChecked():
+            self.preview_timer.start()
+            
+    def on_text_changed(self, position, removed, added):
+        """Mark the blocks touched by an edit for the next preview update"""
+        if not self.preview_check.isChecked():
+            return
+        document = self.text_area.document()
+        first = max(document.findBlock(position).blockNumber(), 0)
+        last = document.findBlock(position + added).blockNumber()
+        if last < 0:
+            last = document.blockCount() - 1
+        tail = document.blockCount() - 1 - last
+        if self.preview_dirty_first is None:
+            self.preview_dirty_first = first
+            self.preview_dirty_tail = tail
+        else:
+            self.preview_dirty_first = min(self.preview_dirty_first, first)
+            self.preview_dirty_tail = min(self.preview_dirty_tail, tail)
+        self.preview_timer.start()
+        
+    def update_preview(self):
+        """Replace the dirty preview blocks with the anonymized text of the matching editor blocks"""
+        if self.preview_dirty_first is None or not self.preview_check.isChecked():
+            return
+        if self.preview_ruleset is None:
+            # Compiled (or fetched from the cache) once per rule change, not per keystroke
+            self.preview_ruleset = engine.compile_rules(self.current_rule_options())
+            self.preview_cache = {}
+        ruleset = self.preview_ruleset
+        first = self.preview_dirty_first
+        tail = self.preview_dirty_tail
+        self.preview_dirty_first = None
+        
+        # Lines are anonymized one by one, unchanged lines come from the cache
+        lines = []
+        block = self.text_area.document().findBlockByNumber(first)
+        for _ in range(self.text_area.document().blockCount() - tail - first):
+            text = block.text()
+            line = self.preview_cache.get(text)
+            if line is None:
+                if len(self.preview_cache) >= PREVIEW_CACHE_LIMIT:
+                    self.preview_cache = {}
+                line = self.preview_cache[text] = ruleset.sub(text)
+            lines.append(line)
+            block = block.next()
             
-        # Update text area
-        self.text_area.setPlainText(deanonymized_text)
-        self.show_success("Text de-anonymized successfully! 🔓")
+        preview = self.preview_area.document()
+        first = min(first, preview.blockCount() - 1)
+        last = max(preview.blockCount() - 1 - tail, first)
+        end_block = preview.findBlockByNumber(last)
+        cursor = QTextCursor(preview)
+        cursor.beginEditBlock()
+        cursor.setPosition(preview.findBlockByNumber(first).position())
+        cursor.setPosition(end_block.position() + end_block.length() - 1, QTextCursor.MoveMode.KeepAnchor)
+        cursor.insertText("\n".join(lines))
+        cursor.endEditBlock()
         
     def clear_text(self):
         """Clear the text area"""
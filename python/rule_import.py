@@ -0,0 +1,155 @@
+"""Streaming bulk import of replacement rules from CSV, TSV and JSONL exports
+
+CSV/TSV files may have a header row naming 'original' and 'replacement'
+columns; otherwise the first two columns are used. JSONL files hold one
+{"original": ..., "replacement": ...} object per line. Malformed rows are
+skipped and reported with their file and line number.
+"""
+import csv
+import json
+import os
+import time
+
+from rule_store import RuleStore
+
+# Conflicts and malformed rows kept in the report for display, the totals are always counted
+CONFLICT_SAMPLE_SIZE = 100
+
+
+class ImportReport:
+    """Outcome of a bulk import"""
+
+    def __init__(self):
+        self.added = 0
+        self.duplicates = 0
+        self.conflicts = 0
+        self.shared_replacements = 0
+        self.skipped = 0
+        self.conflict_samples = []
+        self.skipped_samples = []
+        self.seconds = 0.0
+
+    @property
+    def rows(self):
+        return self.added + self.duplicates + self.conflicts + self.skipped
+
+    @property
+    def rules_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def add_conflict(self, message):
+        self.conflicts += 1
+        if len(self.conflict_samples) < CONFLICT_SAMPLE_SIZE:
+            self.conflict_samples.append(message)
+
+    def add_malformed(self, message):
+        self.skipped += 1
+        if len(self.skipped_samples) < CONFLICT_SAMPLE_SIZE:
+            self.skipped_samples.append(message)
+
+    def summary(self):
+        return (f"{self.added} rules added, {self.duplicates} duplicates, {self.conflicts} conflicts, "
+                f"{self.skipped} rows skipped, {self.shared_replacements} replacements shared by "
+                f"several originals ({self.rows} rows in {self.seconds:.2f}s, "
+                f"{self.rules_per_second:,.0f} rules/s)")
+
+
+def detect_format(path):
+    """Guess the file format from its extension"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in (".jsonl", ".ndjson"):
+        return "jsonl"
+    if extension in (".tsv", ".tab"):
+        return "tsv"
+    return "csv"
+
+
+def _text(value):
+    return "" if value is None else str(value)
+
+
+def iter_rules(path, file_format=None, encoding="utf-8", on_malformed=None):
+    """Yield (original, replacement) pairs from a file without loading it whole
+
+    A malformed row is passed to on_malformed as "path:line: reason" and
+    skipped; without on_malformed it raises ValueError with that message.
+    """
+    def malformed(line_number, reason):
+        message = f"{path}:{line_number}: {reason}"
+        if on_malformed is None:
+            raise ValueError(message)
+        on_malformed(message)
+
+    file_format = file_format or detect_format(path)
+    with open(path, 'r', encoding=encoding, newline="") as f:
+        if file_format == "jsonl":
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    malformed(line_number, f"invalid JSON ({e})")
+                    continue
+                if not isinstance(record, dict):
+                    malformed(line_number, "not a JSON object")
+                    continue
+                yield _text(record.get('original')), _text(record.get('replacement'))
+            return
+
+        reader = csv.reader(f, delimiter="\t" if file_format == "tsv" else ",")
+        original_column, replacement_column = 0, 1
+        row_number = 0
+        while True:
+            try:
+                row = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as e:
+                malformed(reader.line_num, str(e))
+                continue
+            row_number += 1
+            if row_number == 1:
+                header = [cell.strip().lower() for cell in row]
+                if 'original' in header and 'replacement' in header:
+                    original_column = header.index('original')
+                    replacement_column = header.index('replacement')
+                    continue
+            if len(row) > max(original_column, replacement_column):
+                yield row[original_column], row[replacement_column]
+            elif any(row):
+                yield "", ""
+
+
+def import_rules(paths, store=None, file_format=None, encoding="utf-8"):
+    """Add the rules of every file to store (a new RuleStore by default)
+
+    The first rule for an original wins; later rows with the same original are
+    counted as duplicates (same replacement) or conflicts (different one), and
+    malformed rows as skipped. Returns (store, ImportReport).
+    """
+    store = RuleStore() if store is None else store
+    report = ImportReport()
+    start = time.perf_counter()
+    for path in paths:
+        for original, replacement in iter_rules(path, file_format, encoding, report.add_malformed):
+            original = original.strip()
+            replacement = replacement.strip()
+            if not original or not replacement:
+                report.skipped += 1
+                continue
+
+            existing = store.get(original)
+            if existing is None:
+                if store.has_replacement(replacement):
+                    report.shared_replacements += 1
+                store.add(original, replacement)
+                report.added += 1
+            elif existing == replacement:
+                report.duplicates += 1
+            else:
+                report.add_conflict(f"{path}: '{original}' -> '{replacement}' conflicts with "
+                                    f"existing replacement '{existing}'")
+    report.seconds = time.perf_counter() - start
+    return store, report
@@ -0,0 +1,128 @@
+"""Indexed collection of replacement rules"""
+from bisect import bisect_left, insort
+
+
+class RuleStore:
+    """Replacement rules in insertion order with O(1) lookup by original and by replacement
+
+    Iterating yields rule dicts ({'original': ..., 'replacement': ...}) exactly as
+    they appear in the 'replacements' list of a config file, so a RuleStore can be
+    used wherever that list is expected. Removed rules leave a hole that is
+    compacted away once holes make up half of the slots; until then positions
+    are found by bisecting the sorted hole slots, so reads never compact.
+    version changes with every edit, so caches can tell the rules apart from an
+    earlier state.
+    """
+
+    def __init__(self, rules=()):
+        self._slots = []
+        # Sorted slots of removed rules
+        self._holes = []
+        self.version = 0
+        self._by_original = {}
+        # replacement -> {original: None}, an insertion-ordered set of originals
+        self._by_replacement = {}
+        for rule in rules:
+            if rule['original'] not in self._by_original:
+                self.add(rule['original'], rule['replacement'])
+
+    def __len__(self):
+        return len(self._by_original)
+
+    def __iter__(self):
+        return (rule for rule in self._slots if rule is not None)
+
+    def __reversed__(self):
+        return (rule for rule in reversed(self._slots) if rule is not None)
+
+    def __contains__(self, original):
+        return original in self._by_original
+
+    def get(self, original, default=None):
+        """Replacement for original"""
+        slot = self._by_original.get(original)
+        if slot is None:
+            return default
+        return self._slots[slot]['replacement']
+
+    def rule_at(self, row):
+        """Rule at a position in insertion order"""
+        holes = self._holes
+        if not holes:
+            return self._slots[row]
+        if row < 0:
+            row += len(self)
+            if row < 0:
+                raise IndexError("rule index out of range")
+        # The rule sits at row plus the number of holes before it; holes[i] - i
+        # rules come before holes[i], which never decreases with i
+        low, high = 0, len(holes)
+        while low < high:
+            middle = (low + high) // 2
+            if holes[middle] - middle <= row:
+                low = middle + 1
+            else:
+                high = middle
+        return self._slots[row + low]
+
+    def row_of(self, original):
+        """Position of the rule for original in insertion order"""
+        slot = self._by_original[original]
+        return slot - bisect_left(self._holes, slot)
+
+    def has_replacement(self, replacement):
+        """True if some rule already uses replacement"""
+        return replacement in self._by_replacement
+
+    def originals_for(self, replacement):
+        """All originals that are replaced by replacement, in insertion order"""
+        return list(self._by_replacement.get(replacement, ()))
+
+    def add(self, original, replacement):
+        """Append a rule, raising ValueError if the original already has one"""
+        if original in self._by_original:
+            raise ValueError("Rule with this original text already exists.")
+        self.version += 1
+        self._by_original[original] = len(self._slots)
+        self._slots.append({'original': original, 'replacement': replacement})
+        self._by_replacement.setdefault(replacement, {})[original] = None
+
+    def update(self, old_original, new_original, new_replacement):
+        """Change a rule in place, keeping its position"""
+        slot = self._by_original.get(old_original)
+        if slot is None:
+            raise KeyError(old_original)
+        if new_original != old_original and new_original in self._by_original:
+            raise ValueError("Rule with this original text already exists.")
+
+        self.version += 1
+        self._unlink_replacement(self._slots[slot])
+        del self._by_original[old_original]
+        self._by_original[new_original] = slot
+        self._slots[slot] = {'original': new_original, 'replacement': new_replacement}
+        self._by_replacement.setdefault(new_replacement, {})[new_original] = None
+
+    def remove(self, original):
+        """Remove the rule for original"""
+        slot = self._by_original.pop(original)
+        self.version += 1
+        self._unlink_replacement(self._slots[slot])
+        self._slots[slot] = None
+        insort(self._holes, slot)
+        if len(self._holes) > 32 and len(self._holes) * 2 > len(self._slots):
+            self._compact()
+
+    def to_list(self):
+        """Rules in the config file format"""
+        return [dict(rule) for rule in self]
+
+    def _unlink_replacement(self, rule):
+        originals = self._by_replacement[rule['replacement']]
+        del originals[rule['original']]
+        if not originals:
+            del self._by_replacement[rule['replacement']]
+
+    def _compact(self):
+        self._slots = [rule for rule in self._slots if rule is not None]
+        self._holes = []
+        self._by_original = {rule['original']: slot for slot, rule in enumerate(self._slots)}
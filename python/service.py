@@ -0,0 +1,360 @@
+"""Local anonymization service with compiled rules kept warm in memory
+
+    python service.py                          # http://127.0.0.1:8765
+    python service.py --port 9000 --preload Sample
+    python service.py --unix /tmp/anonymizer.sock
+
+Speaks plain HTTP/1.1 with keep-alive and JSON bodies:
+
+    POST /anonymize    {"config": "Sample", "text": "..."}        -> {"text": "..."}
+    POST /deanonymize  {"config": "Sample", "text": "..."}        -> {"text": "..."}
+    POST /batch        {"config": "Sample", "texts": ["...", ...],
+                        "operation": "anonymize" | "deanonymize"} -> {"texts": [...]}
+    GET  /configs      -> {"configs": [{"name": ..., "rule_count": ...}, ...]}
+    GET  /health       -> {"status": "ok"}
+
+Configs are the configs/config_<name>.json files. Each config is compiled once,
+off the event loop, and kept in memory; a config file (or journal) that
+changes on disk is reloaded in the background from its next request on, and
+its previous rules are served until the reload is done. The service binds to
+localhost only and has no authentication, it is meant to sit next to the
+process that calls it. Requests with an Origin header or a Host other than
+localhost (or the bound address) are refused, so web pages cannot use it.
+"""
+import argparse
+import asyncio
+import functools
+import json
+import os
+import sys
+import time
+
+import async_engine
+import config_cache
+import config_journal
+import config_store
+import engine
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Requests with more text than this are rewritten in worker threads (see
+# async_engine) so the event loop keeps answering small requests meanwhile
+OFFLOAD_SIZE = 256 * 1024
+
+# Largest request body accepted
+MAX_BODY_SIZE = 256 * 1024 * 1024
+
+# Request line and header lines longer than this are rejected
+MAX_HEADER_SIZE = 64 * 1024
+
+OPERATIONS = ("anonymize", "deanonymize")
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed",
+               413: "Payload Too Large", 500: "Internal Server Error"}
+
+# Host header names (without port) accepted on TCP, besides the address bound to
+LOCAL_HOSTS = ("localhost", "127.0.0.1", "[::1]")
+
+
+class ServiceError(Exception):
+    """Request error reported to the client with an HTTP status"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class WarmConfigs:
+    """Configs by name with both directions compiled, reloaded when their files change
+
+    The compiled rule sets are held here rather than only in
+    engine.ruleset_cache, so no number of configs evicts a served one. Loading
+    and compiling run in an executor (the event loop's default if None), one
+    load per config at a time; while a changed config is being reloaded its
+    previous rules keep being served.
+    """
+
+    def __init__(self, executor=None):
+        self.executor = executor
+        # name -> (file stamp, config, {reverse: CompiledRuleSet})
+        self.entries = {}
+        # name -> Future of the (config, rulesets) being loaded
+        self.loading = {}
+
+    def _stamp(self, path):
+        stat = os.stat(path)
+        try:
+            journal_size = os.path.getsize(config_journal.journal_path(path))
+        except OSError:
+            journal_size = 0
+        return stat.st_size, stat.st_mtime_ns, journal_size
+
+    def _locate(self, name):
+        """(path, file stamp) of a config"""
+        if not isinstance(name, str) or not name or os.sep in name or "/" in name:
+            raise ServiceError(400, "'config' must be the name of a config in configs/")
+        path = config_store.config_path(name)
+        try:
+            return path, self._stamp(path)
+        except OSError:
+            self.entries.pop(name, None)
+            raise ServiceError(404, f"Unknown config '{name}'")
+
+    def _load(self, path):
+        config = config_cache.load_config(path)
+        rulesets = {reverse: engine.compile_rules(config, reverse=reverse) for reverse in (False, True)}
+        # The next start (and the GUI) loads the compiled rules instead of compiling
+        config_cache.store(path, config)
+        return config, rulesets
+
+    def load(self, name):
+        """Load and compile a config in this thread, e.g. before the event loop starts"""
+        path, stamp = self._locate(name)
+        config, rulesets = self._load(path)
+        self.entries[name] = (stamp, config, rulesets)
+        return config, rulesets
+
+    async def get(self, name):
+        """(config, {reverse: CompiledRuleSet}) of a config, loading and compiling it if needed"""
+        path, stamp = self._locate(name)
+        entry = self.entries.get(name)
+        if entry is not None and entry[0] == stamp:
+            return entry[1], entry[2]
+
+        future = self.loading.get(name)
+        if future is None:
+            future = asyncio.get_running_loop().run_in_executor(self.executor, self._load, path)
+            future.add_done_callback(functools.partial(self._loaded, name, stamp))
+            self.loading[name] = future
+        if entry is not None:
+            # Keep answering with the previous rules until the new ones are compiled
+            return entry[1], entry[2]
+        return await asyncio.shield(future)
+
+    def _loaded(self, name, stamp, future):
+        if self.loading.get(name) is future:
+            del self.loading[name]
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            # Requests waiting for the load get the error, the next one tries again
+            if name in self.entries:
+                print(f"Reloading config '{name}' failed, serving the previous rules: {error}",
+                      file=sys.stderr, flush=True)
+            return
+        config, rulesets = future.result()
+        # A load of a file that has changed again is replaced on the next request
+        self.entries[name] = (stamp, config, rulesets)
+
+    def preload(self, names):
+        for name in names:
+            start = time.perf_counter()
+            config, _ = self.load(name)
+            print(f"Loaded config '{name}' ({len(config.get('replacements', []))} rules) "
+                  f"in {time.perf_counter() - start:.2f}s", file=sys.stderr, flush=True)
+
+
+class AnonymizationService:
+    """Request handling of the service, independent of the transport"""
+
+    def __init__(self, configs=None, anonymizer=None):
+        self.configs = configs or WarmConfigs()
+        # Large requests are rewritten in its executor, chunk by chunk
+        self.anonymizer = anonymizer or async_engine.AsyncAnonymizer()
+        self.allowed_hosts = set(LOCAL_HOSTS)
+
+    def allow_host(self, host):
+        """Also accept requests addressed to host, e.g. the address the service is bound to"""
+        self.allowed_hosts.add(f"[{host}]" if ":" in host else host.lower())
+
+    def check_headers(self, headers, unix_socket=False):
+        """Reject requests a web page could have sent
+
+        Browsers add an Origin header to cross-origin and POST requests, and a page
+        reaching the service through DNS rebinding sends its own host name in Host.
+        Either would let the page read de-anonymized text and the config list.
+        Unix socket clients cannot be web pages, so their Host is not checked.
+        """
+        if 'origin' in headers:
+            raise ServiceError(403, "Requests from web pages are not accepted")
+        host = headers.get('host')
+        if host is not None and not unix_socket and _host_name(host) not in self.allowed_hosts:
+            raise ServiceError(403, f"Host '{host}' is not accepted, address the service as localhost")
+
+    async def handle(self, method, path, body):
+        """(status, response dict) for one request"""
+        if path == "/health":
+            return 200, {'status': "ok"}
+        if path == "/configs":
+            if method != "GET":
+                raise ServiceError(405, "Use GET")
+            return 200, {'configs': [{'name': entry['name'], 'rule_count': entry['rule_count']}
+                                     for entry in config_store.list_configs()]}
+
+        operation = path.lstrip("/")
+        if operation not in OPERATIONS + ("batch",):
+            raise ServiceError(404, f"No endpoint {path}")
+        if method != "POST":
+            raise ServiceError(405, "Use POST")
+        try:
+            request = json.loads(body)
+        except ValueError as e:
+            raise ServiceError(400, f"Invalid JSON: {e}")
+        if not isinstance(request, dict):
+            raise ServiceError(400, "The body must be a JSON object")
+
+        if operation == "batch":
+            operation = request.get('operation', "anonymize")
+            if operation not in OPERATIONS:
+                raise ServiceError(400, f"'operation' must be one of {', '.join(OPERATIONS)}")
+            texts = request.get('texts')
+            if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+                raise ServiceError(400, "'texts' must be a list of strings")
+            return 200, {'texts': await self.rewrite(request.get('config'), operation, texts)}
+
+        text = request.get('text')
+        if not isinstance(text, str):
+            raise ServiceError(400, "'text' must be a string")
+        return 200, {'text': (await self.rewrite(request.get('config'), operation, [text]))[0]}
+
+    async def rewrite(self, name, operation, texts):
+        """texts rewritten with the rules of a config"""
+        config, rulesets = await self.configs.get(name)
+        ruleset = rulesets[operation == "deanonymize"]
+        if sum(len(text) for text in texts) <= OFFLOAD_SIZE:
+            return list(ruleset.sub_many(texts))
+        if operation == "deanonymize":
+            return await self.anonymizer.deanonymize_many(texts, config)
+        return await self.anonymizer.anonymize_many(texts, config)
+
+
+async def read_request(reader):
+    """(method, path, headers, body) of the next request, None once the client is done"""
+    try:
+        line = await reader.readuntil(b"\r\n")
+    except (asyncio.IncompleteReadError, ConnectionError):
+        return None
+    except asyncio.LimitOverrunError:
+        raise ServiceError(400, "Request line too long")
+    parts = line.decode("latin-1").split()
+    if len(parts) != 3:
+        raise ServiceError(400, "Malformed request line")
+    method, path, version = parts
+
+    headers = {}
+    while True:
+        try:
+            line = await reader.readuntil(b"\r\n")
+        except asyncio.LimitOverrunError:
+            raise ServiceError(400, "Header line too long")
+        if line == b"\r\n":
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    if version == "HTTP/1.0" and headers.get('connection', "").lower() != "keep-alive":
+        headers['connection'] = "close"
+
+    try:
+        length = int(headers.get('content-length', 0))
+    except ValueError:
+        raise ServiceError(400, "Invalid Content-Length")
+    if length > MAX_BODY_SIZE:
+        raise ServiceError(413, f"Body larger than {MAX_BODY_SIZE} bytes")
+    body = await reader.readexactly(length) if length else b""
+    return method, path.split("?", 1)[0], headers, body
+
+
+def _host_name(host):
+    """Host header value without the port, lower-cased"""
+    host = host.strip().lower()
+    if host.startswith("["):
+        return host[:host.find("]") + 1]
+    return host.partition(":")[0]
+
+
+def write_response(writer, status, payload, keep_alive=True):
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    writer.write((f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+                  f"Content-Type: application/json; charset=utf-8\r\n"
+                  f"Content-Length: {len(body)}\r\n"
+                  f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode("latin-1") + body)
+
+
+async def serve_connection(service, reader, writer, unix_socket=False):
+    """Answer the requests of one keep-alive connection in order"""
+    try:
+        while True:
+            keep_alive = True
+            try:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                keep_alive = headers.get('connection', "").lower() != "close"
+                service.check_headers(headers, unix_socket)
+                status, payload = await service.handle(method, path, body)
+            except ServiceError as e:
+                status, payload = e.status, {'error': str(e)}
+                # The rest of a rejected request cannot be told apart from the next one
+                keep_alive = keep_alive and e.status not in (400, 413)
+            except asyncio.IncompleteReadError:
+                break
+            except Exception as e:
+                status, payload = 500, {'error': str(e)}
+            write_response(writer, status, payload, keep_alive)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def run_service(service, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_path=None):
+    """Serve until cancelled"""
+    def on_connection(reader, writer):
+        return serve_connection(service, reader, writer, unix_socket=bool(unix_path))
+
+    if unix_path:
+        if os.path.exists(unix_path):
+            os.remove(unix_path)
+        server = await asyncio.start_unix_server(on_connection, unix_path, limit=MAX_HEADER_SIZE)
+        address = unix_path
+    else:
+        service.allow_host(host)
+        server = await asyncio.start_server(on_connection, host, port, limit=MAX_HEADER_SIZE)
+        address = "http://{}:{}".format(*server.sockets[0].getsockname()[:2])
+    print(f"Serving on {address}", file=sys.stderr, flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve anonymize/deanonymize for the configs in configs/")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="address to bind, localhost by default")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix", metavar="PATH", help="listen on a Unix socket instead of TCP")
+    parser.add_argument("--preload", nargs="*", metavar="CONFIG",
+                        help="configs to compile before serving (all of them if no names are given)")
+    args = parser.parse_args(argv)
+
+    service = AnonymizationService()
+    if args.preload is not None:
+        names = args.preload or [entry['name'] for entry in config_store.list_configs()]
+        try:
+            service.configs.preload(names)
+        except ServiceError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+    try:
+        asyncio.run(run_service(service, args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,626 @@
+"""Structure-aware streaming rewriters for JSON, CSV/TSV and SQL dumps
+
+Like engine.StreamRewriter they take text in pieces through feed() and
+flush(), but apply the rules only to values: JSON string values (never keys),
+CSV cells below the header, and string literals in the VALUES of SQL INSERT
+statements (never identifiers, comments or other statements). With fields,
+only the named JSON members, CSV columns or SQL columns are rewritten:
+
+    JSON  "email", "user.email"         members with that key (path suffix), and
+                                        everything nested inside them
+    CSV   "email", "3"                  header names or 1-based column numbers
+    SQL   "email", "users.email"        columns of any table or of one table,
+                                        named in the INSERT or its CREATE TABLE
+
+Everything that is not rewritten is copied through unchanged, and all
+selected values of a piece of input go through CompiledRuleSet.sub_many
+together, so whole values that equal an original are a dict lookup.
+"""
+import csv
+import io
+import json
+import re
+
+FORMATS = ("json", "csv", "tsv", "sql")
+
+
+def parse_fields(fields):
+    """Field selectors from a comma-separated string or a list, None for everything"""
+    if fields is None:
+        return None
+    if isinstance(fields, str):
+        fields = fields.split(",")
+    fields = [field.strip() for field in fields if field.strip()]
+    return fields or None
+
+
+def open_rewriter(file_format, ruleset, fields=None, whole_cells_only=False):
+    """Structure-aware rewriter for one of FORMATS"""
+    fields = parse_fields(fields)
+    if file_format == "json":
+        return JsonRewriter(ruleset, fields, whole_cells_only)
+    if file_format in ("csv", "tsv"):
+        return CsvRewriter(ruleset, fields, whole_cells_only, delimiter="\t" if file_format == "tsv" else ",")
+    if file_format == "sql":
+        return SqlRewriter(ruleset, fields, whole_cells_only)
+    raise ValueError(f"Unknown format '{file_format}', choose from {', '.join(FORMATS)}")
+
+
+class _ValueBatch:
+    """Output pieces of one feed() with the selected values filled in by a single sub_many call"""
+
+    def __init__(self, ruleset, whole_cells_only):
+        self.ruleset = ruleset
+        self.whole_cells_only = whole_cells_only
+        self.pieces = []
+        # (piece index, decoded value, encoder)
+        self.values = []
+
+    def add_value(self, piece, value, encode):
+        """Add piece to the output, replaced by encode(result) if the rules change value"""
+        self.values.append((len(self.pieces), value, encode))
+        self.pieces.append(piece)
+
+    def output(self):
+        if self.values:
+            results = self.ruleset.sub_many([value for _, value, _ in self.values], self.whole_cells_only)
+            for (index, value, encode), result in zip(self.values, results):
+                if result != value:
+                    self.pieces[index] = encode(result)
+        output = "".join(self.pieces)
+        self.pieces = []
+        self.values = []
+        return output
+
+
+# JSON: a string, marked as a key by the ':' after it (or as undecided by the end of the
+# input after it), or a bracket, each with the run of separators, numbers and literals
+# after it, or such a run on its own
+JSON_TOKEN = re.compile(r'("[^"\\]*(?:\\.[^"\\]*)*")(?:(\s*:)|(\s*\Z))?[^"{}\[\]]*|[{}\[\]][^"{}\[\]]*|[^"{}\[\]]+',
+                        re.S)
+# The same without brackets, for rewriting every value regardless of where it is
+JSON_STRING_TOKEN = re.compile(r'("[^"\\]*(?:\\.[^"\\]*)*")(?:(\s*:)|(\s*\Z))?[^"]*|[^"]+', re.S)
+
+
+def _json_encode(value):
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _json_string(token):
+    return token[1:-1] if "\\" not in token else json.loads(token)
+
+
+class JsonRewriter:
+    """Rewrite the string values of a JSON document (or of concatenated/line-delimited JSON values)
+
+    The input is tokenized as it arrives; only an unfinished string at the end
+    of the input is held back. The document is never built in memory. Without
+    fields the brackets are not even tracked, only keys told from values.
+    """
+
+    def __init__(self, ruleset, fields=None, whole_cells_only=False):
+        self.batch = _ValueBatch(ruleset, whole_cells_only)
+        self.selectors = None if fields is None else [tuple(field.split(".")) for field in fields]
+        self.last_keys = None if fields is None else {selector[-1] for selector in self.selectors}
+        # Open containers: [is_object, key, inside_selected, value_selected]
+        self.stack = []
+        self.pending = ""
+
+    def feed(self, text):
+        """Add text and return the part of the output that is now final"""
+        self.pending += text
+        return self._rewrite(final=False)
+
+    def flush(self):
+        """Return the rest of the output once the input has ended, ready for the next input"""
+        output = self._rewrite(final=True)
+        self.stack = []
+        return output
+
+    def _selected(self, key):
+        """True if the member key of the innermost object is selected"""
+        if key not in self.last_keys:
+            return False
+        path = tuple(entry[1] for entry in self.stack if entry[0])
+        return any(path[-len(selector):] == selector for selector in self.selectors)
+
+    def _rewrite(self, final):
+        buffer = self.pending
+        batch = self.batch
+        stack = self.stack
+        everything = self.selectors is None
+        # buffer[:copied] is in the output, buffer[:position] has been tokenized
+        copied = position = 0
+        for match in (JSON_STRING_TOKEN if everything else JSON_TOKEN).finditer(buffer):
+            if match.start() != position:
+                # An unfinished string, the rest of the buffer is inside it
+                break
+            kind = match.lastindex
+            if kind == 3 and not final:
+                # A ':' may still follow
+                break
+            if kind is None:
+                char = buffer[position]
+                if char == "{" or char == "[":
+                    inside = stack[-1][3] if stack else False
+                    stack.append([char == "{", None, inside, inside])
+                elif (char == "}" or char == "]") and stack:
+                    stack.pop()
+            elif kind == 2:
+                if not everything and stack:
+                    top = stack[-1]
+                    top[1] = _json_string(match.group(1))
+                    top[3] = top[2] or self._selected(top[1])
+            elif everything or (stack and stack[-1][3]):
+                token = match.group(1)
+                batch.pieces.append(buffer[copied:position])
+                batch.add_value(token, _json_string(token), _json_encode)
+                copied = position + len(token)
+            position = match.end()
+        # Malformed input at the end is passed through as it is
+        end = len(buffer) if final else position
+        batch.pieces.append(buffer[copied:end])
+        self.pending = buffer[end:]
+        return batch.output()
+
+
+# The rest of a quoted CSV cell up to its closing quote, "" being a quote
+CSV_QUOTED_END = re.compile(r'[^"]*(?:""[^"]*)*"(?!")')
+
+
+class CsvRewriter:
+    """Rewrite the cells of selected columns of a CSV or TSV file
+
+    The first row is the header and is copied unchanged. Rows are passed
+    through exactly as they were unless a cell in them changed; changed rows
+    are written back with the same delimiter and minimal quoting.
+    """
+
+    def __init__(self, ruleset, fields=None, whole_cells_only=False, delimiter=",", header=True):
+        self.ruleset = ruleset
+        self.whole_cells_only = whole_cells_only
+        self.delimiter = delimiter
+        self.quoted_start = re.compile(f'(?:^|(?<={re.escape(delimiter)}))"')
+        self.fields = fields
+        self.header = header
+        # Column indexes to rewrite, None for all, resolved from the header
+        self.columns = None
+        self.resolved = False
+        self.pending = ""
+
+    def feed(self, text):
+        """Add text and return the part of the output that is now final"""
+        self.pending += text
+        return self._rewrite(final=False)
+
+    def flush(self):
+        """Return the rest of the output once the input has ended, ready for the next input"""
+        output = self._rewrite(final=True)
+        self.resolved = False
+        self.columns = None
+        return output
+
+    def _split_records(self, final):
+        """Complete records of the pending text, each with its line ending"""
+        records = []
+        record = []
+        # Inside a quoted cell, where line breaks do not end the record
+        quoted = False
+        for line in self.pending.splitlines(keepends=True):
+            record.append(line)
+            if quoted or '"' in line:
+                quoted = self._ends_quoted(line, quoted)
+            if not quoted and line[-1:] in ("\n", "\r"):
+                records.append("".join(record))
+                record = []
+        if final and record:
+            records.append("".join(record))
+            record = []
+        self.pending = "".join(record)
+        # A record ending in "\r" may still get its "\n"
+        if not final and records and records[-1].endswith("\r"):
+            self.pending = records.pop() + self.pending
+        return records
+
+    def _ends_quoted(self, line, quoted):
+        """True if line ends inside a quoted cell; like csv, only a quote that starts a cell opens one"""
+        position = 0
+        while True:
+            if quoted:
+                match = CSV_QUOTED_END.match(line, position)
+            else:
+                match = self.quoted_start.search(line, position)
+            if match is None:
+                return quoted
+            quoted = not quoted
+            position = match.end()
+
+    def _resolve_columns(self, header_row):
+        self.resolved = True
+        if self.fields is None:
+            self.columns = None
+            return
+        names = [name.strip() for name in header_row] if header_row is not None else []
+        columns = set()
+        for field in self.fields:
+            if field in names:
+                columns.add(names.index(field))
+            elif field.isdigit() and int(field) > 0:
+                columns.add(int(field) - 1)
+        self.columns = sorted(columns)
+
+    def _rewrite(self, final):
+        records = self._split_records(final)
+        if not records:
+            return ""
+        pieces = []
+        if not self.resolved:
+            if self.header:
+                header = records.pop(0)
+                pieces.append(header)
+                self._resolve_columns(next(csv.reader([header], delimiter=self.delimiter), []))
+            else:
+                self._resolve_columns(None)
+        if not records:
+            return "".join(pieces)
+
+        rows = list(csv.reader(records, delimiter=self.delimiter))
+        if len(rows) != len(records):
+            # Records csv splits differently, passed through as they are
+            pieces.extend(records)
+            return "".join(pieces)
+
+        width = max(len(row) for row in rows)
+        columns = range(width) if self.columns is None else [column for column in self.columns if column < width]
+        changed = [False] * len(rows)
+        for column in columns:
+            cells = [row[column] if column < len(row) else None for row in rows]
+            for index, (cell, result) in enumerate(zip(cells, self.ruleset.sub_many(cells, self.whole_cells_only))):
+                if result != cell:
+                    rows[index][column] = result
+                    changed[index] = True
+
+        buffer = io.StringIO()
+        # "\r\n" makes csv quote cells with either; each row keeps its own line ending
+        writer = csv.writer(buffer, delimiter=self.delimiter, lineterminator="\r\n")
+        for record, row, row_changed in zip(records, rows, changed):
+            if not row_changed:
+                pieces.append(record)
+                continue
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerow(row)
+            pieces.append(buffer.getvalue()[:-2] + record[len(record.rstrip("\r\n")):])
+        return "".join(pieces)
+
+
+# SQL outside INSERT statements: the start of anything that must be skipped or handled as a unit
+SQL_OUTSIDE = re.compile(r"""['"`]|--|/\*|\b(?P<insert>(?:INSERT|REPLACE)(?:\s+(?:IGNORE|LOW_PRIORITY|DELAYED|HIGH_PRIORITY))*\s+INTO)\b"""
+                         r"""|\b(?P<create>CREATE\s+(?:TEMPORARY\s+)?TABLE)\b"""
+                         r"""|\bstandard_conforming_strings\s*(?:=|TO)\s*'?(?P<standard>on|off)\b""", re.I)
+# Target of an INSERT up to VALUES: table name and optional column list
+SQL_INSERT_HEAD = re.compile(r"""\s*(?P<table>(?:(?:`[^`]*`|"[^"]*"|[\w$]+)\s*\.\s*)*(?:`[^`]*`|"[^"]*"|[\w$]+))\s*"""
+                             r"""(?:\((?P<columns>[^)]*)\)\s*)?VALUES\b""", re.I)
+SQL_CREATE_HEAD = re.compile(r"""\s*(?:IF\s+NOT\s+EXISTS\s+)?(?P<table>(?:(?:`[^`]*`|"[^"]*"|[\w$]+)\s*\.\s*)*"""
+                             r"""(?:`[^`]*`|"[^"]*"|[\w$]+))\s*\(""", re.I)
+SQL_IDENTIFIER = re.compile(r"""`([^`]*)`|"([^"]*)"|([\w$]+)""")
+# Quoted strings and identifiers; a doubled quote is a quote, and with backslash escapes
+# (MySQL, PostgreSQL without standard_conforming_strings) a backslash escapes the next character
+SQL_QUOTED = {
+    "'": re.compile(r"'[^']*(?:''[^']*)*'"),
+    '"': re.compile(r'"[^"]*(?:""[^"]*)*"'),
+    "`": re.compile(r"`[^`]*(?:``[^`]*)*`"),
+}
+SQL_QUOTED_BACKSLASH = dict(SQL_QUOTED, **{
+    "'": re.compile(r"'[^'\\]*(?:(?:\\.|'')[^'\\]*)*'", re.S),
+    '"': re.compile(r'"[^"\\]*(?:(?:\\.|"")[^"\\]*)*"', re.S),
+})
+# Inside VALUES, by backslash_escapes: a whole string literal (a double-quoted identifier
+# without backslash escapes), a quote that opens an unfinished one, or punctuation
+SQL_VALUES = {
+    True: re.compile(r"""(?P<string>'[^'\\]*(?:(?:\\.|'')[^'\\]*)*'|"[^"\\]*(?:(?:\\.|"")[^"\\]*)*")"""
+                     r"""|(?P<open>['"])|[(),;]""", re.S),
+    False: re.compile(r"""(?P<string>'[^']*(?:''[^']*)*')|(?P<quoted>"[^"]*(?:""[^"]*)*")|(?P<open>['"])|[(),;]"""),
+}
+# The same for finding the end of a statement
+SQL_STATEMENT_END = {
+    True: re.compile(r"""(?P<quoted>'[^'\\]*(?:(?:\\.|'')[^'\\]*)*'|"[^"\\]*(?:(?:\\.|"")[^"\\]*)*")"""
+                     r"""|(?P<open>['"])|;""", re.S),
+    False: re.compile(r"""(?P<quoted>'[^']*(?:''[^']*)*'|"[^"]*(?:""[^"]*)*")|(?P<open>['"])|;"""),
+}
+SQL_ESCAPE = re.compile(r"\\(.)|''|\"\"", re.S)
+SQL_UNESCAPED = {'0': "\0", 'b': "\b", 'n': "\n", 'r': "\r", 't': "\t", 'Z': "\x1a"}
+# Definitions in a CREATE TABLE body that are not columns
+SQL_CONSTRAINTS = {"primary", "key", "unique", "index", "constraint", "foreign", "check", "fulltext", "spatial",
+                   "exclude", "like", "period"}
+
+
+def _sql_name(identifier):
+    """Unquoted, lower-cased last part of a possibly qualified SQL identifier"""
+    parts = [next(part for part in match.groups() if part is not None)
+             for match in SQL_IDENTIFIER.finditer(identifier)]
+    return parts[-1].lower() if parts else ""
+
+
+def _sql_unescape(match):
+    escaped = match.group(1)
+    if escaped is None:
+        return match.group()[0]
+    return SQL_UNESCAPED.get(escaped, escaped)
+
+
+class SqlRewriter:
+    """Rewrite string literals in the VALUES of INSERT statements of a SQL dump
+
+    Column names come from the INSERT's column list or, for dumps written
+    without one (mysqldump's default), from the table's CREATE TABLE earlier in
+    the dump. INSERTs into tables with no selected column are skipped without
+    looking at their values. Backslash escapes in strings are understood as
+    MySQL writes them, unless the dump sets standard_conforming_strings (as
+    pg_dump does); rewritten literals are written back with the quotes doubled
+    and, with backslash escapes, the backslashes escaped.
+    """
+
+    def __init__(self, ruleset, fields=None, whole_cells_only=False):
+        self.batch = _ValueBatch(ruleset, whole_cells_only)
+        self.fields = None if fields is None else [tuple(field.lower().rsplit(".", 1)) for field in fields]
+        self.pending = ""
+        self._reset()
+
+    def _reset(self):
+        # Table name -> column names, from CREATE TABLE statements
+        self.tables = {}
+        self.backslash_escapes = True
+        self.state = "outside"
+        # Selected column indexes of the current INSERT, None for all of them
+        self.columns = None
+        self.depth = 0
+        self.column = 0
+
+    def feed(self, text):
+        """Add text and return the part of the output that is now final"""
+        self.pending += text
+        return self._rewrite(final=False)
+
+    def flush(self):
+        """Return the rest of the output once the input has ended, ready for the next input"""
+        output = self._rewrite(final=True)
+        self._reset()
+        return output
+
+    def _selected_columns(self, table, columns):
+        """Indexes of the selected columns of an INSERT, None for all of them"""
+        if self.fields is None:
+            return None
+        if columns is None:
+            columns = self.tables.get(table, [])
+        selected = set()
+        for index, column in enumerate(columns):
+            for field in self.fields:
+                if field[-1] == column and (len(field) == 1 or field[0] == table):
+                    selected.add(index)
+                    break
+        return selected
+
+    def _string_end(self, buffer, position, final):
+        """End of the quoted string or identifier starting at position, None if it may continue"""
+        patterns = SQL_QUOTED_BACKSLASH if self.backslash_escapes else SQL_QUOTED
+        match = patterns[buffer[position]].match(buffer, position)
+        if match is None or (match.end() == len(buffer) and not final):
+            # Unterminated, or a doubled quote may follow
+            return len(buffer) if final else None
+        return match.end()
+
+    def _encode(self, quote):
+        if not self.backslash_escapes:
+            return lambda value: quote + value.replace(quote, quote + quote) + quote
+
+        def encode(value):
+            return quote + value.replace("\\", "\\\\").replace(quote, quote + quote) + quote
+        return encode
+
+    def _rewrite(self, final):
+        buffer = self.pending
+        batch = self.batch
+        position = 0
+        length = len(buffer)
+        while position < length:
+            if self.state == "outside":
+                match = SQL_OUTSIDE.search(buffer, position)
+                if match is None:
+                    # Keep enough of the end to recognise a keyword cut in half
+                    end = length if final else max(position, length - 64)
+                    batch.pieces.append(buffer[position:end])
+                    position = end
+                    break
+                if match.end() == length and not final and (match.group("insert") or match.group("create")):
+                    # The keyword might continue ("INSERT IGNORE INTO")
+                    batch.pieces.append(buffer[position:match.start()])
+                    position = match.start()
+                    break
+                batch.pieces.append(buffer[position:match.start()])
+                start = match.start()
+                token = match.group()
+                if match.group("insert"):
+                    batch.pieces.append(token)
+                    position = match.end()
+                    self.state = "insert_head"
+                    continue
+                if match.group("create"):
+                    self.state = "create"
+                    position = start
+                    continue
+                if match.group("standard"):
+                    self.backslash_escapes = match.group("standard").lower() == "off"
+                    batch.pieces.append(token)
+                    position = match.end()
+                    continue
+                if token == "--":
+                    end = buffer.find("\n", start)
+                    end = (length if final else -1) if end < 0 else end + 1
+                elif token == "/*":
+                    end = buffer.find("*/", start + 2)
+                    end = (length if final else -1) if end < 0 else end + 2
+                else:
+                    end = self._string_end(buffer, start, final)
+                    end = -1 if end is None else end
+                if end < 0:
+                    position = start
+                    break
+                batch.pieces.append(buffer[start:end])
+                position = end
+
+            elif self.state == "insert_head":
+                match = SQL_INSERT_HEAD.match(buffer, position)
+                if match is None:
+                    if not final and length - position < 64 * 1024:
+                        break
+                    # Not an INSERT ... VALUES this rewriter understands (e.g. INSERT ... SELECT)
+                    self.state = "skip"
+                    continue
+                table = _sql_name(match.group("table"))
+                columns = match.group("columns")
+                if columns is not None:
+                    columns = [_sql_name(column) for column in columns.split(",")]
+                self.columns = self._selected_columns(table, columns)
+                batch.pieces.append(match.group())
+                position = match.end()
+                self.depth = 0
+                self.column = 0
+                self.state = "values" if self.columns is None or self.columns else "skip"
+
+            elif self.state == "skip":
+                # An INSERT without selected columns: only strings and the final ';' matter
+                end, done = self._statement_end(buffer, position, final)
+                batch.pieces.append(buffer[position:end])
+                position = end
+                if not done:
+                    break
+                self.state = "outside"
+
+            elif self.state == "values":
+                position, done = self._rewrite_values(buffer, position, final)
+                if not done:
+                    break
+                self.state = "outside"
+
+            else:
+                # CREATE TABLE: collect the whole statement, then read its column names
+                end, done = self._statement_end(buffer, position, final)
+                if not done:
+                    break
+                statement = buffer[position:end]
+                self._learn_table(statement)
+                batch.pieces.append(statement)
+                position = end
+                self.state = "outside"
+
+        self.pending = buffer[position:]
+        return batch.output()
+
+    def _rewrite_values(self, buffer, position, final):
+        """Add the VALUES from position on to the output, (position reached, True if the statement ended)"""
+        batch = self.batch
+        columns = self.columns
+        depth = self.depth
+        column = self.column
+        length = len(buffer)
+        # buffer[:copied] is in the output
+        copied = position
+        done = False
+        for match in SQL_VALUES[self.backslash_escapes].finditer(buffer, position):
+            kind = match.lastgroup
+            if kind is None:
+                char = match.group()
+                if char == "(":
+                    depth += 1
+                    if depth == 1:
+                        column = 0
+                elif char == ")":
+                    if depth:
+                        depth -= 1
+                elif char == ",":
+                    if depth == 1:
+                        column += 1
+                elif depth == 0:
+                    position = match.end()
+                    done = True
+                    break
+            elif kind == "open" or (match.end() == length and not final):
+                # Unfinished, or a doubled quote may follow
+                position = length if final else match.start()
+                done = final
+                break
+            elif kind == "string" and depth and (columns is None or column in columns):
+                literal = match.group()
+                quote = literal[0]
+                content = literal[1:-1]
+                if self.backslash_escapes:
+                    if "\\" in content or quote + quote in content:
+                        content = SQL_ESCAPE.sub(_sql_unescape, content)
+                elif "''" in content:
+                    content = content.replace("''", "'")
+                batch.pieces.append(buffer[copied:match.start()])
+                batch.add_value(literal, content, self._encode(quote))
+                copied = match.end()
+        else:
+            position = length
+            done = final
+        batch.pieces.append(buffer[copied:position])
+        self.depth = depth
+        self.column = column
+        return position, done
+
+    def _statement_end(self, buffer, position, final):
+        """(position after the ';' ending the statement at position, True), or (how far it is complete, False)"""
+        length = len(buffer)
+        for match in SQL_STATEMENT_END[self.backslash_escapes].finditer(buffer, position):
+            kind = match.lastgroup
+            if kind is None:
+                return match.end(), True
+            if kind == "open" or (match.end() == length and not final):
+                return (length, True) if final else (match.start(), False)
+        return length, final
+
+    def _learn_table(self, statement):
+        head = SQL_OUTSIDE.match(statement)
+        match = SQL_CREATE_HEAD.match(statement, head.end()) if head else None
+        if match is None:
+            return
+        table = _sql_name(match.group("table"))
+        columns = []
+        depth = 0
+        definition = []
+        position = match.end()
+        while position < len(statement):
+            char = statement[position]
+            if char in "'\"`":
+                end = self._string_end(statement, position, True)
+                definition.append(statement[position:end])
+                position = end
+                continue
+            if char == "(":
+                depth += 1
+            elif char == ")":
+                if depth == 0:
+                    break
+                depth -= 1
+            elif char == "," and depth == 0:
+                columns.append("".join(definition))
+                definition = []
+                position += 1
+                continue
+            definition.append(char)
+            position += 1
+        columns.append("".join(definition))
+
+        names = []
+        for definition in columns:
+            name = SQL_IDENTIFIER.search(definition)
+            if name is None:
+                continue
+            quoted = name.group(1) is not None or name.group(2) is not None
+            name = _sql_name(name.group())
+            if quoted or name not in SQL_CONSTRAINTS:
+                names.append(name)
+        self.tables[table] = names
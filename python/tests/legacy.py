@@ -0,0 +1,38 @@
+"""The per-rule replacement loops the engine replaced, as reference implementations for the tests"""
+import re
+
+
+def legacy_preserve_case_pattern(original_match, replacement):
+    """The original TextAnonymizer.preserve_case_pattern"""
+    if len(original_match) == 0:
+        return replacement
+    result = ""
+    for i, char in enumerate(replacement):
+        if i < len(original_match):
+            result += char.upper() if original_match[i].isupper() else char.lower()
+        elif len(replacement) < len(original_match):
+            result += char
+        else:
+            result += char.lower()
+    return result
+
+
+def per_rule_loop(text, rules, case_insensitive, whole_words_only, reverse=False):
+    """The original anonymize_text / deanonymize_text loop, one re.sub per rule"""
+    if reverse:
+        rules = [{'original': rule['replacement'], 'replacement': rule['original']} for rule in reversed(rules)]
+    for rule in rules:
+        original = rule['original']
+        replacement = rule['replacement']
+        if case_insensitive:
+            def replace_func(match):
+                return legacy_preserve_case_pattern(match.group(0), replacement)
+            pattern = re.escape(original)
+            if whole_words_only:
+                pattern = r'\b' + pattern + r'\b'
+            text = re.sub(pattern, replace_func, text, flags=re.IGNORECASE)
+        elif whole_words_only:
+            text = re.sub(r'\b' + re.escape(original) + r'\b', lambda match: replacement, text)
+        else:
+            text = text.replace(original, replacement)
+    return text
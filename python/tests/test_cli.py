@@ -0,0 +1,51 @@
+import json
+import os
+
+import pytest
+
+import cli
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def read(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def test_single_input_mirrors_its_tree(tmp_path):
+    write(str(tmp_path / "src" / "a.txt"), "a")
+    write(str(tmp_path / "src" / "sub" / "b.txt"), "b")
+    files = cli.collect_files([str(tmp_path / "src")])
+    assert sorted(relpath for _, relpath in files) == ["a.txt", os.path.join("sub", "b.txt")]
+
+
+def test_several_inputs_are_prefixed_with_their_root(tmp_path):
+    write(str(tmp_path / "src" / "a.txt"), "a")
+    write(str(tmp_path / "lib" / "a.txt"), "a")
+    files = cli.collect_files([str(tmp_path / "src"), str(tmp_path / "lib") + "/*.txt"])
+    assert [relpath for _, relpath in files] == [os.path.join("src", "a.txt"), os.path.join("lib", "a.txt")]
+
+
+def test_colliding_destinations_are_rejected(tmp_path):
+    write(str(tmp_path / "one" / "data" / "a.txt"), "a")
+    write(str(tmp_path / "two" / "data" / "a.txt"), "a")
+    with pytest.raises(ValueError, match="would both be written"):
+        cli.collect_files([str(tmp_path / "one" / "data"), str(tmp_path / "two" / "data")])
+
+
+def test_batch_writes_every_input(tmp_path):
+    config = tmp_path / "config_Test.json"
+    config.write_text(json.dumps({"replacements": [{"original": "Bob", "replacement": "Alice"}],
+                                  "case_insensitive": False, "whole_words_only": True}))
+    write(str(tmp_path / "src" / "a.txt"), "Bob from src")
+    write(str(tmp_path / "lib" / "a.txt"), "Bob from lib")
+    output = tmp_path / "out"
+    assert cli.main(["batch", "-c", str(config), "-j", "1", "-q",
+                     str(tmp_path / "src"), str(tmp_path / "lib"), "-o", str(output)]) == 0
+    assert read(str(output / "src" / "a.txt")) == "Alice from src"
+    assert read(str(output / "lib" / "a.txt")) == "Alice from lib"
@@ -0,0 +1,104 @@
+import json
+import os
+import pickle
+import stat
+import sys
+
+import pytest
+
+import config_cache
+import engine
+
+unpickled = []
+
+
+def _record(value):
+    unpickled.append(value)
+    return value
+
+
+class Payload:
+    def __reduce__(self):
+        return _record, ("unpickled",)
+
+
+@pytest.fixture
+def config_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(sys, "platform", "linux")
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    path = tmp_path / "configs" / "config_Test.json"
+    path.parent.mkdir()
+    path.write_text(json.dumps({'replacements': [{'original': "Bob", 'replacement': "Alice"}],
+                                'case_insensitive': True, 'whole_words_only': True}))
+    engine.ruleset_cache.clear()
+    yield str(path)
+    engine.ruleset_cache.clear()
+
+
+def stored(path):
+    config = config_cache.load_config(path)
+    engine.compile_rules(config)
+    assert config_cache.store(path, config)
+    return config
+
+
+def test_sidecar_lives_in_the_private_user_cache(config_file, tmp_path):
+    config = stored(config_file)
+    sidecar = config_cache.cache_path(config_file)
+    assert os.path.dirname(sidecar) == str(tmp_path / "cache" / "text-anonymizer" / "configs")
+    assert not any(name.endswith(".cache") for name in os.listdir(os.path.dirname(config_file)))
+    if hasattr(os, "getuid"):
+        assert stat.S_IMODE(os.stat(sidecar).st_mode) == 0o600
+        assert stat.S_IMODE(os.stat(os.path.dirname(sidecar)).st_mode) == 0o700
+
+    engine.ruleset_cache.clear()
+    assert config_cache.load_config(config_file) == config
+    # The compiled rule set came from the sidecar
+    assert engine.ruleset_cache.peek(config) is not None
+
+
+def test_forged_sidecar_is_never_unpickled(config_file):
+    stored(config_file)
+    sidecar = config_cache.cache_path(config_file)
+    forged = pickle.dumps(((None, None), []), pickle.HIGHEST_PROTOCOL) + pickle.dumps(Payload())
+    for content in (forged,
+                    config_cache.MAGIC + b"\0" * 32 + forged,
+                    open(sidecar, 'rb').read()[:-1] + b"X"):
+        with open(sidecar, 'wb') as f:
+            f.write(content)
+        engine.ruleset_cache.clear()
+        config = config_cache.load_config(config_file)
+        assert config['replacements'][0]['original'] == "Bob"
+        assert engine.ruleset_cache.peek(config) is None
+    assert unpickled == []
+
+
+@pytest.mark.skipif(not hasattr(os, "getuid"), reason="POSIX permissions")
+def test_cache_is_disabled_when_the_key_is_not_private(config_file):
+    stored(config_file)
+    os.chmod(os.path.join(config_cache.cache_dir(), config_cache.KEY_FILE), 0o644)
+    engine.ruleset_cache.clear()
+    config = config_cache.load_config(config_file)
+    assert engine.ruleset_cache.peek(config) is None
+    engine.compile_rules(config)
+    assert not config_cache.store(config_file, config)
+
+
+def test_regex_programs_are_only_reused_by_the_same_interpreter(monkeypatch):
+    ruleset = engine.CompiledRuleSet([("Bob", "Alice"), ("Bobby", "Al")], case_insensitive=True)
+    state = pickle.dumps(ruleset)
+    compiled = []
+    real_compile_regex = engine._compile_regex
+    monkeypatch.setattr(engine, "_compile_regex", lambda *args: compiled.append(args) or real_compile_regex(*args))
+
+    assert pickle.loads(state).sub("bobby and BOB") == "al and ALIce"
+    if engine.SRE_PROGRAMS:
+        assert compiled == []
+
+    monkeypatch.setattr(engine, "SRE_VERSION", ("cpython", (3, 0, 0), 0, 0))
+    assert pickle.loads(state).sub("bobby and BOB") == "al and ALIce"
+    assert len(compiled) == 1
+
+    monkeypatch.setattr(engine, "SRE_PROGRAMS", False)
+    pattern, program = real_compile_regex("a|b", 0)
+    assert program is None and pattern.pattern == "a|b"
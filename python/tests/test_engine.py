@@ -0,0 +1,150 @@
+import random
+
+import pytest
+
+import engine
+from legacy import legacy_preserve_case_pattern, per_rule_loop
+
+
+@pytest.mark.parametrize("case_insensitive", [False, True])
+def test_long_prefix_chain_compiles(case_insensitive):
+    # Every rule is a prefix of the next one, which nests the trie 1500 levels deep
+    rules = [{'original': "a" * length, 'replacement': f"R{length}"} for length in range(1, 1500)]
+    config = {'replacements': rules, 'case_insensitive': case_insensitive, 'whole_words_only': True}
+    text = " ".join("a" * length for length in (1, 3, 64, 65, 599, 1499, 1500))
+    assert engine.anonymize(text, config) == per_rule_loop(text, rules, case_insensitive, True)
+    assert engine.anonymize(text, config).upper().split()[:6] == ["R1", "R3", "R64", "R65", "R599", "R1499"]
+
+
+def test_prefix_chain_prefers_longest_match_without_word_boundaries():
+    rules = [{'original': "ab" * length, 'replacement': f"<{length}>"} for length in range(1, 300)]
+    config = {'replacements': rules, 'case_insensitive': False, 'whole_words_only': False}
+    assert engine.anonymize("ab" * 299 + "ab" * 2 + "x", config) == "<299><2>x"
+
+
+def test_ruleset_key_is_hashed_once_per_rule_store_version(monkeypatch):
+    from rule_store import RuleStore
+
+    config = {'replacements': RuleStore([{'original': "Bob", 'replacement': "Person"}]),
+              'case_insensitive': False}
+    cache = engine.RuleSetCache()
+    calls = []
+    real_key = engine.ruleset_key
+    monkeypatch.setattr(engine, "ruleset_key", lambda *args: calls.append(args) or real_key(*args))
+    first = cache.get(config)
+    for _ in range(100):
+        assert cache.get(dict(config)) is first
+    assert len(calls) == 1
+    config['replacements'].add("Alice", "Other")
+    assert cache.get(config).sub("Alice") == "Other"
+    assert len(calls) == 2
+
+
+def test_plain_rules_edited_in_place_are_recompiled():
+    config = {'replacements': [{'original': "Alice", 'replacement': "P1"}]}
+    assert engine.anonymize("Alice here", config) == "P1 here"
+    config['replacements'][0]['replacement'] = "P2"
+    assert engine.anonymize("Alice here", config) == "P2 here"
+    config['replacements'][0]['original'] = "Bob"
+    assert engine.anonymize("Alice and Bob here", config) == "Alice and P2 here"
+
+
+def test_ruleset_cache_does_not_keep_configs_alive():
+    import gc
+    import weakref
+
+    from rule_store import RuleStore
+
+    class Config(dict):
+        pass
+
+    cache = engine.RuleSetCache()
+    # Like the GUI's per-job snapshot of the rules
+    snapshot = Config(replacements=[{'original': "Bob", 'replacement': "Person"}])
+    store = RuleStore(snapshot['replacements'])
+    cache.get(snapshot)
+    cache.get({'replacements': store})
+    references = [weakref.ref(snapshot), weakref.ref(store)]
+    del snapshot, store
+    gc.collect()
+    assert [reference() for reference in references] == [None, None]
+    assert len(cache._keys) == 0
+
+
+def test_ruleset_cache_sees_changed_rules():
+    from rule_store import RuleStore
+
+    rules = RuleStore([{'original': "Bob", 'replacement': "Person"}])
+    config = {'replacements': rules, 'case_insensitive': False}
+    cache = engine.RuleSetCache()
+    assert cache.get(config).sub("Bob") == "Person"
+    rules.update("Bob", "Bob", "Someone")
+    assert cache.get(config).sub("Bob") == "Someone"
+    rules.add("Alice", "Other")
+    assert cache.get(config).sub("Alice") == "Other"
+
+    plain = {'replacements': [{'original': "Bob", 'replacement': "Person"}]}
+    assert cache.get(plain).sub("Bob") == "Person"
+    plain['replacements'][0]['replacement'] = "Someone"
+    assert cache.get(plain).sub("Bob") == "Someone"
+    plain['case_insensitive'] = True
+    assert cache.get(plain).sub("BOB") == "SOMeone"
+
+
+def test_unique_tokens_avoid_case_variants_of_the_input():
+    # "Bob" becomes "Alice", which case-insensitively is the user's own "alice"
+    config = {'replacements': [{'original': "Bob", 'replacement': "alice"}], 'case_insensitive': True,
+              'whole_words_only': True, 'unique_tokens': True}
+    text = "Bob met alice. BOB too."
+    anonymized, ledger = engine.anonymize_with_ledger(text, config)
+    tokens = [token.lower() for token in ledger.tokens]
+    assert "alice" not in tokens
+    assert len(set(tokens)) == len(tokens)
+    # Edited text falls back to the token lookup, which must still tell them apart
+    assert engine.deanonymize_with_ledger(anonymized + "\n", ledger, config) == text + "\n"
+
+
+def test_unique_tokens_stay_case_sensitive_without_case_insensitive():
+    config = {'replacements': [{'original': "Bob", 'replacement': "Alice"}], 'case_insensitive': False,
+              'whole_words_only': True, 'unique_tokens': True}
+    anonymized, ledger = engine.anonymize_with_ledger("Bob met alice.", config)
+    assert anonymized == "Alice met alice."
+
+
+def test_preserve_case_pattern_matches_the_per_character_rule():
+    rng = random.Random(1)
+    alphabet = "aAbBzZ_1 .ßÄäΣσςǅϒİ"
+    for _ in range(20000):
+        original = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 8)))
+        replacement = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 8)))
+        assert engine.preserve_case_pattern(original, replacement) == \
+            legacy_preserve_case_pattern(original, replacement), (original, replacement)
+    for original in ("david", "DAVID", "David", "DaViD", "API_KEY_12345", "12345", "STRAßE", "Größe"):
+        for replacement in ("Lucas", "COMPANY_ANONYMOUS", "x", "Größe"):
+            assert engine.preserve_case_pattern(original, replacement) == \
+                legacy_preserve_case_pattern(original, replacement), (original, replacement)
+
+
+def test_ruleset_cache_lookup_and_discard_from_another_thread_do_not_interleave():
+    import threading
+    from collections import OrderedDict
+
+    config = {'replacements': [{'original': "Bob", 'replacement': "Person"}]}
+    cache = engine.RuleSetCache()
+    compiled = cache.get(config)
+    threads = []
+
+    class Entries(OrderedDict):
+        def get(self, key, default=None):
+            value = super().get(key, default)
+            if value is not None and not threads:
+                # Another thread discards the entry right after it was found
+                threads.append(threading.Thread(target=cache.discard, args=(config,)))
+                threads[0].start()
+                threads[0].join(0.2)
+            return value
+
+    cache.entries = Entries(cache.entries)
+    assert cache.get(config) is compiled
+    threads[0].join()
+    assert cache.peek(config) is None
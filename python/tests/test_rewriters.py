@@ -0,0 +1,208 @@
+"""Randomized equivalence of the single-pass engine, its rewriters and the legacy per-rule loop"""
+import random
+
+import pytest
+
+import engine
+from legacy import per_rule_loop
+
+OPTIONS = [(case_insensitive, whole_words_only)
+           for case_insensitive in (False, True) for whole_words_only in (True, False)]
+ADVERSARIAL = "abAB_ ſsS.-é\n"
+
+
+def chunks(text, rng, longest):
+    position = 0
+    while position < len(text):
+        size = rng.randint(1, longest)
+        yield text[position:position + size]
+        position += size
+
+
+def make_independent_case(rng, words=40):
+    """Rules and text on which applying the rules one by one or in one pass must agree
+
+    No original is a substring of another or of any replacement, and the text
+    is whole originals in varied case between separators and filler words that
+    share no letters with them, so no rule can match across or inside another
+    rule's match or replacement.
+    """
+    originals = []
+    count = rng.randint(1, 12)
+    while len(originals) < count:
+        original = "".join(rng.choice("abcdef") for _ in range(rng.randint(2, 6)))
+        if not any(original in other or other in original for other in originals):
+            originals.append(original)
+    rules = [{'original': original, 'replacement': f"Xz{index}Y"} for index, original in enumerate(originals)]
+    pieces = []
+    for _ in range(rng.randint(0, words)):
+        if rng.random() < 0.5:
+            word = rng.choice(originals)
+            shape = rng.random()
+            if shape < 0.2:
+                word = word.upper()
+            elif shape < 0.4:
+                word = word.capitalize()
+            elif shape < 0.6:
+                word = "".join(char.upper() if rng.random() < 0.5 else char for char in word)
+        else:
+            word = "".join(rng.choice("ghk7") for _ in range(rng.randint(1, 5)))
+        pieces.append(word)
+        pieces.append(rng.choice([" ", ", ", ".", "-", "\n", "_"]))
+    return rules, "".join(pieces)
+
+
+def make_adversarial_case(rng):
+    """Short overlapping rules, prefixes of each other, over a small alphabet with case-folding traps"""
+    rules = []
+    for index in range(rng.randint(1, 8)):
+        original = "".join(rng.choice(ADVERSARIAL) for _ in range(rng.randint(1, 5)))
+        if original not in [rule['original'] for rule in rules]:
+            rules.append({'original': original, 'replacement': rng.choice([f"R{index}", f"Xy_{index}", "q", ""])})
+    text = "".join(rng.choice(ADVERSARIAL + "xy") for _ in range(rng.randint(0, 80)))
+    return rules, text
+
+
+def config_of(rules, case_insensitive, whole_words_only):
+    return {'replacements': rules, 'case_insensitive': case_insensitive, 'whole_words_only': whole_words_only}
+
+
+@pytest.mark.parametrize("case_insensitive,whole_words_only", OPTIONS)
+def test_sub_matches_per_rule_loop(case_insensitive, whole_words_only):
+    rng = random.Random(1)
+    for _ in range(300):
+        rules, text = make_independent_case(rng)
+        config = config_of(rules, case_insensitive, whole_words_only)
+        anonymized = engine.compile_rules(config).sub(text)
+        assert anonymized == per_rule_loop(text, rules, case_insensitive, whole_words_only)
+        assert engine.compile_rules(config, reverse=True).sub(anonymized) == \
+            per_rule_loop(anonymized, rules, case_insensitive, whole_words_only, reverse=True)
+
+
+@pytest.mark.parametrize("case_insensitive,whole_words_only", OPTIONS)
+@pytest.mark.parametrize("rewriter_class", [engine.StreamRewriter, engine.TokenStreamRewriter])
+def test_stream_rewriters_match_per_rule_loop_at_any_chunk_boundary(rewriter_class, case_insensitive, whole_words_only):
+    rng = random.Random(2)
+    for _ in range(200):
+        rules, text = make_independent_case(rng)
+        rewriter = rewriter_class(engine.compile_rules(config_of(rules, case_insensitive, whole_words_only)))
+        output = [rewriter.feed(chunk) for chunk in chunks(text, rng, 9)]
+        output.append(rewriter.flush())
+        assert "".join(output) == per_rule_loop(text, rules, case_insensitive, whole_words_only)
+
+
+@pytest.mark.parametrize("case_insensitive,whole_words_only", OPTIONS)
+@pytest.mark.parametrize("rewriter_class", [engine.StreamRewriter, engine.TokenStreamRewriter])
+def test_stream_rewriters_match_sub_on_overlapping_rules(rewriter_class, case_insensitive, whole_words_only):
+    rng = random.Random(3)
+    for _ in range(300):
+        rules, text = make_adversarial_case(rng)
+        config = config_of(rules, case_insensitive, whole_words_only)
+        for reverse in (False, True):
+            ruleset = engine.compile_rules(config, reverse=reverse)
+            rewriter = rewriter_class(ruleset)
+            output = [rewriter.feed(chunk) for chunk in chunks(text, rng, 7)]
+            output.append(rewriter.flush())
+            assert "".join(output) == ruleset.sub(text), (rules, text, reverse)
+
+
+@pytest.mark.parametrize("case_insensitive,whole_words_only", OPTIONS)
+def test_parallel_rewriter_matches_per_rule_loop(case_insensitive, whole_words_only):
+    rng = random.Random(4)
+    for _ in range(3):
+        rules, text = make_independent_case(rng, words=1000)
+        expected = per_rule_loop(text, rules, case_insensitive, whole_words_only)
+        for segment_size in (5, 37, 200):
+            with engine.ParallelRewriter(config_of(rules, case_insensitive, whole_words_only),
+                                         workers=2, segment_size=segment_size) as rewriter:
+                output = [rewriter.feed(chunk) for chunk in chunks(text, rng, 400)]
+                output.append(rewriter.flush())
+            assert "".join(output) == expected
+
+
+def test_parallel_rewriter_matches_sub_on_overlapping_rules():
+    rng = random.Random(5)
+    for _ in range(10):
+        rules, _ = make_adversarial_case(rng)
+        text = "".join(rng.choice(ADVERSARIAL + "xy") for _ in range(rng.randint(0, 3000)))
+        config = config_of(rules, rng.random() < 0.5, rng.random() < 0.5)
+        for reverse in (False, True):
+            expected = engine.compile_rules(config, reverse=reverse).sub(text)
+            with engine.ParallelRewriter(config, reverse=reverse, workers=2,
+                                         segment_size=rng.randint(5, 200)) as rewriter:
+                output = [rewriter.feed(chunk) for chunk in chunks(text, rng, 400)]
+                output.append(rewriter.flush())
+            assert "".join(output) == expected, (config, reverse)
+
+
+@pytest.mark.parametrize("case_insensitive,whole_words_only", OPTIONS)
+def test_edits_over_consecutive_ranges_match_one_full_scan(case_insensitive, whole_words_only):
+    rng = random.Random(6)
+    for _ in range(300):
+        rules, text = make_adversarial_case(rng)
+        ruleset = engine.compile_rules(config_of(rules, case_insensitive, whole_words_only))
+        full_ledger = engine.Ledger()
+        expected = ruleset.sub(text, ledger=full_ledger)
+
+        found, position, shift, ledger = [], 0, 0, engine.Ledger()
+        step = rng.randint(1, 10)
+        while position < len(text):
+            edits, position, shift = ruleset.edits(text, position, min(position + step, len(text)), ledger, shift)
+            found.extend(edits)
+        assert engine.apply_edits(text, found) == expected, (rules, text)
+        assert list(ledger.spans()) == list(full_ledger.spans())
+
+        pieces, position = [], 0
+        while position < len(text):
+            end = min(position + step, len(text))
+            rewritten, stop = ruleset.rewrite_range(text, position, end)
+            pieces.extend(rewritten)
+            if stop < end:
+                pieces.append(text[stop:end])
+            position = max(stop, end)
+        assert "".join(pieces) == expected, (rules, text)
+
+
+@pytest.mark.parametrize("case_insensitive,whole_words_only", OPTIONS)
+def test_deanonymize_stream_restores_at_any_fragment_boundary(case_insensitive, whole_words_only):
+    rng = random.Random(7)
+    for _ in range(200):
+        rules, text = make_independent_case(rng)
+        config = config_of(rules, case_insensitive, whole_words_only)
+        anonymized = engine.anonymize(text, config)
+        restored = "".join(engine.deanonymize_stream(chunks(anonymized, rng, 4), config))
+        assert restored == per_rule_loop(anonymized, rules, case_insensitive, whole_words_only, reverse=True)
+
+        anonymized, ledger = engine.anonymize_with_ledger(text, config)
+        restored = "".join(engine.deanonymize_stream(chunks(anonymized, rng, 4), config, ledger=ledger))
+        # The stream cannot tell whether it is the unchanged text, so it maps tokens like edited text
+        assert restored == engine.ledger_ruleset(ledger, config).sub(anonymized)
+
+
+@pytest.mark.parametrize("case_insensitive,whole_words_only", OPTIONS)
+def test_sub_many_matches_sub_per_cell(case_insensitive, whole_words_only):
+    rng = random.Random(8)
+    for _ in range(300):
+        rules, _ = make_adversarial_case(rng)
+        cells = []
+        for _ in range(30):
+            roll = rng.random()
+            if roll < 0.4:
+                cell = rng.choice(rules)['original']
+                if rng.random() < 0.3:
+                    cell = cell.upper()
+            elif roll < 0.5:
+                cell = None
+            else:
+                cell = "".join(rng.choice(ADVERSARIAL) for _ in range(rng.randint(0, 8)))
+            cells.append(cell)
+        config = config_of(rules, case_insensitive, whole_words_only)
+        for reverse in (False, True):
+            ruleset = engine.compile_rules(config, reverse=reverse)
+            assert list(ruleset.sub_many(cells)) == [cell if cell is None else ruleset.sub(cell) for cell in cells]
+
+            expected = []
+            for cell in cells:
+                match = None if cell is None or ruleset.pattern is None else ruleset.pattern.fullmatch(cell)
+                expected.append(ruleset.replace_match(match) if match else cell)
+            assert list(ruleset.sub_many(cells, whole_cells_only=True)) == expected
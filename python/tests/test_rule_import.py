@@ -0,0 +1,46 @@
+import csv
+import json
+
+import pytest
+
+import cli
+import rule_import
+from rule_store import RuleStore
+
+
+def test_malformed_jsonl_lines_are_skipped_with_their_location(tmp_path):
+    path = tmp_path / "rules.jsonl"
+    path.write_text("\n".join([json.dumps({'original': "Bob", 'replacement': "P1"}),
+                               '{"original": "Alice", "replacement": ',
+                               '["x", "y"]',
+                               "",
+                               json.dumps({'original': "Carol", 'replacement': "P3"})]) + "\n")
+    store, report = rule_import.import_rules([str(path)], RuleStore([{'original': "Dave", 'replacement': "P0"}]))
+    assert [rule['original'] for rule in store] == ["Dave", "Bob", "Carol"]
+    assert (report.added, report.skipped) == (2, 2)
+    assert report.skipped_samples[0].startswith(f"{path}:2: invalid JSON")
+    assert report.skipped_samples[1] == f"{path}:3: not a JSON object"
+
+    with pytest.raises(ValueError, match=":2: invalid JSON"):
+        list(rule_import.iter_rules(str(path)))
+
+
+def test_unreadable_csv_rows_are_skipped(tmp_path):
+    path = tmp_path / "rules.csv"
+    path.write_text("original,replacement\nBob,P1\n" + "x" * 100 + ",P2\nCarol,P3\n")
+    previous = csv.field_size_limit(50)
+    try:
+        store, report = rule_import.import_rules([str(path)])
+    finally:
+        csv.field_size_limit(previous)
+    assert [rule['original'] for rule in store] == ["Bob", "Carol"]
+    assert report.skipped_samples == [f"{path}:3: field larger than field limit (50)"]
+
+
+def test_cli_import_reports_bad_lines_instead_of_crashing(tmp_path, capsys):
+    path = tmp_path / "rules.jsonl"
+    path.write_text('{"original": "Bob", "replacement": "P1"}\n["x", "y"]\n')
+    config = tmp_path / "config_Imported.json"
+    assert cli.main(["import", str(path), "-c", str(config)]) == 0
+    assert json.loads(config.read_text())['replacements'] == [{'original': "Bob", 'replacement': "P1"}]
+    assert f"SKIPPED {path}:2: not a JSON object" in capsys.readouterr().err
@@ -0,0 +1,62 @@
+import random
+import time
+
+import pytest
+
+from rule_store import RuleStore
+
+
+def test_positions_match_a_plain_list_under_random_edits():
+    rng = random.Random(1)
+    store = RuleStore()
+    expected = []
+    for step in range(5000):
+        roll = rng.random()
+        if roll < 0.5 or not expected:
+            original = f"o{step}"
+            store.add(original, f"r{step}")
+            expected.append(original)
+        elif roll < 0.8:
+            original = expected.pop(rng.randrange(len(expected)))
+            store.remove(original)
+        else:
+            row = rng.randrange(len(expected))
+            store.update(expected[row], f"u{step}", f"r{step}")
+            expected[row] = f"u{step}"
+        if expected and step % 7 == 0:
+            row = rng.randrange(len(expected))
+            assert store.rule_at(row)['original'] == expected[row]
+            assert store.row_of(expected[row]) == row
+            assert store.rule_at(-1)['original'] == expected[-1]
+    assert [rule['original'] for rule in store] == expected
+    assert [store.rule_at(row)['original'] for row in range(len(expected))] == expected
+    assert [store.row_of(original) for original in expected] == list(range(len(expected)))
+    with pytest.raises(IndexError):
+        store.rule_at(len(expected))
+    with pytest.raises(IndexError):
+        store.rule_at(-len(expected) - 1)
+
+
+def test_reads_do_not_compact():
+    store = RuleStore({'original': f"o{i}", 'replacement': f"r{i}"} for i in range(1000))
+    for i in range(0, 200, 2):
+        store.remove(f"o{i}")
+    slots = store._slots
+    assert store.rule_at(0)['original'] == "o1"
+    assert store.row_of("o999") == 899
+    assert store._slots is slots and len(store._holes) == 100
+
+
+def test_deleting_row_by_row_stays_cheap():
+    # What the rules table does per removal: row_of, remove, then repaint reads
+    count = 200000
+    store = RuleStore({'original': f"o{i}", 'replacement': f"r{i}"} for i in range(count))
+    start = time.perf_counter()
+    for i in range(0, 20000, 2):
+        row = store.row_of(f"o{i}")
+        store.remove(f"o{i}")
+        store.rule_at(row)
+    elapsed = time.perf_counter() - start
+    # Compacting on every read took about 40 ms per removal here
+    assert elapsed < 2.0
+    assert store.row_of("o20001") == 10001
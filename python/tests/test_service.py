@@ -0,0 +1,121 @@
+import asyncio
+import json
+import os
+import threading
+
+import pytest
+
+import config_store
+import service
+
+
+@pytest.fixture
+def configs_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    monkeypatch.setattr(config_store, "CONFIGS_DIR", str(tmp_path))
+    return tmp_path
+
+
+def write_config(directory, replacement, mtime_ns):
+    path = os.path.join(str(directory), "config_Test.json")
+    with open(path, "w") as f:
+        f.write(json.dumps({'replacements': [{'original': "Bob", 'replacement': replacement}],
+                            'case_insensitive': False, 'whole_words_only': True}))
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+    return path
+
+
+def test_configs_are_loaded_once_off_the_event_loop(configs_dir, monkeypatch):
+    write_config(configs_dir, "Alice", 10 ** 18)
+    configs = service.WarmConfigs()
+    threads = []
+    real_load = configs._load
+    monkeypatch.setattr(configs, "_load", lambda path: threads.append(threading.get_ident()) or real_load(path))
+
+    async def run():
+        results = await asyncio.gather(*(configs.get("Test") for _ in range(5)))
+        return results, threading.get_ident()
+
+    results, loop_thread = asyncio.run(run())
+    assert len(threads) == 1 and threads[0] != loop_thread
+    assert all(rulesets[False].sub("Bob") == "Alice" for _, rulesets in results)
+
+
+def test_changed_config_is_served_stale_until_reloaded(configs_dir):
+    write_config(configs_dir, "Alice", 10 ** 18)
+    configs = service.WarmConfigs()
+
+    async def run():
+        _, rulesets = await configs.get("Test")
+        assert rulesets[False].sub("Bob") == "Alice"
+
+        write_config(configs_dir, "Carol", 2 * 10 ** 18)
+        _, rulesets = await configs.get("Test")
+        assert rulesets[False].sub("Bob") == "Alice"
+        await asyncio.shield(configs.loading["Test"])
+        await asyncio.sleep(0)
+        _, rulesets = await configs.get("Test")
+        assert rulesets[False].sub("Bob") == "Carol"
+
+        # A broken file keeps the last good rules and is retried on the next request
+        path = write_config(configs_dir, "Dave", 3 * 10 ** 18)
+        with open(path, "a") as f:
+            f.write("{")
+        _, rulesets = await configs.get("Test")
+        with pytest.raises(ValueError):
+            await asyncio.shield(configs.loading["Test"])
+        await asyncio.sleep(0)
+        assert "Test" not in configs.loading
+        _, rulesets = await configs.get("Test")
+        assert rulesets[False].sub("Bob") == "Carol"
+
+    asyncio.run(run())
+
+
+def test_service_answers_with_a_config(configs_dir):
+    write_config(configs_dir, "Alice", 10 ** 18)
+
+    async def run():
+        anonymizer = service.async_engine.AsyncAnonymizer()
+        async with anonymizer:
+            app = service.AnonymizationService(anonymizer=anonymizer)
+            status, payload = await app.handle("POST", "/anonymize", json.dumps({'config': "Test", 'text': "Bob"}))
+            assert (status, payload) == (200, {'text': "Alice"})
+            with pytest.raises(service.ServiceError) as error:
+                await app.handle("POST", "/anonymize", json.dumps({'config': "Missing", 'text': "Bob"}))
+            assert error.value.status == 404
+
+    asyncio.run(run())
+
+
+def test_requests_a_web_page_could_send_are_refused(configs_dir):
+    write_config(configs_dir, "Alice", 10 ** 18)
+
+    async def request(port, headers):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        body = json.dumps({'config': "Test", 'text': "Bob"}).encode()
+        lines = ["POST /anonymize HTTP/1.1", f"Content-Length: {len(body)}", "Connection: close"] + headers
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + body)
+        response = await reader.read()
+        writer.close()
+        return int(response.split()[1]), json.loads(response.split(b"\r\n\r\n", 1)[1])
+
+    async def run():
+        async with service.async_engine.AsyncAnonymizer() as anonymizer:
+            app = service.AnonymizationService(anonymizer=anonymizer)
+            server = await asyncio.start_server(
+                lambda reader, writer: service.serve_connection(app, reader, writer), "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                for host in (f"127.0.0.1:{port}", f"localhost:{port}", "LOCALHOST", f"[::1]:{port}"):
+                    assert await request(port, [f"Host: {host}"]) == (200, {'text': "Alice"})
+                assert (await request(port, []))[0] == 200
+                # DNS rebinding: the page's own host name
+                assert (await request(port, [f"Host: attacker.example:{port}"]))[0] == 403
+                assert (await request(port, ["Host: 127.0.0.1.attacker.example"]))[0] == 403
+                # Cross-origin fetch, e.g. a text/plain POST
+                assert (await request(port, [f"Host: 127.0.0.1:{port}", "Origin: https://attacker.example",
+                                             "Content-Type: text/plain"]))[0] == 403
+                assert (await request(port, [f"Host: localhost:{port}", "Origin: null"]))[0] == 403
+
+    asyncio.run(run())
@@ -0,0 +1,224 @@
+"""Randomized round trips of the structure-aware rewriters: parse, rewrite in random chunks, compare"""
+import csv
+import io
+import json
+import random
+
+import pytest
+
+import engine
+import structured
+
+# Replacements with quotes, backslashes, delimiters and line breaks, which every format must encode
+RULES = [
+    {'original': "Bob", 'replacement': "O'Neil \\ \"P1\""},
+    {'original': "Alice Smith", 'replacement': "Person, 2"},
+    {'original': "alice@example.com", 'replacement': "p2@example.net\n"},
+    {'original': "Zoë", 'replacement': "P3 ø\t"},
+]
+VALUES = ["Bob", "bob", "Alice Smith", "alice@example.com", "Bob and Alice Smith", "Zoë", "no match", "",
+          'say "Bob"', "C:\\Bob\\", "line\nBob", "Bob, Alice Smith", "it's Bob", "tab\tBob", "ünïcode Bob ☃",
+          "\\n is not Bob"]
+
+
+def chunks(text, rng, longest):
+    position = 0
+    while position < len(text):
+        size = rng.randint(1, longest)
+        yield text[position:position + size]
+        position += size
+
+
+def rewrite(file_format, ruleset, fields, text, rng):
+    rewriter = structured.open_rewriter(file_format, ruleset, fields)
+    output = [rewriter.feed(chunk) for chunk in chunks(text, rng, rng.choice([3, 17, 200]))]
+    output.append(rewriter.flush())
+    return "".join(output)
+
+
+def ruleset_of(case_insensitive):
+    return engine.compile_rules({'replacements': RULES, 'case_insensitive': case_insensitive,
+                                 'whole_words_only': True})
+
+
+# JSON: keys that equal originals must stay keys
+
+JSON_KEYS = ["email", "user", "name", "notes", "Bob", "Alice Smith"]
+JSON_FIELDS = [None, ["email"], ["user.email"], ["Bob"], ["notes", "user.name"]]
+
+
+def make_json(rng, depth=0):
+    roll = rng.random()
+    if depth < 4 and roll < 0.3:
+        return {rng.choice(JSON_KEYS): make_json(rng, depth + 1) for _ in range(rng.randint(0, 4))}
+    if depth < 4 and roll < 0.45:
+        return [make_json(rng, depth + 1) for _ in range(rng.randint(0, 3))]
+    if roll < 0.55:
+        return rng.choice([0, -1.5, 1e21, True, False, None])
+    return rng.choice(VALUES)
+
+
+def expected_json(value, ruleset, selectors, path=(), selected=False):
+    if isinstance(value, dict):
+        return {key: expected_json(item, ruleset, selectors, path + (key,),
+                                   selected or any((path + (key,))[-len(selector):] == selector
+                                                   for selector in selectors))
+                for key, item in value.items()}
+    if isinstance(value, list):
+        return [expected_json(item, ruleset, selectors, path, selected) for item in value]
+    if isinstance(value, str) and selected:
+        return ruleset.sub(value)
+    return value
+
+
+@pytest.mark.parametrize("case_insensitive", [False, True])
+@pytest.mark.parametrize("fields", JSON_FIELDS)
+def test_json_values_are_rewritten_and_keys_kept_at_any_chunk_boundary(fields, case_insensitive):
+    rng = random.Random(1)
+    ruleset = ruleset_of(case_insensitive)
+    selectors = None if fields is None else [tuple(field.split(".")) for field in fields]
+    for _ in range(150):
+        document = [{'user': make_json(rng), rng.choice(JSON_KEYS): make_json(rng)} for _ in range(rng.randint(1, 4))]
+        text = json.dumps(document, indent=rng.choice([None, 2]), ensure_ascii=rng.random() < 0.5)
+        if selectors is None:
+            expected = expected_json(document, ruleset, [], selected=True)
+        else:
+            expected = expected_json(document, ruleset, selectors)
+        assert json.loads(rewrite("json", ruleset, fields, text, rng)) == expected, (fields, text)
+
+
+# CSV: the header row must come through as it was, even where it names an original
+
+CSV_HEADER = ["id", "name", "Bob", "email", "Alice Smith"]
+CSV_FIELDS = [None, ["email"], ["Bob", "2"], ["5"], ["missing"]]
+
+
+def csv_text(rows, lineterminator):
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator=lineterminator).writerows(rows)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("case_insensitive", [False, True])
+@pytest.mark.parametrize("fields", CSV_FIELDS)
+def test_csv_cells_are_rewritten_and_header_kept_at_any_chunk_boundary(fields, case_insensitive):
+    rng = random.Random(2)
+    ruleset = ruleset_of(case_insensitive)
+    if fields is None:
+        columns = range(len(CSV_HEADER))
+    else:
+        columns = [CSV_HEADER.index(field) if field in CSV_HEADER else int(field) - 1
+                   for field in fields if field in CSV_HEADER or field.isdigit()]
+    for _ in range(150):
+        rows = [[str(index)] + [rng.choice(VALUES) for _ in CSV_HEADER[1:]] for index in range(rng.randint(0, 8))]
+        lineterminator = rng.choice(["\r\n", "\n"])
+        header = csv_text([CSV_HEADER], lineterminator)
+        text = header + csv_text(rows, lineterminator)
+
+        expected = [list(row) for row in rows]
+        for row in expected:
+            for column in columns:
+                row[column] = ruleset.sub(row[column])
+        output = rewrite("csv", ruleset, fields, text, rng)
+        assert output.startswith(header)
+        assert list(csv.reader(io.StringIO(output[len(header):], newline=""))) == expected, (fields, text)
+
+
+# SQL: the expected dump is built next to the input, literal by literal
+
+SQL_TABLES = {'users': ["id", "name", "email", "Bob"], 'people': ["id", "note", "email"]}
+SQL_FIELDS = [None, ["email"], ["users.email", "name"], ["bob"], ["people.note"]]
+MYSQL_ESCAPES = {"\\": "\\\\", "'": "\\'", "\n": "\\n", "\t": "\\t", "\0": "\\0"}
+
+
+def sql_selected(fields, table, column):
+    if fields is None:
+        return True
+    return any(field.rsplit(".", 1)[-1] == column.lower() and ("." not in field or field.split(".")[0] == table)
+               for field in fields)
+
+
+def sql_literal(value, backslash_escapes, rng):
+    """value as a string literal the way a dump might write it"""
+    if not backslash_escapes:
+        return "'" + value.replace("'", "''") + "'"
+    if rng.random() < 0.5:
+        # mysqldump
+        return "'" + "".join(MYSQL_ESCAPES.get(char, char) for char in value) + "'"
+    return "'" + value.replace("\\", "\\\\").replace("'", "''") + "'"
+
+
+def rewritten_literal(value, backslash_escapes):
+    if backslash_escapes:
+        value = value.replace("\\", "\\\\")
+    return "'" + value.replace("'", "''") + "'"
+
+
+def make_sql(rng, ruleset, fields, backslash_escapes):
+    """(dump, expected output) with INSERTs into a table known from CREATE TABLE and one that is not"""
+    identifier = "`{}`" if backslash_escapes else '"{}"'
+    users = ", ".join(f"{identifier.format(column)} text" for column in SQL_TABLES['users'])
+    pieces = [("SET standard_conforming_strings = off;\n" if backslash_escapes and rng.random() < 0.5 else ""),
+              ("" if backslash_escapes else "SET standard_conforming_strings = on;\n"),
+              f"CREATE TABLE {identifier.format('users')} ({users}, PRIMARY KEY (id));\n"]
+    expected = list(pieces)
+    for _ in range(rng.randint(1, 4)):
+        table = rng.choice(list(SQL_TABLES))
+        columns = list(SQL_TABLES[table])
+        listed = table == "people" or rng.random() < 0.5
+        if listed:
+            rng.shuffle(columns)
+        head = f"INSERT INTO {identifier.format(table)} "
+        if listed:
+            head += "(" + ", ".join(identifier.format(column) for column in columns) + ") "
+        head += "VALUES "
+        pieces.append(head)
+        expected.append(head)
+        for row in range(rng.randint(1, 3)):
+            separator = "(" if row == 0 else "),\n("
+            pieces.append(separator)
+            expected.append(separator)
+            for index, column in enumerate(columns):
+                if index:
+                    pieces.append(",")
+                    expected.append(",")
+                if column == "id" or rng.random() < 0.1:
+                    cell = "NULL" if column != "id" else str(rng.randint(0, 99))
+                    pieces.append(cell)
+                    expected.append(cell)
+                    continue
+                value = rng.choice(VALUES)
+                literal = sql_literal(value, backslash_escapes, rng)
+                pieces.append(literal)
+                result = ruleset.sub(value) if sql_selected(fields, table, column) else value
+                expected.append(literal if result == value else rewritten_literal(result, backslash_escapes))
+        pieces.append(");\n")
+        expected.append(");\n")
+        # Nothing outside the VALUES of an INSERT is touched
+        other = rng.choice(["-- Bob's note\n", "/* Alice Smith; 'Bob' */\n", "SELECT 'Bob';\n",
+                            "UPDATE users SET name = 'Bob' WHERE email = 'alice@example.com';\n", ""])
+        pieces.append(other)
+        expected.append(other)
+    return "".join(pieces), "".join(expected)
+
+
+@pytest.mark.parametrize("backslash_escapes", [True, False], ids=["backslash", "standard_conforming_strings"])
+@pytest.mark.parametrize("fields", SQL_FIELDS)
+def test_sql_literals_are_rewritten_and_escaped_at_any_chunk_boundary(fields, backslash_escapes):
+    rng = random.Random(3)
+    ruleset = ruleset_of(False)
+    for _ in range(150):
+        text, expected = make_sql(rng, ruleset, fields, backslash_escapes)
+        assert rewrite("sql", ruleset, fields, text, rng) == expected, (fields, text)
+
+
+def test_sql_backslashes_are_literal_with_standard_conforming_strings():
+    rng = random.Random(4)
+    ruleset = ruleset_of(False)
+    dump = "SET standard_conforming_strings = on;\nINSERT INTO t VALUES ('C:\\', 'Bob'), ('it''s Bob\\');\n"
+    assert rewrite("sql", ruleset, None, dump, rng) == (
+        "SET standard_conforming_strings = on;\n"
+        "INSERT INTO t VALUES ('C:\\', 'O''Neil \\ \"P1\"'), ('it''s O''Neil \\ \"P1\"\\');\n")
+    dump = "INSERT INTO t VALUES ('C:\\\\', 'Bob'), ('it\\'s Bob\\\\');\n"
+    assert rewrite("sql", ruleset, None, dump, rng) == (
+        "INSERT INTO t VALUES ('C:\\\\', 'O''Neil \\\\ \"P1\"'), ('it''s O''Neil \\\\ \"P1\"\\\\');\n")
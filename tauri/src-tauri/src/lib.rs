@@ -1,4 +1,7 @@
+use std::collections::hash_map::DefaultHasher;
+use std::hash::{Hash, Hasher};
 use std::path::PathBuf;
+use std::sync::{Arc, Mutex, OnceLock};
 use serde::{Deserialize, Serialize};
 use regex::Regex;
 use anyhow::{Result, anyhow};
@@ -73,6 +76,119 @@ fn preserve_case_pattern(original_match: &str, replacement: &str) -> String {
     result
 }
 
+// Number of compiled rule sets kept in memory
+const RULESET_CACHE_SIZE: usize = 16;
+
+// A replacement rule with its regex built ahead of time
+struct CompiledRule {
+    // None for case-sensitive replacement anywhere, which uses plain string replace
+    pattern: Option<Regex>,
+    source: String,
+    target: String,
+}
+
+// All rules of a config compiled for one direction (anonymize or de-anonymize)
+struct CompiledRuleSet {
+    case_insensitive: bool,
+    rules: Vec<CompiledRule>,
+}
+
+impl CompiledRuleSet {
+    fn new(config: &AnonymizerConfig, reverse: bool) -> Result<Self, regex::Error> {
+        let pairs: Vec<(&String, &String)> = if reverse {
+            config.replacements.iter().rev().map(|rule| (&rule.replacement, &rule.original)).collect()
+        } else {
+            config.replacements.iter().map(|rule| (&rule.original, &rule.replacement)).collect()
+        };
+
+        let mut rules = Vec::with_capacity(pairs.len());
+        for (source, target) in pairs {
+            let pattern = if config.case_insensitive || config.whole_words_only {
+                let escaped = regex::escape(source);
+                let pattern = if config.whole_words_only {
+                    format!(r"\b{}\b", escaped)
+                } else {
+                    escaped
+                };
+                if config.case_insensitive {
+                    Some(Regex::new(&format!("(?i){}", pattern))?)
+                } else {
+                    Some(Regex::new(&pattern)?)
+                }
+            } else {
+                None
+            };
+            rules.push(CompiledRule {
+                pattern,
+                source: source.clone(),
+                target: target.clone(),
+            });
+        }
+
+        Ok(Self {
+            case_insensitive: config.case_insensitive,
+            rules,
+        })
+    }
+
+    fn apply(&self, text: String) -> String {
+        let mut text = text;
+        for rule in &self.rules {
+            text = match &rule.pattern {
+                Some(re) if self.case_insensitive => re
+                    .replace_all(&text, |caps: &regex::Captures| {
+                        preserve_case_pattern(&caps[0], &rule.target)
+                    })
+                    .into_owned(),
+                Some(re) => re.replace_all(&text, rule.target.as_str()).into_owned(),
+                None => text.replace(&rule.source, &rule.target),
+            };
+        }
+        text
+    }
+}
+
+// Hash of everything that affects how a config's rules are compiled
+fn ruleset_key(config: &AnonymizerConfig, reverse: bool) -> u64 {
+    let mut hasher = DefaultHasher::new();
+    for rule in &config.replacements {
+        rule.original.hash(&mut hasher);
+        rule.replacement.hash(&mut hasher);
+    }
+    config.case_insensitive.hash(&mut hasher);
+    config.whole_words_only.hash(&mut hasher);
+    reverse.hash(&mut hasher);
+    hasher.finish()
+}
+
+// LRU cache of compiled rule sets, most recently used last
+fn ruleset_cache() -> &'static Mutex<Vec<(u64, Arc<CompiledRuleSet>)>> {
+    static CACHE: OnceLock<Mutex<Vec<(u64, Arc<CompiledRuleSet>)>>> = OnceLock::new();
+    CACHE.get_or_init(|| Mutex::new(Vec::new()))
+}
+
+// Get the compiled rule set for a config, compiling it only if the rules changed
+fn compiled_ruleset(config: &AnonymizerConfig, reverse: bool) -> Result<Arc<CompiledRuleSet>, regex::Error> {
+    let key = ruleset_key(config, reverse);
+    {
+        let mut cache = ruleset_cache().lock().unwrap_or_else(|e| e.into_inner());
+        if let Some(pos) = cache.iter().position(|(cached_key, _)| *cached_key == key) {
+            let entry = cache.remove(pos);
+            let ruleset = entry.1.clone();
+            cache.push(entry);
+            return Ok(ruleset);
+        }
+    }
+
+    let ruleset = Arc::new(CompiledRuleSet::new(config, reverse)?);
+    let mut cache = ruleset_cache().lock().unwrap_or_else(|e| e.into_inner());
+    cache.push((key, ruleset.clone()));
+    if cache.len() > RULESET_CACHE_SIZE {
+        cache.remove(0);
+    }
+    Ok(ruleset)
+}
+
 #[tauri::command]
 async fn anonymize_text(text: String, config: AnonymizerConfig) -> Result<AnonymizationResult, String> {
     if text.is_empty() {
@@ -83,56 +199,17 @@ async fn anonymize_text(text: String, config: AnonymizerConfig) -> Result<Anonym
         });
     }
 
-    let mut anonymized_text = text;
-
-    for rule in &config.replacements {
-        let original = &rule.original;
-        let replacement = &rule.replacement;
-
-        if config.case_insensitive {
-            // Create regex pattern
-            let pattern = if config.whole_words_only {
-                format!(r"\b{}\b", regex::escape(original))
-            } else {
-                regex::escape(original)
-            };
-
-            match Regex::new(&format!("(?i){}", pattern)) {
-                Ok(re) => {
-                    anonymized_text = re.replace_all(&anonymized_text, |caps: &regex::Captures| {
-                        let matched_text = &caps[0];
-                        preserve_case_pattern(matched_text, replacement)
-                    }).to_string();
-                }
-                Err(e) => {
-                    return Ok(AnonymizationResult {
-                        success: false,
-                        message: format!("Regex error: {}", e),
-                        text: None,
-                    });
-                }
-            }
-        } else {
-            // Case-sensitive replacement
-            if config.whole_words_only {
-                let pattern = format!(r"\b{}\b", regex::escape(original));
-                match Regex::new(&pattern) {
-                    Ok(re) => {
-                        anonymized_text = re.replace_all(&anonymized_text, replacement).to_string();
-                    }
-                    Err(e) => {
-                        return Ok(AnonymizationResult {
-                            success: false,
-                            message: format!("Regex error: {}", e),
-                            text: None,
-                        });
-                    }
-                }
-            } else {
-                anonymized_text = anonymized_text.replace(original, replacement);
-            }
+    let ruleset = match compiled_ruleset(&config, false) {
+        Ok(ruleset) => ruleset,
+        Err(e) => {
+            return Ok(AnonymizationResult {
+                success: false,
+                message: format!("Regex error: {}", e),
+                text: None,
+            });
         }
-    }
+    };
+    let anonymized_text = ruleset.apply(text);
 
     Ok(AnonymizationResult {
         success: true,
@@ -151,57 +228,18 @@ async fn deanonymize_text(text: String, config: AnonymizerConfig) -> Result<Anon
         });
     }
 
-    let mut deanonymized_text = text;
-
     // Apply reverse replacements
-    for rule in config.replacements.iter().rev() {
-        let original = &rule.original;
-        let replacement = &rule.replacement;
-
-        if config.case_insensitive {
-            // Create regex pattern
-            let pattern = if config.whole_words_only {
-                format!(r"\b{}\b", regex::escape(replacement))
-            } else {
-                regex::escape(replacement)
-            };
-
-            match Regex::new(&format!("(?i){}", pattern)) {
-                Ok(re) => {
-                    deanonymized_text = re.replace_all(&deanonymized_text, |caps: &regex::Captures| {
-                        let matched_text = &caps[0];
-                        preserve_case_pattern(matched_text, original)
-                    }).to_string();
-                }
-                Err(e) => {
-                    return Ok(AnonymizationResult {
-                        success: false,
-                        message: format!("Regex error: {}", e),
-                        text: None,
-                    });
-                }
-            }
-        } else {
-            // Case-sensitive replacement
-            if config.whole_words_only {
-                let pattern = format!(r"\b{}\b", regex::escape(replacement));
-                match Regex::new(&pattern) {
-                    Ok(re) => {
-                        deanonymized_text = re.replace_all(&deanonymized_text, original).to_string();
-                    }
-                    Err(e) => {
-                        return Ok(AnonymizationResult {
-                            success: false,
-                            message: format!("Regex error: {}", e),
-                            text: None,
-                        });
-                    }
-                }
-            } else {
-                deanonymized_text = deanonymized_text.replace(replacement, original);
-            }
+    let ruleset = match compiled_ruleset(&config, true) {
+        Ok(ruleset) => ruleset,
+        Err(e) => {
+            return Ok(AnonymizationResult {
+                success: false,
+                message: format!("Regex error: {}", e),
+                text: None,
+            });
         }
-    }
+    };
+    let deanonymized_text = ruleset.apply(text);
 
     Ok(AnonymizationResult {
         success: true,